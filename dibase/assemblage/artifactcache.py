@@ -0,0 +1,212 @@
+#! /usr/bin/python3
+# v3.5+
+'''
+Part of the dibase/assemblage package.
+A tool to apply actions to multi-part constructs.
+
+Definition of the ArtifactCache class and related entities.
+
+Developed by R.E. McArdell / Dibase Limited.
+Copyright (c) 2015 Dibase Limited
+License: dual: GPL or BSD.
+'''
+
+from .interfaces import ArtifactCacheBase
+from collections import OrderedDict
+import os
+import shutil
+import tempfile
+
+class ArtifactCache(ArtifactCacheBase):
+  '''
+  Local content-addressed cache of the output files created by elements'
+  after elements actions.
+
+  Entries are keyed by an element's artifactKey for an action - a digest of
+  all its inputs (see Component.artifactKey). Each entry is a directory, named
+  for its key, holding a copy of each of the element's output files. Entries
+  are evicted least recently used first when the total size of the cached
+  files exceeds the cache's maximum size.
+  '''
+  @staticmethod
+  def defaultPath():
+    '''
+    Returns the default cache directory pathname to use if a specific
+    pathname is not passed in ArtifactCache construction.
+    '''
+    return '.__assemblage-artifacts__'
+
+  def __init__(self, pathname=None, maxSize=1<<30, useHardLinks=False):
+    '''
+    Creates an artifact cache using the directory given by the pathname
+    parameter, which if None or omitted will be ArtifactCache.defaultPath().
+    The directory is created if necessary. maxSize is the maximum total size
+    in bytes of the cached files. If useHardLinks is True then outputs are
+    restored by hard linking them to the cached files (falling back to
+    copying if that fails) rather than copying them. This is only safe if
+    actions replace rather than rewrite their output files in place.
+    '''
+    self.pathname = pathname if pathname else self.defaultPath()
+    self.maxSize = maxSize
+    self.useHardLinks = useHardLinks
+    self.__entries = None
+    self.__size = 0
+
+  def __entry_path(self, key):
+    '''
+    Internal helper method. Returns the pathname of the entry directory for
+    key.
+    '''
+    return os.path.join(self.pathname, key)
+
+  def __load_entries(self):
+    '''
+    Internal helper method. On first use creates the cache directory if
+    necessary and lists existing entries, ordered least recently used first,
+    with their sizes.
+    '''
+    if self.__entries is not None:
+      return
+    os.makedirs(self.pathname, exist_ok=True)
+    entries = []
+    for entry in list(os.scandir(self.pathname)):
+      if entry.is_dir() and not entry.name.startswith('.'):
+        size = sum(f.stat().st_size for f in list(os.scandir(entry.path)))
+        entries.append((entry.stat().st_mtime, entry.name, size))
+    entries.sort()
+    self.__entries = OrderedDict((name,size) for _,name,size in entries)
+    self.__size = sum(self.__entries.values())
+
+  def __evict(self):
+    '''
+    Internal helper method. Removes least recently used entries until the
+    total size of cached files no longer exceeds maxSize.
+    '''
+    while self.__size > self.maxSize and self.__entries:
+      key, size = self.__entries.popitem(last=False)
+      shutil.rmtree(self.__entry_path(key), ignore_errors=True)
+      self.__size = self.__size - size
+
+  def contains(self, key):
+    '''
+    Returns True if there is an entry for key.
+    '''
+    self.__load_entries()
+    return key in self.__entries
+
+  def restore(self, key, paths):
+    '''
+    Restores the cached files for key to the sequence of pathnames in the
+    paths parameter, which should be in the same order as when stored.
+    Returns True if the files were restored, False if there is no complete
+    entry for key.
+    '''
+    if not key or not paths or not self.contains(key):
+      return False
+    entry_path = self.__entry_path(key)
+    sources = [os.path.join(entry_path, str(index)) for index in range(len(paths))]
+    if not all(os.path.isfile(source) for source in sources):
+      return False
+    for source, path in zip(sources, paths):
+      directory = os.path.dirname(path)
+      if directory:
+        os.makedirs(directory, exist_ok=True)
+      self.__place(source, path)
+    self.__entries.move_to_end(key)
+    os.utime(entry_path)
+    return True
+
+  def __place(self, source, path):
+    '''
+    Internal helper method. Atomically replaces path with a copy of, or if
+    useHardLinks is True a hard link to, source.
+    '''
+    directory = os.path.dirname(path) or '.'
+    fd, temp_path = tempfile.mkstemp(dir=directory, prefix='.assemblage-')
+    os.close(fd)
+    try:
+      linked = False
+      if self.useHardLinks:
+        os.remove(temp_path)
+        try:
+          os.link(source, temp_path)
+          linked = True
+        except OSError:
+          pass
+      if not linked:
+        shutil.copy2(source, temp_path)
+      os.replace(temp_path, path)
+    except:
+      if os.path.exists(temp_path):
+        os.remove(temp_path)
+      raise
+
+  def store(self, key, paths):
+    '''
+    Stores copies of the files given by the sequence of pathnames in the paths
+    parameter as the entry for key, replacing any existing entry, then evicts
+    least recently used entries if the cache is over its maximum size.
+    Returns True if stored, False if any of the files does not exist.
+    '''
+    if not key or not paths or not all(os.path.isfile(path) for path in paths):
+      return False
+    self.__load_entries()
+    temp_path = tempfile.mkdtemp(dir=self.pathname, prefix='.')
+    try:
+      size = 0
+      for index, path in enumerate(paths):
+        shutil.copy2(path, os.path.join(temp_path, str(index)))
+        size = size + os.path.getsize(path)
+      entry_path = self.__entry_path(key)
+      if key in self.__entries:
+        shutil.rmtree(entry_path, ignore_errors=True)
+        self.__size = self.__size - self.__entries.pop(key)
+      os.replace(temp_path, entry_path)
+    except:
+      shutil.rmtree(temp_path, ignore_errors=True)
+      raise
+    self.__entries[key] = size
+    self.__size = self.__size + size
+    self.__evict()
+    return True
+
+  def size(self):
+    '''
+    Returns the total size in bytes of the cached files.
+    '''
+    self.__load_entries()
+    return self.__size
+
+class CompositeArtifactCache(ArtifactCacheBase):
+  '''
+  An artifact cache that progresses through a sequence of individual artifact
+  caches - typically a local ArtifactCache followed by a shared remote one -
+  until one restores an entry. Entries restored from a later cache are stored
+  in the earlier caches. Stored entries are stored in all caches.
+  '''
+  def __init__(self, *caches):
+    '''
+    Create a CompositeArtifactCache for a sequence of artifact caches:
+      cac = CompositeArtifactCache(cache1, cache2,...)
+    '''
+    self.__caches = caches
+  def restore(self, key, paths):
+    '''
+    Tries to restore the entry for key to paths from each cache in turn. If
+    restored from other than the first cache the restored files are stored
+    in each of the preceding caches. Returns True if any cache restored the
+    entry.
+    '''
+    for index, cache in enumerate(self.__caches):
+      if cache.restore(key, paths):
+        for earlier in self.__caches[:index]:
+          earlier.store(key, paths)
+        return True
+    return False
+  def store(self, key, paths):
+    '''
+    Stores the files given by paths as the entry for key in every cache.
+    Returns True if stored by all caches.
+    '''
+    stored = [cache.store(key, paths) for cache in self.__caches]
+    return all(stored)
@@ -0,0 +1,153 @@
+#! /usr/bin/python3
+# v3.4+
+'''
+Part of the dibase/assemblage package.
+A tool to apply actions to multi-part constructs.
+
+Definition of the ArtifactCacheServer class and related entities.
+
+May be run as a script to serve an artifact cache directory:
+  python3 -m dibase.assemblage.artifactcacheserver --directory DIR --port PORT
+
+Developed by R.E. McArdell / Dibase Limited.
+Copyright (c) 2015 Dibase Limited
+License: dual: GPL or BSD.
+'''
+
+import http.server
+import socketserver
+import threading
+import tempfile
+import shutil
+import os
+import re
+
+class ArtifactCacheServer:
+  '''
+  Small reference implementation of the HTTP artifact cache protocol used by
+  assemblage.HTTPArtifactCache, storing entries as files in a local directory.
+  It is intended for testing and trial use on localhost: it performs no
+  authentication and no eviction.
+
+  The protocol consists of requests for the URL path /KEY/INDEX, where KEY is
+  an artifact key (a string of hex digits) and INDEX the (0 based) index of
+  one of the files of the entry for KEY:
+    GET   responds 200 with the file's contents or 404 if it is not present.
+    HEAD  as GET but without the contents.
+    PUT   stores the request body as the file, responding 201.
+  Malformed paths are responded to with 400. Connections are kept alive
+  (HTTP/1.1) so clients can reuse them.
+  '''
+  class __Server(socketserver.ThreadingMixIn, http.server.HTTPServer):
+    daemon_threads = True
+
+  class __Handler(http.server.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    path_pattern = re.compile(r'^/([0-9a-fA-F]+)/([0-9]+)$')
+
+    def log_message(self, format, *args):
+      pass
+    def __file_path(self):
+      match = self.path_pattern.match(self.path)
+      if not match:
+        self.__respond(400)
+        return None
+      return os.path.join(self.server.pathname, match.group(1).lower(), match.group(2))
+    def __respond(self, status, length=0):
+      self.send_response(status)
+      self.send_header('Content-Length', str(length))
+      self.end_headers()
+    def __get(self, send_body):
+      path = self.__file_path()
+      if path is None:
+        return
+      try:
+        file = open(path, 'rb')
+      except OSError:
+        self.__respond(404)
+        return
+      with file:
+        self.__respond(200, os.fstat(file.fileno()).st_size)
+        if send_body:
+          shutil.copyfileobj(file, self.wfile)
+    def do_GET(self):
+      self.__get(send_body=True)
+    def do_HEAD(self):
+      self.__get(send_body=False)
+    def do_PUT(self):
+      path = self.__file_path()
+      if path is None:
+        return
+      remaining = int(self.headers.get('Content-Length', 0))
+      directory = os.path.dirname(path)
+      os.makedirs(directory, exist_ok=True)
+      fd, temp_path = tempfile.mkstemp(dir=directory, prefix='.')
+      try:
+        with os.fdopen(fd, 'wb') as file:
+          while remaining > 0:
+            buf = self.rfile.read(min(remaining, 65536))
+            if not buf:
+              raise ConnectionError("ArtifactCacheServer: request body truncated")
+            file.write(buf)
+            remaining = remaining - len(buf)
+        os.replace(temp_path, path)
+      except:
+        os.remove(temp_path)
+        raise
+      self.__respond(201)
+
+  def __init__(self, pathname, host='localhost', port=0):
+    '''
+    Creates a server for the artifact cache directory given by pathname,
+    which is created if necessary, listening on host and port. If port is 0
+    an unused port is chosen; url() returns the actual URL served.
+    '''
+    os.makedirs(pathname, exist_ok=True)
+    self.__server = self.__Server((host, port), self.__Handler)
+    self.__server.pathname = pathname
+    self.__thread = None
+
+  def url(self):
+    '''
+    Returns the URL at which the cache is served.
+    '''
+    host, port = self.__server.server_address[:2]
+    return 'http://%(h)s:%(p)d' % {'h':host, 'p':port}
+
+  def serveForever(self):
+    '''
+    Serves requests until stop is called.
+    '''
+    self.__server.serve_forever()
+
+  def start(self):
+    '''
+    Serves requests on a background (daemon) thread. Returns self.
+    '''
+    self.__thread = threading.Thread(target=self.serveForever, daemon=True)
+    self.__thread.start()
+    return self
+
+  def stop(self):
+    '''
+    Stops serving requests and closes the listening socket.
+    '''
+    self.__server.shutdown()
+    self.__server.server_close()
+    if self.__thread:
+      self.__thread.join()
+      self.__thread = None
+
+if __name__ == '__main__':
+  import argparse
+  parser = argparse.ArgumentParser(description='Serve an assemblage artifact cache directory over HTTP.')
+  parser.add_argument('--directory', default='.__assemblage-artifact-server__')
+  parser.add_argument('--host', default='localhost')
+  parser.add_argument('--port', type=int, default=8765)
+  args = parser.parse_args()
+  server = ArtifactCacheServer(args.directory, args.host, args.port)
+  print("Serving artifact cache '%(d)s' at %(u)s" % {'d':args.directory, 'u':server.url()})
+  try:
+    server.serveForever()
+  except KeyboardInterrupt:
+    pass
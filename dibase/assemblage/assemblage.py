@@ -12,6 +12,7 @@ License: dual: GPL or BSD.
 
 from .interfaces import AssemblageBase
 from .compound import Compound
+from .statcache import StatCache
 from .resolvers import *
 
 class Assemblage(AssemblageBase):
@@ -56,6 +57,7 @@ class Assemblage(AssemblageBase):
     if not Assemblage.isiterable(elements):
       elements = [elements]
     self.__attributes['__resolution_plan__'] = ResolutionPlan(ResolverFactory(ObjectResolver), ResolverFactory(CallFrameScopeResolver) )
+    self.__attributes['__stat_cache__'] = StatCache()
     self.__elements = Compound(self.__attributes,elements)
 
   def queryBeforeElementsActionsDone(self):
@@ -72,6 +74,12 @@ class Assemblage(AssemblageBase):
     '''
     return False
 
+  def elements(self):
+    '''
+    Returns the (iterable) Compound of the assemblage's top level elements.
+    '''
+    return self.__elements
+
   def logger(self):
     '''
     Returns the assemblage logging.Logger object, provided by the plan object
@@ -85,10 +93,62 @@ class Assemblage(AssemblageBase):
     '''
     return self.__attributes['__store__']
 
+  def statCache(self):
+    '''
+    Returns the apply-scoped file status cache shared by the assemblage's
+    elements.
+    '''
+    return self.__attributes['__stat_cache__']
+
+  def __preload_digests(self):
+    '''
+    Internal helper method. If the digest cache can retrieve many stored
+    digests in one call - as it can from a ShardedDigestStore - preloads the
+    digests of all the leaf elements - those without (sub-)elements -
+    reachable from the top level elements, rather than each being retrieved
+    when the element is checked for changes.
+    '''
+    supports_preload = getattr(self.digestCache(), 'supportsPreload', None)
+    if not (supports_preload and supports_preload()):
+      return
+    names = []
+    seen = set()
+    pending = list(self.__elements)
+    while pending:
+      element = pending.pop()
+      if id(element) in seen:
+        continue
+      seen.add(id(element))
+      subelements = getattr(element, 'elements', None)
+      subelements = list(subelements()) if callable(subelements) else []
+      if subelements:
+        pending.extend(subelements)
+      else:
+        names.append(str(element))
+    self.digestCache().preload(names)
+
   def _applyInner(self, action, resolver):
-    self.__attributes['__seen_elements__'] = []
-    self.__elements._applyInner(action, resolver)
+    self.__attributes['__seen_elements__'] = set()
+    self.statCache().clear()
+    self.__attributes['__composite_digest_values__'] = {}
+    snapshot = self.__attributes.get('__file_snapshot__')
+    if snapshot:
+      snapshot.verify()
+    self.__preload_digests()
+    write_back = self.__attributes.get('__incremental_write_back__')
+    if write_back:
+      write_back.begin(self.digestCache(), self.__elements, action, self.logger())
+    try:
+      self.__elements._applyInner(action, resolver)
+    finally:
+      if write_back:
+        write_back.finish()
     self.digestCache().writeBack()
+    collector = self.__attributes.get('__digest_store_collector__')
+    if collector:
+      collector.recordApply(self.__elements, action)
+    if snapshot:
+      snapshot.save()
     if self.__elements.queryAllAfterElementsActionsDone() and not self.__elements.queryAnyAfterElementsActionsDone():
       # the only time all action after actions done but not any were done
       # is if there are no elements with _applyInner methods to process
@@ -115,8 +175,19 @@ class Assemblage(AssemblageBase):
     A warning is also logged if the elements attribute evaluates to False,
     i.e. is False, None, or an empty sequence, etc.
     
-    After an action has been applied any changed resource digests are written
-    back to the Assemblage's digest cache.
+    Any file status cached by elements during a previous apply is discarded
+    before the action is applied. If the digest cache supports preloading (see
+    DigestCache.supportsPreload) the stored digests of leaf elements are
+    retrieved in one call first. After an action has been applied any changed
+    resource digests are written back to the Assemblage's digest cache. If an
+    incremental write back object has been set (see
+    Blueprint.setIncrementalWriteBack) digests of elements below completed top
+    level elements are also written back while the action is applied,
+    including if applying it fails.
+    If a digest store collector has been set (see
+    Blueprint.setDigestStoreCollector) the apply is then recorded with it.
+    If a file snapshot has been set (see Blueprint.setFileSnapshot) it is
+    verified before the action is applied and saved after.
     '''
     resolver = self.__attributes['__resolution_plan__'].create(action)
     self._applyInner(action, resolver)
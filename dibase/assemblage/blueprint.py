@@ -1,5 +1,5 @@
 #! /usr/bin/python3
-# v3.4+
+# v3.5+
 ''' 
 Part of the dibase/assemblage package.
 A tool to apply actions to multi-part constructs.
@@ -12,8 +12,19 @@ License: dual: GPL or BSD.
 '''
 
 from .interfaces import AssemblagePlanBase
+import tempfile
+import importlib
+import itertools
+import hashlib
+import marshal
+import logging
+import time
+import json
+import csv
 import sys
+import os
 import inspect
+from collections.abc import Mapping
 
 class Blueprint(AssemblagePlanBase):
   '''
@@ -38,6 +49,17 @@ class Blueprint(AssemblagePlanBase):
   note that a child element can be referenced by multiple parents. Finally
   which elements are the top level root elements (elements having no parents)
   are determined and returned.
+
+  Large numbers of element specifications can be loaded in bulk from an
+  iterable, such as a manifest file read by readManifest, by calling
+  loadElements.
+
+  The files matching a path pattern can be named by passing the object
+  returned by Blueprint.scan to addElements.
+
+  The element specifications added by a function may be cached in a file by
+  calling addCachedElements, so later runs load them rather than calling the
+  function while the source files defining them are unchanged.
   '''
   class __ElementSpec:
     '''
@@ -45,12 +67,13 @@ class Blueprint(AssemblagePlanBase):
     Blueprint and being used to create a set of top level elements representing
     the roots of acyclic graphs of elements.
     '''
-    def __init__(self, name, kind, elements, logger, **kwargs):
+    def __init__(self, name, kind, group, elements, logger, **kwargs):
       '''
       Stores the passed data for later use.
       '''
       self.name = name
       self.kind = kind
+      self.group = group
       self.elements = elements
       self.logger = logger
       self.args = kwargs
@@ -61,41 +84,46 @@ class Blueprint(AssemblagePlanBase):
     (or other callable type).
     Interface takes its style from the Python library configparser.ConfigParser
     class' section, has_section, has_option, option methods.
+    A Blueprint has a single view onto its element names by group - the
+    Blueprint adds names to the view's ordered per-group sets as elements are
+    added, so queries reflect all elements added up to the time they are made
+    and membership tests take constant time. The lists returned by groups and
+    elements are snapshots, so are not affected by elements added later.
     '''
-    def __init__(self, by_group):
+    def __init__(self, names_by_group):
       '''
-      Initialised by Blueprint.addElement passing the object's internal
-      collection of added elements keyed on their group name.
+      Initialised by Blueprint.__init__ passing the object's internal
+      'group name:{element name:None}' ordered sets of added element names
+      keyed on their group name.
       '''
-      self.__elements_by_group = {}
-      for k,v in by_group.items():
-        self.__elements_by_group[k] = []
-        for es in v:
-          self.__elements_by_group[k].append(es.name)
+      self.__names_by_group = names_by_group
     def groups(self):
       '''
-      Returns a list of group names currently known to a Blueprint object.
+      Returns a list of the group names currently known to a Blueprint
+      object, in the order they became known.
       '''
-      return self.__elements_by_group.keys()
+      return list(self.__names_by_group)
     def has_group(self, group):
       '''
       Returns True if group name passed in group is currently known to
       a Blueprint object, False if it is not.
       '''
-      return group in self.groups()
+      return group in self.__names_by_group
     def elements(self, group):
       '''
-      Returns a list of element names currently known for the group name
-      passed in group. Returns an empty list if the group name is unknown.
+      Returns a list of the element names currently known for the group name
+      passed in group, in the order they were added. Returns an empty list if
+      the group name is unknown. Only the group's names are copied.
       '''
-      return self.__elements_by_group[group] if self.has_group(group) else []
+      return list(self.__names_by_group.get(group, ()))
     def has_element(self, group, element):
       '''
       Returns True if the element name passed in element is currently a member 
       of the group name passed in group. Returns False if group or element are
       unknown.
       '''
-      return self.has_group(group) and element in self.elements(group)
+      names = self.__names_by_group.get(group)
+      return names is not None and element in names
 
   def __init__(self):
     '''
@@ -104,9 +132,11 @@ class Blueprint(AssemblagePlanBase):
     self.__attributes = { '__logger__' : None
                         , '__store__'  : None
                         }
-    self.__element_specs_by_group = {}
+    self.__element_names_by_group = {}
+    self.__element_view = Blueprint.__ElementView(self.__element_names_by_group)
     self.__element_specs_by_name = {}
     self.__non_root_elements = set()
+    self.__top_level_elements = None
 
   def __set_default_logger(self):
     '''
@@ -143,8 +173,10 @@ class Blueprint(AssemblagePlanBase):
     '''
     Set a pre-configured logging.Logger (or equivalent) object to be the 
     logger object currently associated with a Blueprint object.
+    Any elements already created by topLevelElements are discarded.
     '''
     self.__attributes['__logger__'] = logger
+    self.__top_level_elements = None
     return self
 
   def setDigestCache(self, digest_cache):
@@ -153,6 +185,7 @@ class Blueprint(AssemblagePlanBase):
     element resource digest cache used to support resource change detection.
     '''
     self.__attributes['__store__'] = digest_cache
+    self.__top_level_elements = None
     return self
 
   def digestCache(self):
@@ -162,6 +195,78 @@ class Blueprint(AssemblagePlanBase):
     '''
     return self.__attributes['__store__']
 
+  def setCompositeDigests(self, enabled=True):
+    '''
+    Enable (or disable) the use of composite (Merkle-style) digests by
+    elements having (sub-)elements. When enabled such an element records the
+    composite digest of itself and its (sub-)elements in the digest cache
+    after an action is applied to it and skips the whole sub-graph on later
+    applications of the same action if the composite digest is unchanged.
+    Requires a digest cache providing compositeDigestMatches and
+    updateCompositeDigest methods, such as assemblage.DigestCache.
+    '''
+    self.__attributes['__composite_digests__'] = enabled
+    return self
+
+  def setArtifactCache(self, artifact_cache):
+    '''
+    Set an assemblage.ArtifactCache (or compatible) object from which elements'
+    output files are restored instead of performing their after elements
+    actions, and to which they are stored after performing them.
+    '''
+    self.__attributes['__artifact_cache__'] = artifact_cache
+    return self
+
+  def artifactCache(self):
+    '''
+    Return the value of the previously set artifact cache, or None if there
+    is not one.
+    '''
+    return self.__attributes.get('__artifact_cache__')
+
+  def setIncrementalWriteBack(self, write_back):
+    '''
+    Set an assemblage.IncrementalWriteBack (or compatible) object used to
+    write back the digests of top level elements that have completed applying
+    an action, and of their (sub-)elements, while the action is still being
+    applied to other elements.
+    '''
+    self.__attributes['__incremental_write_back__'] = write_back
+    return self
+
+  def setDigestStoreCollector(self, collector):
+    '''
+    Set an assemblage.DigestStoreCollector (or compatible) object with which
+    each apply of an action is recorded so that digest store records for
+    elements no longer in the assemblage can be removed.
+    '''
+    self.__attributes['__digest_store_collector__'] = collector
+    return self
+
+  def setFileSnapshot(self, snapshot):
+    '''
+    Set an assemblage.FileSnapshot (or compatible) object used to detect the
+    FileComponent leaf files unchanged since the previous apply so their
+    digests need not be computed.
+    '''
+    self.__attributes['__file_snapshot__'] = snapshot
+    return self
+
+  def setInstrumentation(self, instrumentation):
+    '''
+    Set an assemblage.Instrumentation (or compatible) object used to time the
+    phases of applying actions to each element, or None to not time them.
+    '''
+    self.__attributes['__instrumentation__'] = instrumentation
+    return self
+
+  def instrumentation(self):
+    '''
+    Return the value of the previously set instrumentation, or None if there
+    is not one.
+    '''
+    return self.__attributes.get('__instrumentation__')
+
   def topLevelElements(self):
     '''
     Returns a list of top level root elements to which actions may be applied.
@@ -169,7 +274,12 @@ class Blueprint(AssemblagePlanBase):
     network of elements - that is elements may share child elements, but a
     child element cannot have an ancestor as a child. The assemblage parameter
     is passed to all elements constructed as the assemblage argument.
+    The elements are only created by the first call; later calls return the
+    same list of the same element objects until elements are added or the
+    logger or digest cache set. The returned list should not be modified.
     '''
+    if self.__top_level_elements is not None:
+      return self.__top_level_elements
 
     def add_element_from_specification(specification, elements, seen_elements):
       '''
@@ -179,10 +289,10 @@ class Blueprint(AssemblagePlanBase):
       'element name:element' dictionary to hold newly created elements.
       seen_elements keeps track of elements already seen by this sequence of
       recursive calls. topLevelElements starts a new sequence of calls by
-      passing seen_elements as an empty list.
+      passing seen_elements as an empty set.
       '''
       subelements = []
-      seen_elements.append(specification.name)
+      seen_elements.add(specification.name)
       for subname in specification.elements:
         if subname in seen_elements:
           raise RuntimeError("Circular reference: Child element '%(c)s' is also an ancestor of '%(a)s'"
@@ -199,20 +309,20 @@ class Blueprint(AssemblagePlanBase):
       if inspect.isclass(specification.kind):
         elements[specification.name] = \
           (specification.kind(name=specification.name,attributes=self.__attributes 
-          ,elements=subelements,logger=specification.logger,**specification.args))
+          ,elements=subelements,logger=specification.logger or default_logger,**specification.args))
       else:
         elements[specification.name] = specification.kind # TODO : nestable object -- need to sort out attributes
-      seen_elements.remove(specification.name)
+      seen_elements.discard(specification.name)
     elements = {}
+    default_logger = self.logger()
     for es in self.__element_specs_by_name.values():
-      if not es.logger:
-        es.logger = self.logger()
       if es.name not in elements.keys():
-        add_element_from_specification(es, elements, seen_elements=[])
+        add_element_from_specification(es, elements, seen_elements=set())
     tlelements = []
     for ename, element in elements.items():
       if ename not in self.__non_root_elements:
         tlelements.append(element)
+    self.__top_level_elements = tlelements
     return tlelements
 
   def addElements(self, names, kind, group='', elements=[], logger=None, **kwargs):
@@ -275,11 +385,13 @@ class Blueprint(AssemblagePlanBase):
       if type(value) is str:
         return [value]
       elif callable(value):
-        return resolve_to_collection(value(Blueprint.__ElementView(self.__element_specs_by_group)))
+        return resolve_to_collection(value(self.__element_view))
       else:
         return value
 
     names = resolve_to_collection(names)
+    if not isinstance(names, (list, tuple)):
+      names = list(names) # e.g. a generator, materialised before adding elements
     elements = resolve_to_collection(elements)
     nm_index = 0
     for name in names:
@@ -287,13 +399,373 @@ class Blueprint(AssemblagePlanBase):
         raise RuntimeError("Duplicate element: there is already an element called '%(n)s'" % {'n':name})
       this_element_kwargs = process_kwargs(name,nm_index,kwargs)
       this_element_elements = process_elements(name,nm_index,elements)
-      new_spec = Blueprint.__ElementSpec(name, kind, this_element_elements, logger, **this_element_kwargs)
-      self.__element_specs_by_name[name] = new_spec
-      if group not in self.__element_specs_by_group:
-        self.__element_specs_by_group[group] = []
-      self.__element_specs_by_group[group].append(new_spec)
-      for e in this_element_elements:
-        if e not in self.__non_root_elements:
-          self.__non_root_elements.add(e)
+      new_spec = Blueprint.__ElementSpec(name, kind, group, this_element_elements, logger, **this_element_kwargs)
+      self.__add_specification(new_spec)
       nm_index = nm_index + 1
     return self
+
+  def __add_specification(self, specification):
+    '''
+    Internal helper method. Adds an element specification to the by name
+    collection and its name to its group's names, and notes its (sub-)elements
+    as non-root elements.
+    '''
+    self.__element_specs_by_name[specification.name] = specification
+    self.__top_level_elements = None
+    if specification.group not in self.__element_names_by_group:
+      self.__element_names_by_group[specification.group] = {}
+    self.__element_names_by_group[specification.group][specification.name] = None
+    for e in specification.elements:
+      if e not in self.__non_root_elements:
+        self.__non_root_elements.add(e)
+
+  def __resolve_kind(self, kind, kinds):
+    '''
+    Internal helper method. Returns the kind object for kind: kind itself if
+    it is not a string, otherwise its value in the kinds 'name:kind'
+    dictionary or, if not present, the object kind names as a qualified
+    'module.name' which is then added to kinds.
+    '''
+    if not isinstance(kind, str):
+      return kind
+    if kind not in kinds:
+      module_name, _, name = kind.rpartition('.')
+      try:
+        kinds[kind] = getattr(importlib.import_module(module_name), name)
+      except (ImportError, AttributeError, ValueError):
+        raise RuntimeError("Element kind unknown: No kind called '%(k)s'" % {'k':kind})
+    return kinds[kind]
+
+  def __bulk_specification(self, specification, kinds):
+    '''
+    Internal helper method for loadElements. Returns the element specification
+    object for a mapping or sequence element specification.
+    '''
+    if isinstance(specification, Mapping):
+      args = dict(specification)
+      name = args.pop('name', None)
+      kind = args.pop('kind', None)
+      group = args.pop('group', None)
+      elements = args.pop('elements', None)
+      logger = args.pop('logger', None)
+    else:
+      name, kind, group, elements, args = \
+        (tuple(specification) + (None, None, None, None, None))[:5]
+      logger = None
+    if not name or kind is None:
+      raise RuntimeError("Element specification incomplete: Expected a name and kind in %(s)r"
+                        % {'s':specification}
+                        )
+    if not elements:
+      elements = []
+    elif isinstance(elements, str):
+      elements = [elements]
+    return Blueprint.__ElementSpec( name, self.__resolve_kind(kind, kinds), group or ''
+                                  , list(elements), logger, **(args or {})
+                                  )
+
+  def loadElements(self, specifications, kinds=None, chunkSize=10000):
+    '''
+    Adds element specifications in bulk from the specifications iterable,
+    taking chunkSize specifications at a time from it so it may generate them
+    as they are required - for example while reading them from a file with
+    readManifest. Each specification is either a mapping or a sequence:
+      - a mapping has 'name' and 'kind' items and optionally 'group',
+        'elements' and 'logger' items. All other items are additional
+        creation arguments for the element object.
+      - a sequence is (name, kind[, group[, elements[, kwargs]]]) where the
+        optional kwargs is a dictionary of additional creation arguments.
+    As for addElements elements may be a string or list of strings. A kind
+    may be a string: the name of a kind in the kinds 'name:kind' dictionary or
+    a qualified 'module.name' of a class to import.
+    A RuntimeError is raised if a name has already been added, either before
+    or by the load, or if a specification is incomplete or names an unknown
+    kind, in which case none of the specifications in the chunk having the
+    error are added but those in previous chunks have been.
+    Returns a dictionary reporting the load's throughput: 'elements' - the
+    number added, 'chunks' - the number of chunks, 'seconds' - the time
+    taken, and 'elementsPerSecond'.
+    '''
+    start = time.perf_counter()
+    kinds = dict(kinds) if kinds else {}
+    specifications = iter(specifications)
+    count = 0
+    chunks = 0
+    while True:
+      chunk = [ self.__bulk_specification(specification, kinds)
+                for specification in itertools.islice(specifications, chunkSize)
+              ]
+      if not chunk:
+        break
+      names = set()
+      for specification in chunk:
+        if specification.name in self.__element_specs_by_name or specification.name in names:
+          raise RuntimeError("Duplicate element: there is already an element called '%(n)s'"
+                            % {'n':specification.name}
+                            )
+        names.add(specification.name)
+      for specification in chunk:
+        self.__add_specification(specification)
+      count = count + len(chunk)
+      chunks = chunks + 1
+    seconds = time.perf_counter() - start
+    return  { 'elements' : count
+            , 'chunks' : chunks
+            , 'seconds' : seconds
+            , 'elementsPerSecond' : count / seconds if seconds > 0 else None
+            }
+
+  @staticmethod
+  def scan(pattern, threads=1, cachePath=None, hidden=False):
+    '''
+    Returns an assemblage.DirectoryScan for the path pattern - such as
+    'src/**/*.csv' - that may be passed as an addElements names (or elements)
+    argument to name the files matching the pattern. Directories are listed
+    on up to threads threads and, if cachePath is given, listings are cached
+    in that file keyed by directory modification times. Files and
+    directories whose names start with '.' are only matched if hidden is
+    True.
+    '''
+    from .directoryscan import DirectoryScan
+    return DirectoryScan(pattern, threads, cachePath, hidden)
+
+  @staticmethod
+  def readManifest(pathname, format=None, elementsSeparator=';'):
+    '''
+    Generates element specification mappings, for loadElements, read one at a
+    time from the manifest file given by pathname. The format is 'csv',
+    'json' or 'jsonl'; if None it is taken from the file's extension, '.jsonl'
+    and '.ndjson' files being 'jsonl'.
+      - A 'csv' file has a header row naming the columns, which should
+        include 'name' and 'kind' and may include 'group', 'elements' - the
+        element names separated by elementsSeparator - and additional
+        creation argument columns. Empty additional argument values are
+        omitted.
+      - A 'jsonl' file has a JSON object mapping per line.
+      - A 'json' file is a JSON array of mappings. As the whole array is read
+        before any mapping is generated 'jsonl' is preferable for large
+        manifests.
+    '''
+    if format is None:
+      extension = os.path.splitext(pathname)[1].lower()
+      format = {'.csv':'csv', '.json':'json', '.jsonl':'jsonl', '.ndjson':'jsonl'}.get(extension)
+    if format == 'csv':
+      with open(pathname, 'r', newline='', encoding='utf-8') as file:
+        for row in csv.DictReader(file):
+          specification = dict( (k,v) for k,v in row.items()
+                                if k in ('name','kind','group') or (k != 'elements' and v)
+                              )
+          elements = row.get('elements')
+          if elements:
+            specification['elements'] = [e for e in elements.split(elementsSeparator) if e]
+          yield specification
+    elif format == 'jsonl':
+      with open(pathname, 'r', encoding='utf-8') as file:
+        for line in file:
+          if line.strip():
+            yield json.loads(line)
+    elif format == 'json':
+      with open(pathname, 'r', encoding='utf-8') as file:
+        for specification in json.load(file):
+          yield specification
+    else:
+      raise ValueError("Blueprint.readManifest: Unknown manifest format for '%(p)s'"
+                      % {'p':pathname}
+                      )
+
+  @staticmethod
+  def defaultSpecificationCachePath():
+    '''
+    Returns the default element specification cache file pathname used by
+    addCachedElements.
+    '''
+    return '.__assemblage-blueprint__'
+
+  @staticmethod
+  def sourceFingerprint(*sources):
+    '''
+    Returns a hex MD5 digest of the contents of the source files given by the
+    sources parameters - each a pathname or a module, class or function whose
+    source file is used. The compiled code of functions not defined in a
+    source file - for example interactively - is used instead.
+    '''
+    hasher = hashlib.md5()
+    for source in sources:
+      pathname = source if isinstance(source, str) else inspect.getsourcefile(source)
+      if not isinstance(source, str) and not (pathname and os.path.isfile(pathname))\
+         and hasattr(source, '__code__'):
+        hasher.update(marshal.dumps(source.__code__))
+        continue
+      hasher.update(os.path.abspath(pathname).encode('utf-8', 'surrogateescape'))
+      hasher.update(b'\0')
+      with open(pathname, 'rb') as file:
+        hasher.update(hashlib.md5(file.read()).digest())
+    return hasher.hexdigest()
+
+  @staticmethod
+  def kindsFingerprint(kinds):
+    '''
+    Returns a hex MD5 digest of the pathname, modification time and size of
+    the source files defining the classes in kinds and their base classes.
+    Classes not defined in source files - such as built in classes - are
+    identified by their qualified names only.
+    '''
+    files = set()
+    names = set()
+    for kind in kinds:
+      for cls in inspect.getmro(kind):
+        names.add('.'.join([cls.__module__, cls.__qualname__]))
+        try:
+          pathname = inspect.getsourcefile(cls)
+        except TypeError: # built in
+          pathname = None
+        if pathname:
+          files.add(os.path.abspath(pathname))
+    hasher = hashlib.md5()
+    for name in sorted(names):
+      hasher.update(name.encode('utf-8', 'surrogateescape') + b'\0')
+    for pathname in sorted(files):
+      try:
+        st = os.stat(pathname)
+        signature = '%(m)d:%(s)d' % {'m':st.st_mtime_ns, 's':st.st_size}
+      except OSError:
+        signature = 'missing'
+      hasher.update(('%(p)s\0%(s)s\0' % {'p':pathname, 's':signature}).encode('utf-8', 'surrogateescape'))
+    return hasher.hexdigest()
+
+  @staticmethod
+  def __kind_name(kind):
+    '''
+    Internal helper method for saveSpecifications. Returns the qualified
+    'module.name' name of the class kind. Raises TypeError if kind is not a
+    class that can be found again by that name.
+    '''
+    if inspect.isclass(kind):
+      name = '.'.join([kind.__module__, kind.__qualname__])
+      module = sys.modules.get(kind.__module__)
+      if getattr(module, kind.__qualname__, None) is kind:
+        return name
+    raise TypeError("Blueprint.saveSpecifications: Element kind %(k)r is not a module level class"
+                   % {'k':kind}
+                   )
+
+  def saveSpecifications(self, pathname, fingerprint, names=None):
+    '''
+    Atomically writes the Blueprint's element specifications - names, kinds,
+    groups, (sub-)element names, loggers and additional arguments - with the
+    fingerprint string to the file given by pathname as JSON, along with the
+    kindsFingerprint of their kinds. If names is not None only the
+    specifications of the elements it names are written. Kinds must be module
+    level classes, which are written as their qualified names, loggers must
+    be logging.Logger objects, which are written as their names, and
+    argument values must be JSON values - strings, numbers, booleans, None,
+    lists and dictionaries with string keys - otherwise a TypeError or
+    ValueError is raised.
+    '''
+    specifications = []
+    for es in self.__element_specs_by_name.values():
+      if names is not None and es.name not in names:
+        continue
+      if es.logger is not None and not isinstance(es.logger, logging.Logger):
+        raise TypeError("Blueprint.saveSpecifications: Element '%(e)s' logger is not a logging.Logger"
+                       % {'e':es.name}
+                       )
+      if json.loads(json.dumps(es.args)) != es.args:
+        raise ValueError("Blueprint.saveSpecifications: Element '%(e)s' arguments are not JSON values"
+                        % {'e':es.name}
+                        )
+      specifications.append( [ es.name, self.__kind_name(es.kind), es.group, list(es.elements)
+                             , es.logger.name if es.logger is not None else None, es.args
+                             ]
+                           )
+    kinds = set(es.kind for es in self.__element_specs_by_name.values()
+                if names is None or es.name in names
+               )
+    data = json.dumps( { 'version':3, 'fingerprint':fingerprint
+                       , 'kindsFingerprint':self.kindsFingerprint(kinds)
+                       , 'specifications':specifications
+                       }
+                     )
+    directory = os.path.dirname(pathname) or '.'
+    fd, temp_path = tempfile.mkstemp(dir=directory, prefix='.assemblage-')
+    try:
+      with os.fdopen(fd, 'w', encoding='utf-8') as file:
+        file.write(data)
+      os.replace(temp_path, pathname)
+    except:
+      if os.path.exists(temp_path):
+        os.remove(temp_path)
+      raise
+
+  def loadSpecifications(self, pathname, fingerprint):
+    '''
+    Adds the element specifications saved by saveSpecifications to the file
+    given by pathname if it exists, is readable, was saved with the same
+    fingerprint string and the source files of the element kinds are
+    unchanged (see kindsFingerprint). Returns True if they were added, False
+    if not. A RuntimeError is raised if an element with a loaded name has
+    already been added.
+
+    The file holds only JSON data, so loading it runs no code other than
+    importing the modules defining the element kinds it names - as does
+    loadElements for kinds given by name. Even so, anyone able to write the
+    file can choose the elements added and the kinds named, so it should
+    only be writable by those trusted to define the Blueprint.
+    '''
+    try:
+      with open(pathname, 'r', encoding='utf-8') as file:
+        cached = json.load(file)
+      if cached['version'] != 3 or cached['fingerprint'] != fingerprint:
+        return False
+      kinds = {}
+      specifications = [ Blueprint.__ElementSpec( name, self.__resolve_kind(kind, kinds), group
+                                                , list(elements)
+                                                , logging.getLogger(logger) if logger is not None else None
+                                                , **args
+                                                )
+                         for name, kind, group, elements, logger, args in cached['specifications']
+                       ]
+      if self.kindsFingerprint(set(kinds.values())) != cached['kindsFingerprint']:
+        return False
+    except (OSError, RuntimeError, KeyError, TypeError, ValueError):
+      return False
+    for specification in specifications:
+      if specification.name in self.__element_specs_by_name:
+        raise RuntimeError("Duplicate element: there is already an element called '%(n)s'"
+                          % {'n':specification.name}
+                          )
+    for specification in specifications:
+      self.__add_specification(specification)
+    return True
+
+  def addCachedElements(self, define, pathname=None, sources=[]):
+    '''
+    Adds elements by calling define, passing the Blueprint object, unless the
+    specification cache file given by pathname - or if None
+    Blueprint.defaultSpecificationCachePath() - holds the specifications
+    saved by an earlier call having the same source fingerprint, in which
+    case they are loaded instead. The source fingerprint is that of the
+    source file defining define and any additional pathnames, modules,
+    classes or functions in sources (see sourceFingerprint). Cached
+    specifications are also not used if the source files defining their
+    element kinds have changed (see kindsFingerprint). Include any data
+    files from which define reads element specifications in sources. After
+    calling define the specifications are saved to the cache file, unless
+    they cannot be, in which case a warning is logged. Only the
+    specifications of elements added by define are cached. The cache file
+    holds JSON data, not code, but should only be writable by those trusted
+    to define the Blueprint (see loadSpecifications).
+    '''
+    if not pathname:
+      pathname = self.defaultSpecificationCachePath()
+    fingerprint = self.sourceFingerprint(define, *sources)
+    if self.loadSpecifications(pathname, fingerprint):
+      return self
+    existing_names = set(self.__element_specs_by_name)
+    define(self)
+    names = set(self.__element_specs_by_name) - existing_names
+    try:
+      self.saveSpecifications(pathname, fingerprint, names)
+    except (TypeError, ValueError) as e:
+      self.logger().warning("Blueprint element specifications not cached: %(e)s" % {'e':e})
+    return self
@@ -16,6 +16,7 @@ from .compound import Compound
 
 import logging
 import inspect
+import hashlib
 import sys
 
 class Component(ComponentBase):
@@ -29,14 +30,17 @@ class Component(ComponentBase):
 
   Components support the relational operators and compare equal, less, greater
   etc. if their names are equal, greater, less etc. The string value of a
-  component is its name.
+  component is its name. Names are interned and their hash cached on
+  construction so comparisons and hashing between components do not need to
+  go through str().
   
   The main method is the apply method which applies an action (a string that is
   a valid Python identifier) to the component. The action is used to determine
   what action steps to perform and what those steps are.
   '''
   def __init__(self, name, attributes, elements=[], logger=None):
-    self.__name = name
+    self.__name = sys.intern(name) if type(name) is str else name
+    self.__hash = hash(self.__name)
     self.__attributes = attributes
     self.__elements = Compound(attributes,elements)
     if type(logger) is logging.Logger:
@@ -60,19 +64,25 @@ class Component(ComponentBase):
   def __str__(self):
     return self.__name
   def __hash__(self):
-    return hash(self.__name)
+    return self.__hash
+  def __key(self, other):
+    '''
+    Returns the value to compare against this component's name: the name of
+    other if it is a Component, otherwise str(other).
+    '''
+    return other.__name if isinstance(other, Component) else str(other)
   def __lt__(self, other):
-    return str(self) < str(other)
+    return self.__name < self.__key(other)
   def __le__(self, other):
-    return str(self) <= str(other)
+    return self.__name <= self.__key(other)
   def __eq__(self, other):
-    return str(self) == str(other)
+    return other is self or self.__name == self.__key(other)
   def __ne__(self, other):
-    return str(self) != str(other)
+    return other is not self and self.__name != self.__key(other)
   def __gt__(self, other):
-    return str(self) > str(other)
+    return self.__name > self.__key(other)
   def __ge__(self, other):
-    return str(self) >= str(other)
+    return self.__name >= self.__key(other)
 
   def __log_message(self, message, frame=1):
     callerframe = inspect.getouterframes(inspect.currentframe(),3)
@@ -87,8 +97,27 @@ class Component(ComponentBase):
       self.__logger.error(message)
  
   def _applyInner(self, action, resolver):
+    instrumentation = self.__attributes.get('__instrumentation__')
+    if not instrumentation:
+      self.__apply_inner(action, resolver, None)
+      return
+    outer_action = instrumentation.currentAction()
+    instrumentation.setAction(action)
+    start = instrumentation.now()
+    try:
+      self.__apply_inner(action, resolver, instrumentation)
+    finally:
+      instrumentation.record(self, action, 'apply', start, instrumentation.now())
+      instrumentation.setAction(outer_action)
+
+  def __apply_inner(self, action, resolver, instrumentation):
+    '''
+    Internal helper method. Applies action to the Component as described for
+    apply, timing each phase of the application with instrumentation if it
+    is not None.
+    '''
     def resolve_and_call_function(action, action_method_name, resolver):
-      func = resolver.resolve(action_method_name, self)
+      func = resolve(action_method_name, self)
       return func and func()
     def query_do_before_elements_actions(action, resolver):
       return resolve_and_call_function(action, 'queryDoBeforeElementsActions', resolver)
@@ -98,37 +127,104 @@ class Component(ComponentBase):
       return resolve_and_call_function(action, 'queryProcessElements', resolver)
     def do_before_elements_actions( action, resolver):
       resolve_and_call_function(action, 'beforeElementsActions', resolver)
+    def artifact_cache_and_key(action):
+      cache = self.__attributes.get('__artifact_cache__')
+      if cache and len(self.__elements) and self.outputPaths():
+        return cache, self.artifactKey(action)
+      return None, None
+    def restore_outputs(cache, key, action):
+      if key and cache.restore(key, self.outputPaths()):
+        self.debug("apply('%s'): Restored outputs from artifact cache" % action)
+        self.__cacheStatus = 'restored'
+        return True
+      if key:
+        self.__cacheStatus = 'missed'
+      return False
+    def store_outputs(cache, key, action):
+      if key and cache.store(key, self.outputPaths()):
+        self.debug("apply('%s'): Stored outputs in artifact cache" % action)
     def do_after_elements_actions(action, resolver):
-      resolve_and_call_function(action, 'afterElementsActions', resolver)
+      func = resolve('afterElementsActions', self)
+      if func:
+        if instrumentation:
+          func = instrumentation.timed(self, action, 'afterElementsActions', func)
+        cache, key = artifact_cache_and_key(action)
+        if not restore_outputs(cache, key, action):
+          func()
+          store_outputs(cache, key, action)
+    def process_elements(action, resolver):
+      self.__elements._applyInner(action, resolver)
+    def composite_digest_matches():
+      return self.__attributes['__store__'].compositeDigestMatches(self, action)
+    def update_composite_digest():
+      self.__forget_composite_digest()
+      self.__attributes['__store__'].updateCompositeDigest(self, action)
+    def notify_completed():
+      write_back = self.__attributes.get('__incremental_write_back__')
+      if write_back:
+        write_back.elementCompleted(self)
+
+    resolve = resolver.resolve
+    if instrumentation:
+      timed = instrumentation.timed
+      resolve = timed(self, action, 'resolve', resolve)
+      query_do_before_elements_actions = timed\
+        (self, action, 'queryDoBeforeElementsActions', query_do_before_elements_actions)
+      do_before_elements_actions = timed\
+        (self, action, 'beforeElementsActions', do_before_elements_actions)
+      query_process_elements = timed(self, action, 'queryProcessElements', query_process_elements)
+      process_elements = timed(self, action, 'elements', process_elements)
+      query_do_after_elements_actions = timed\
+        (self, action, 'queryDoAfterElementsActions', query_do_after_elements_actions)
+      if self.__attributes.get('__artifact_cache__'):
+        restore_outputs = timed(self, action, 'artifactCache', restore_outputs)
+        store_outputs = timed(self, action, 'artifactCache', store_outputs)
+      composite_digest_matches = timed(self, action, 'compositeDigest', composite_digest_matches)
+      update_composite_digest = timed(self, action, 'compositeDigest', update_composite_digest)
 
     self.debug("Component attributes: '%s'" % self.__attributes)
     self.reset()
-    if self in self.__attributes['__seen_elements__']:
+    # seen elements are tracked by identity: Blueprint guarantees unique names
+    if id(self) in self.__attributes['__seen_elements__']:
       raise RuntimeError( self.__log_message( "Circular reference: already tried to "
                                               "apply action '%(a)s' to element '%(e)s'"
                                               % {'e':str(self), 'a':action}
                                             )
                         )
-    self.__attributes['__seen_elements__'].append(self)
+    use_composite_digest = len(self.__elements)\
+                           and self.__attributes.get('__composite_digests__')
+    if use_composite_digest\
+     and composite_digest_matches():
+      self.debug("apply('%s'): Composite digest unchanged, skipping element" % action)
+      self.__cacheStatus = 'unchanged'
+      notify_completed()
+      return
+    self.__attributes['__seen_elements__'].add(id(self))
     self.debug("apply('%s'): Querying do before actions" % action)
     if query_do_before_elements_actions(action, resolver):
       self.debug("Passed check, doing before actions")
       do_before_elements_actions(action, resolver)
+      self.invalidateCachedStatus()
       self.__beforeDone = True
     self.debug("apply('%s'): Querying process elements" % action)
     if query_process_elements(action, resolver):
       self.debug("Passed check, processing elements")
-      self.__elements._applyInner(action, resolver)
+      process_elements(action, resolver)
     self.debug("apply('%s'): Querying do after actions" % action)
     if query_do_after_elements_actions(action, resolver):
       self.debug("Passed check, doing after actions")
       do_after_elements_actions(action, resolver)
+      self.invalidateCachedStatus()
       self.__afterDone = True
-    self.__attributes['__seen_elements__'].remove(self)
+    if use_composite_digest:
+      update_composite_digest()
+    self.__attributes['__seen_elements__'].discard(id(self))
+    notify_completed()
 
   def reset(self):
     self.__beforeDone = False
     self.__afterDone = False
+    self.__cacheStatus = None
   def queryBeforeElementsActionsDone(self):
     '''
     Return true if component processed actions before processing (sub-)
@@ -141,6 +237,15 @@ class Component(ComponentBase):
     element components. Returns false otherwise.
     '''
     return self.__afterDone
+  def queryCacheStatus(self):
+    '''
+    Returns how caches affected the component's last apply: 'unchanged' if
+    it was skipped as its composite digest was unchanged, 'restored' if its
+    outputs were restored from the artifact cache, 'missed' if they were not
+    in the artifact cache so its after elements actions were performed, or
+    None if no cache was used.
+    '''
+    return self.__cacheStatus
 
   def apply(self, action):
     '''
@@ -174,9 +279,142 @@ class Component(ComponentBase):
     the '__resolution_plan__' attribute object (a resolvers.ResolutionPlan
     - or compatible type - object).
     '''
-    self.__attributes['__seen_elements__'] = []
+    self.__attributes['__seen_elements__'] = set()
+    if self.statCache():
+      self.statCache().clear()
+    self.__attributes['__composite_digest_values__'] = {}
     resolver = self.__attributes['__resolution_plan__'].create(action)
     self._applyInner(action, resolver)
+  def elements(self):
+    '''
+    Returns the (iterable) Compound of the Component's (sub-)elements.
+    '''
+    return self.__elements
+  def outputPaths(self):
+    '''
+    Intended to be overridden.
+    Returns a list of the pathnames of the files created by a Component's
+    after elements actions. If an artifact cache is in use these files are
+    restored from the cache, if present, instead of performing the after
+    elements actions, and stored in the cache after the actions have been
+    performed. The base Component creates no files so returns an empty list.
+    '''
+    return []
+  def artifactKey(self, action):
+    '''
+    Returns the key string under which the outputs of applying action to the
+    Component are stored in an artifact cache: a hex MD5 digest of the action,
+    the Component's class, name and parametersDigest and the compositeDigest
+    of each of its elements - that is all of its inputs. Returns None if any
+    element does not support composite digests.
+    '''
+    hasher = hashlib.md5()
+    for value in ( str(action)
+                 , '.'.join([self.__class__.__module__, self.__class__.__qualname__])
+                 , self.__name
+                 ):
+      hasher.update(value.encode())
+      hasher.update(b'\0')
+    parameters = self.parametersDigest()
+    hasher.update(parameters if isinstance(parameters, bytes) else repr(parameters).encode())
+    for element in self.__elements:
+      element_digest = element.compositeDigest()\
+                       if hasattr(element, 'compositeDigest') else None
+      if element_digest is None:
+        return None
+      hasher.update(element_digest)
+    return hasher.hexdigest()
+  def statCache(self):
+    '''
+    Returns the apply-scoped StatCache (or compatible) object shared by the
+    elements of an assemblage, or None if there is not one.
+    '''
+    return self.__attributes.get('__stat_cache__')
+  def fileSnapshot(self):
+    '''
+    Returns the assemblage.FileSnapshot (or compatible) object shared by the
+    elements of an assemblage, or None if there is not one.
+    '''
+    return self.__attributes.get('__file_snapshot__')
+  def invalidateCachedStatus(self):
+    '''
+    Called after a Component's before or after elements actions have been
+    performed as they may have (re-)created the Component's resource. Any
+    status cached for the resource during the current apply should be
+    discarded. The base Component has no resource so only discards its
+    cached composite digest. Overrides should call the base implementation.
+    '''
+    self.__forget_composite_digest()
+  def __composite_digest_values(self):
+    '''
+    Internal helper method. Returns the apply-scoped dictionary in which
+    composite digests are cached, or None if there is no StatCache - and so
+    no apply scope - to cache them for. Entries map the id of a Component to
+    a (Component, digest) pair, the Component being held so its id cannot be
+    reused while it is cached.
+    '''
+    if not self.statCache():
+      return None
+    return self.__attributes.setdefault('__composite_digest_values__', {})
+  def __forget_composite_digest(self):
+    '''
+    Internal helper method. Discards any cached composite digest.
+    '''
+    values = self.__composite_digest_values()
+    if values is not None:
+      values.pop(id(self), None)
+  def parametersDigest(self):
+    '''
+    Intended to be overridden.
+    Returns a bytes value representing any parameters, other than its elements,
+    affecting how a Component's resource is created. It is included in the
+    Component's composite digest. The base Component has no such parameters
+    and returns an empty byte sequence.
+    '''
+    return b''
+  def compositeDigest(self):
+    '''
+    Returns a Merkle-style digest of the Component and all its (sub-)elements:
+    an MD5 digest of the Component's class, name, parametersDigest, existence
+    and digest (if it exists) plus the compositeDigest of each of its
+    elements in order. If any element does not support composite digests None
+    is returned.
+    The value is cached for the current apply if there is an assemblage
+    StatCache, so shared elements are only visited once per apply. It is
+    discarded when invalidateCachedStatus is called.
+    '''
+    values = self.__composite_digest_values()
+    if values is None:
+      return self.__calculate_composite_digest()
+    entry = values.get(id(self))
+    if entry is None:
+      entry = (self, self.__calculate_composite_digest())
+      values[id(self)] = entry
+    return entry[1]
+  def __calculate_composite_digest(self):
+    '''
+    Internal helper method. Calculates the value returned by compositeDigest.
+    '''
+    def as_bytes(value):
+      return value if isinstance(value, bytes) else repr(value).encode()
+    hasher = hashlib.md5()
+    hasher.update('.'.join([self.__class__.__module__, self.__class__.__qualname__]).encode())
+    hasher.update(b'\0')
+    hasher.update(self.__name.encode())
+    hasher.update(b'\0')
+    hasher.update(as_bytes(self.parametersDigest()))
+    if self.doesNotExist():
+      hasher.update(b'\0')
+    else:
+      hasher.update(b'\1')
+      hasher.update(as_bytes(self.digest()))
+    for element in self.__elements:
+      element_digest = element.compositeDigest()\
+                       if hasattr(element, 'compositeDigest') else None
+      if element_digest is None:
+        return None
+      hasher.update(element_digest)
+    return hasher.digest()
   def digest(self):
     '''
     Intended to be overridden.
@@ -228,8 +466,15 @@ class Component(ComponentBase):
     '''
     Passes self onto the assemblage digest cache which compares
     current Component.digest() value with the previous cached/stored value.
+    The check is only timed if this thread is applying an action.
     '''
+    instrumentation = self.__attributes.get('__instrumentation__')
+    action = instrumentation.currentAction() if instrumentation else None
+    if action is not None:
+      start = instrumentation.now()
     has_changed = self.__attributes['__store__'].updateIfDifferent(self)\
                   if '__store__' in self.__attributes else False
+    if action is not None:
+      instrumentation.record(self, action, 'digest', start, instrumentation.now())
     self.debug("Checking if Component has changed: %s"%has_changed)
     return has_changed
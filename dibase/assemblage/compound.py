@@ -77,7 +77,10 @@ class Compound(CompoundBase):
     Applies action to all Component elements. Generally _applyInner should be
     called from a containing type such as a ComponentBase implementation.
     '''
-    self.__attributes['__seen_elements__'] = []
+    self.__attributes['__seen_elements__'] = set()
+    if self.__attributes.get('__stat_cache__'):
+      self.__attributes['__stat_cache__'].clear()
+    self.__attributes['__composite_digest_values__'] = {}
     resolver = self.__attributes['__resolution_plan__'].create(action)
     self._applyInner(action, resolver)
   def _applyInner(self, action, resolver):
@@ -106,6 +109,16 @@ class Compound(CompoundBase):
           self.__allAfter = False
       else:
         self.warning("Assemblage element has no '_applyInner' method (element=%(e)s)." % {'e':element})
+  def __iter__(self):
+    '''
+    Iterates over the compound's elements.
+    '''
+    return iter(self.__elements)
+  def __len__(self):
+    '''
+    Returns the number of elements in the compound.
+    '''
+    return len(self.__elements)
   def __repr__(self):
     '''
     Returns a representation of the elements and the action done states
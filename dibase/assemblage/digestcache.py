@@ -12,48 +12,111 @@ License: dual: GPL or BSD.
 '''
 
 from .interfaces import DigestCacheBase
+from .digestrecords import DigestRecords, CompactDigestRecords
 import logging
+import threading
 
 class DigestCache(DigestCacheBase):
   '''
   Caches element resource digest values, loading and writing them back to a
   digest store supporting the DigestStoreBase interface.
-  '''
-  class __DigestRecord:
-    '''
-    Simple record type to keep dirty/clean state with a digest value.
-    '''
-    def __init__(self, digest, dirty):
-      '''
-      Store parameter values as instance data members
-      '''
-      self.digest = digest
-      self.dirty = dirty
 
-  def __init__(self, store):
+  By default the cache is unbounded. If a capacity is given then once the
+  cache holds more than capacity entries the least recently used clean
+  entries are evicted. Dirty entries are never evicted before they have been
+  written back, so the cache may temporarily exceed its capacity. Counts of
+  cache hits, misses (lookups passed on to the digest store) and evictions
+  are available from the statistics method.
+
+  Access to the digest store is serialised by a lock so that detached dirty
+  entries (see detachDirty) may be written to the store by updateStore on a
+  background thread while the cache continues to be used.
+
+  Records are held either as one object per entry or, for large caches, in
+  a compact array-backed form (see digestrecords.CompactDigestRecords).
+  '''
+  def __init__(self, store, capacity=None, compact=False, digestSize=16):
     '''
     Initialises empty cache. The store parameter is assumed to be an object
     compatible with the DigestStoreBase interface and provides back end
-    storage for cached values to be loaded and written to.
+    storage for cached values to be loaded and written to. The optional
+    capacity parameter is the maximum number of clean entries retained.
+    If compact is True records are held in a CompactDigestRecords object
+    having digestSize byte wide digest slots rather than as one object each.
     '''
     self.__digest_store = store
-    self.__cache = {}
-  def __get_digest(self, element):
+    self.__capacity = capacity
+    ordered = capacity is not None
+    self.__cache = CompactDigestRecords(ordered, digestSize) if compact\
+                   else DigestRecords(ordered)
+    self.__hits = 0
+    self.__misses = 0
+    self.__evictions = 0
+    self.__store_lock = threading.Lock()
+    self.__preloaded_absent = set()
+  def __retrieve(self, key):
     '''
-    Internal helper method. Looks up element digest in the cache. If not
-    found asks the associated digest store to load the digest. If this fails
-    as well assumes the element digest is new and adds it to the cache as a
-    dirty record so it will be written to the store when writeBack is called.
-    Returns the digest value.
+    Internal helper method. Retrieves the digest for key from the digest
+    store while holding the store lock.
     '''
-    element_key = str(element)
-    if element_key not in self.__cache:
-      digest = self.__digest_store.retrieveDigest(element_key)
+    with self.__store_lock:
+      return self.__digest_store.retrieveDigest(key)
+  def __lookup(self, key):
+    '''
+    Internal helper method. Returns the cached (digest, dirty) record for key,
+    or None if there is not one, updating the hit/miss counts and, if
+    bounded, marking the record as most recently used.
+    '''
+    record = self.__cache.get(key)
+    if record is None:
+      self.__misses = self.__misses + 1
+    else:
+      self.__hits = self.__hits + 1
+      self.__cache.touch(key)
+    return record
+  def __insert(self, key, digest, dirty):
+    '''
+    Internal helper method. Caches a record for key as the most recently used
+    entry then evicts clean entries if over capacity. Returns the record.
+    '''
+    self.__cache.set(key, digest, dirty)
+    if self.__capacity is not None:
+      self.__evict()
+    return (digest, dirty)
+  def __evict(self):
+    '''
+    Internal helper method. Evicts least recently used clean entries until
+    the cache is within capacity or only dirty entries remain. The records
+    keep clean entries apart from dirty ones in use order, so each eviction
+    takes constant time.
+    '''
+    while len(self.__cache) > self.__capacity:
+      key = self.__cache.leastRecentlyUsedClean()
+      if key is None:
+        break
+      self.__cache.remove(key)
+      self.__evictions = self.__evictions + 1
+  def __get_digest(self, element, element_key):
+    '''
+    Internal helper method. Looks up element digest in the cache using
+    element_key, the str value of element. If not found asks the associated
+    digest store to load the digest. If this fails as well assumes the
+    element digest is new and adds it to the cache as a dirty record so it
+    will be written to the store when writeBack is called.
+    Returns the (digest, dirty) record.
+    '''
+    record = self.__lookup(element_key)
+    if record is None:
+      if element_key in self.__preloaded_absent:
+        self.__preloaded_absent.discard(element_key)
+        digest = None
+      else:
+        digest = self.__retrieve(element_key)
       if digest:
-        self.__cache[element_key] = self.__DigestRecord(digest, dirty=False)
+        record = self.__insert(element_key, digest, dirty=False)
       else:
-        self.__cache[element_key] = self.__DigestRecord(element.digest(), dirty=True)
-    return self.__cache[element_key]
+        record = self.__insert(element_key, element.digest(), dirty=True)
+    return record
 
   def updateIfDifferent(self, element):
     '''
@@ -69,22 +132,141 @@ class DigestCache(DigestCacheBase):
     made to load it from the associated digest store. If this fails then it is
     assumed this is a new element and a new, dirty, entry is made for it in
     the cache and True is returned.
+    The element key is obtained once per call; for Component elements this
+    is their interned name so cache lookups hash and compare by identity.
     '''
-    cached_digest_record = self.__get_digest(element)
-    if cached_digest_record.dirty:
+    element_key = str(element)
+    cached_digest, dirty = self.__get_digest(element, element_key)
+    if dirty:
       return True
     element_digest = element.digest()
-    if element_digest!=cached_digest_record.digest:
-      self.__cache[str(element)] = self.__DigestRecord(element_digest, dirty=True)
+    if element_digest!=cached_digest:
+      self.__insert(element_key, element_digest, dirty=True)
       return True
     return False
+  @staticmethod
+  def compositeKey(element, action):
+    '''
+    Returns the key under which the composite digest of element recorded after
+    applying action is cached and stored. Composite digest keys start with
+    a NUL character so cannot clash with element names.
+    '''
+    return '\0'.join(['', 'composite', str(action), str(element)])
+  def compositeDigestMatches(self, element, action):
+    '''
+    The element parameter is assumed to provide a compositeDigest method - as
+    provided by assemblage.Component.
+    Returns True if element.compositeDigest() is not None and equal to the
+    composite digest recorded for element after action was last applied to it.
+    Returns False otherwise, including if no composite digest was recorded.
+    '''
+    key = self.compositeKey(element, action)
+    record = self.__lookup(key)
+    if record is None:
+      digest = self.__retrieve(key)
+      if not digest:
+        return False
+      record = self.__insert(key, digest, dirty=False)
+    composite_digest = element.compositeDigest()
+    return composite_digest is not None and composite_digest==record[0]
+  def updateCompositeDigest(self, element, action):
+    '''
+    Records element.compositeDigest() as the composite digest for element after
+    having applied action to it. If different from any previously recorded
+    value the cache entry is marked as dirty to be written back by writeBack.
+    If element.compositeDigest() returns None nothing is recorded.
+    '''
+    composite_digest = element.compositeDigest()
+    if composite_digest is None:
+      return
+    key = self.compositeKey(element, action)
+    record = self.__cache.get(key)
+    if record is None or record[0]!=composite_digest:
+      self.__insert(key, composite_digest, dirty=True)
   def writeBack(self):
     '''
     Write back to the digest store the values of dirty (i.e. updated and new)
     element digests. If successful - that is the digest store update did not
     raise an exception - then all dirty cache entries are marked as clean.
+    If the cache is bounded, entries are then evicted if over capacity.
+    '''
+    self.updateStore(self.__cache.dirtyItems())
+    self.__cache.markClean()
+    if self.__capacity is not None:
+      self.__evict()
+  def supportsPreload(self):
+    '''
+    Returns True if the digest store provides a retrieveDigests method - as
+    does ShardedDigestStore - so preload retrieves digests in one, possibly
+    parallel, call rather than one at a time.
+    '''
+    return hasattr(self.__digest_store, 'retrieveDigests')
+  def preload(self, keys):
+    '''
+    Loads the stored digests for those of keys not already cached into the
+    cache as clean entries. If the digest store provides a retrieveDigests
+    method it is used to retrieve them in one call rather than one at a time.
+    The keys of the most recent preload found to have no stored digest are
+    noted so their first update does not look them up again.
+    '''
+    self.__preloaded_absent = set()
+    missing = [key for key in keys if key not in self.__cache]
+    if not missing:
+      return
+    retrieve_digests = getattr(self.__digest_store, 'retrieveDigests', None)
+    with self.__store_lock:
+      if retrieve_digests:
+        digests = retrieve_digests(missing)
+      else:
+        digests = dict((key, self.__digest_store.retrieveDigest(key)) for key in missing)
+    for key in missing:
+      digest = digests.get(key)
+      if not digest:
+        self.__preloaded_absent.add(key)
+      elif key not in self.__cache:
+        self.__insert(key, digest, dirty=False)
+  def detachDirty(self, keys):
+    '''
+    Returns a list of (key, digest) pairs for those of the keys having dirty
+    entries, marking those entries as clean. The caller becomes responsible
+    for writing the pairs to the digest store - by calling updateStore - and
+    for calling markDirty with them should that fail.
+    '''
+    pairs = []
+    for key in keys:
+      record = self.__cache.get(key)
+      if record is not None and record[1]:
+        pairs.append((key, record[0]))
+        self.__cache.set(key, record[0], False)
+    return pairs
+  def markDirty(self, nameDigestPairs):
+    '''
+    Marks the entries for (key, digest) pairs previously returned by
+    detachDirty as dirty again so they are written back by a later writeBack.
+    Entries updated since being detached are left as they are and evicted
+    entries are re-added.
+    '''
+    for key, digest in nameDigestPairs:
+      record = self.__cache.get(key)
+      if record is None or (record[0]==digest and not record[1]):
+        self.__insert(key, digest, dirty=True)
+  def updateStore(self, nameDigestPairs):
+    '''
+    Updates the digest store with a sequence of (key, digest) pairs. May be
+    called on a thread other than the one using the cache.
+    '''
+    with self.__store_lock:
+      self.__digest_store.update(nameDigestPairs)
+  def statistics(self):
+    '''
+    Returns a dictionary of cache statistics: 'hits' and 'misses' - the number
+    of lookups found and not found in the cache, 'evictions' - the number of
+    entries evicted, 'entries' - the number of entries currently cached and
+    'capacity' - the capacity or None if unbounded.
     '''
-    self.__digest_store.update([(k,v.digest) for k,v in self.__cache.items() if v.dirty])
-    for v in self.__cache.values():
-      if v.dirty:
-        v.dirty = False
+    return  { 'hits' : self.__hits
+            , 'misses' : self.__misses
+            , 'evictions' : self.__evictions
+            , 'entries' : len(self.__cache)
+            , 'capacity' : self.__capacity
+            }
@@ -0,0 +1,237 @@
+#! /usr/bin/python3
+# v3.4+
+'''
+Part of the dibase/assemblage package.
+A tool to apply actions to multi-part constructs.
+
+Definition of the DigestRecords and CompactDigestRecords classes used by
+DigestCache to hold its records, and related entities.
+
+Developed by R.E. McArdell / Dibase Limited.
+Copyright (c) 2015 Dibase Limited
+License: dual: GPL or BSD.
+'''
+
+from collections import OrderedDict
+
+class DigestRecords:
+  '''
+  Holds (digest, dirty) records keyed by name, one record object per key.
+  If ordered the keys of clean records are kept in least to most recently
+  used order, keys being moved to the most recently used end by touch and
+  set. Dirty records are not in the order, so the least recently used clean
+  record is found in constant time however many records are dirty. Records
+  marked clean join the order at its most recently used end.
+  '''
+  class __DigestRecord:
+    '''
+    Simple record type to keep dirty/clean state with a digest value.
+    '''
+    def __init__(self, digest, dirty):
+      '''
+      Store parameter values as instance data members
+      '''
+      self.digest = digest
+      self.dirty = dirty
+
+  def __init__(self, ordered=False):
+    '''
+    Initialises an empty set of records, optionally ordered by use.
+    '''
+    self.__ordered = ordered
+    self.__records = {}
+    self.__clean = OrderedDict()
+  def __len__(self):
+    return len(self.__records)
+  def __contains__(self, key):
+    return key in self.__records
+  def get(self, key):
+    '''
+    Returns a (digest, dirty) pair for key or None if there is no record.
+    '''
+    record = self.__records.get(key)
+    return None if record is None else (record.digest, record.dirty)
+  def set(self, key, digest, dirty):
+    '''
+    Adds or replaces the record for key as the most recently used record.
+    '''
+    self.__records[key] = self.__DigestRecord(digest, dirty)
+    if self.__ordered:
+      if dirty:
+        self.__clean.pop(key, None)
+      else:
+        self.__clean[key] = None
+        self.__clean.move_to_end(key)
+  def touch(self, key):
+    '''
+    Marks the record for key, if clean, as the most recently used.
+    '''
+    if key in self.__clean:
+      self.__clean.move_to_end(key)
+  def leastRecentlyUsedClean(self):
+    '''
+    Returns the key of the least recently used clean record, or None if
+    there are no clean records or the records are not ordered.
+    '''
+    return next(iter(self.__clean), None)
+  def remove(self, key):
+    '''
+    Removes the record for key.
+    '''
+    del self.__records[key]
+    self.__clean.pop(key, None)
+  def dirtyItems(self):
+    '''
+    Returns a list of (key, digest) pairs for all dirty records.
+    '''
+    return [(k,v.digest) for k,v in self.__records.items() if v.dirty]
+  def markClean(self):
+    '''
+    Marks all records as clean.
+    '''
+    for k,v in self.__records.items():
+      if v.dirty:
+        v.dirty = False
+        if self.__ordered:
+          self.__clean[k] = None
+
+class CompactDigestRecords:
+  '''
+  Holds (digest, dirty) records keyed by name compactly: a key to slot index
+  map, a list of keys by slot, one contiguous bytearray holding the digests
+  in fixed width slots (plus one byte per slot for the digest length) and a
+  bit array of dirty flags. Digests that are not bytes values or are longer
+  than the slot width are held separately.
+  Dirty records are found by scanning the dirty bit array a byte (8 records)
+  at a time. Slots of removed records are reused.
+  If ordered the keys of clean records are kept in least to most recently
+  used order as for DigestRecords.
+  '''
+  def __init__(self, ordered=False, digestSize=16):
+    '''
+    Initialises an empty set of records with slots digestSize bytes wide -
+    16 bytes fits MD5 digests - optionally ordered by use.
+    '''
+    if not 0 < digestSize < 256:
+      raise ValueError("CompactDigestRecords: Expected digestSize in range 1..255, got %s" % digestSize)
+    self.__ordered = ordered
+    self.__digest_size = digestSize
+    self.__slots = {}
+    self.__clean = OrderedDict()
+    self.__keys = []
+    self.__digests = bytearray()
+    self.__lengths = bytearray()
+    self.__dirty = bytearray()
+    self.__overflow = {}
+    self.__free = []
+    self.__dirty_count = 0
+  def __len__(self):
+    return len(self.__slots)
+  def __contains__(self, key):
+    return key in self.__slots
+  def __is_dirty(self, slot):
+    return self.__dirty[slot >> 3] & (1 << (slot & 7))
+  def __set_dirty(self, slot, dirty):
+    if bool(self.__is_dirty(slot)) != bool(dirty):
+      self.__dirty[slot >> 3] ^= (1 << (slot & 7))
+      self.__dirty_count = self.__dirty_count + (1 if dirty else -1)
+  def __digest(self, slot):
+    if slot in self.__overflow:
+      return self.__overflow[slot]
+    offset = slot * self.__digest_size
+    return bytes(self.__digests[offset:offset + self.__lengths[slot]])
+  def __allocate(self, key):
+    '''
+    Internal helper method. Returns a free slot for key, growing the arrays
+    if there are no free slots.
+    '''
+    if self.__free:
+      slot = self.__free.pop()
+      self.__keys[slot] = key
+    else:
+      slot = len(self.__keys)
+      self.__keys.append(key)
+      self.__digests.extend(bytes(self.__digest_size))
+      self.__lengths.append(0)
+      if slot >> 3 >= len(self.__dirty):
+        self.__dirty.append(0)
+    return slot
+  def get(self, key):
+    '''
+    Returns a (digest, dirty) pair for key or None if there is no record.
+    '''
+    slot = self.__slots.get(key)
+    if slot is None:
+      return None
+    return (self.__digest(slot), bool(self.__is_dirty(slot)))
+  def set(self, key, digest, dirty):
+    '''
+    Adds or replaces the record for key as the most recently used record.
+    '''
+    slot = self.__slots.get(key)
+    if slot is None:
+      slot = self.__allocate(key)
+      self.__slots[key] = slot
+    if self.__ordered:
+      if dirty:
+        self.__clean.pop(key, None)
+      else:
+        self.__clean[key] = None
+        self.__clean.move_to_end(key)
+    self.__overflow.pop(slot, None)
+    if isinstance(digest, bytes) and len(digest) <= self.__digest_size:
+      offset = slot * self.__digest_size
+      self.__digests[offset:offset + len(digest)] = digest
+      self.__lengths[slot] = len(digest)
+    else:
+      self.__overflow[slot] = digest
+    self.__set_dirty(slot, dirty)
+  def touch(self, key):
+    '''
+    Marks the record for key, if clean, as the most recently used.
+    '''
+    if key in self.__clean:
+      self.__clean.move_to_end(key)
+  def leastRecentlyUsedClean(self):
+    '''
+    Returns the key of the least recently used clean record, or None if
+    there are no clean records or the records are not ordered.
+    '''
+    return next(iter(self.__clean), None)
+  def remove(self, key):
+    '''
+    Removes the record for key, freeing its slot for reuse.
+    '''
+    slot = self.__slots.pop(key)
+    self.__clean.pop(key, None)
+    self.__set_dirty(slot, False)
+    self.__overflow.pop(slot, None)
+    self.__keys[slot] = None
+    self.__free.append(slot)
+  def __dirty_slots(self):
+    '''
+    Internal helper method. Yields the slots of dirty records by scanning
+    the dirty bit array.
+    '''
+    if not self.__dirty_count:
+      return
+    for index, bits in enumerate(self.__dirty):
+      if bits:
+        base = index << 3
+        for bit in range(8):
+          if bits & (1 << bit):
+            yield base + bit
+  def dirtyItems(self):
+    '''
+    Returns a list of (key, digest) pairs for all dirty records.
+    '''
+    return [(self.__keys[slot], self.__digest(slot)) for slot in self.__dirty_slots()]
+  def markClean(self):
+    '''
+    Marks all records as clean.
+    '''
+    if self.__ordered:
+      for slot in self.__dirty_slots():
+        self.__clean[self.__keys[slot]] = None
+    self.__dirty[:] = bytes(len(self.__dirty))
+    self.__dirty_count = 0
@@ -0,0 +1,317 @@
+#! /usr/bin/python3
+# v3.4+
+'''
+Part of the dibase/assemblage package.
+A tool to apply actions to multi-part constructs.
+
+Definition of the DigestStoreCollector class and related entities.
+
+May be run as a script to report on and collect a digest store:
+  python3 -m dibase.assemblage.digeststorecollector --store PATH --max-age N
+
+Developed by R.E. McArdell / Dibase Limited.
+Copyright (c) 2015 Dibase Limited
+License: dual: GPL or BSD.
+'''
+
+from .digestcache import DigestCache
+from .filelock import FileLock
+import tempfile
+import json
+import glob
+import os
+
+class DigestStoreCollector:
+  '''
+  Removes stale records - those of elements no longer in an assemblage - from
+  a digest store, which otherwise grows for ever as elements come and go.
+
+  Each successful apply of an action to an assemblage is recorded as a new
+  generation: the names of all the assemblage's elements, and the action, are
+  noted as last seen in that generation. Elements and actions not seen in the
+  last maxAge + 1 generations are stale. A collection removes the records of
+  stale elements, and the composite digest records for stale elements or
+  actions. With a maxAge of 0 a collection removes all records not for the
+  elements in the most recent apply.
+
+  The last seen generations are kept in a JSON file, by default
+  DigestStoreCollector.defaultPath(). The file may be shared by several
+  processes - as may the store: recording an apply and collecting each hold
+  a lock file, the file's pathname with '.lock' appended, exclusively while
+  they re-read, update and rewrite it, so concurrent applies' generations
+  are merged. Applies by any sharing process count as generations, so where
+  processes applying to different assemblages share the file maxAge should
+  be at least the number of applies that may be made by the other processes
+  between two of one process's applies. Collecting requires a digest store
+  providing names and remove methods - such as ShelfDigestStore and
+  JournalDigestStore - or a retain method - such as MappedDigestStore. If the
+  store has a compact method it is called after records have been removed.
+  A store having a supportsCollection method - such as ShardedDigestStore -
+  is asked whether it supports each of these methods.
+
+  Set on an assemblage's Blueprint using Blueprint.setDigestStoreCollector
+  for applies to be recorded and, if collectEvery is given, collections made
+  every collectEvery applies.
+  '''
+  @staticmethod
+  def defaultPath():
+    '''
+    Returns the default last seen generations file pathname to use if a
+    specific pathname is not passed in DigestStoreCollector construction.
+    '''
+    return '.__assemblage-ages__'
+
+  def __init__(self, store, pathname=None, maxAge=0, collectEvery=None):
+    '''
+    Creates a collector for the digest store object store, keeping last seen
+    generations in the file given by pathname, which if None or omitted is
+    DigestStoreCollector.defaultPath(). Records not seen in the last maxAge
+    generations are stale. If collectEvery is not None a collection is made
+    every collectEvery recorded applies.
+    '''
+    self.store = store
+    self.pathname = pathname if pathname else self.defaultPath()
+    self.maxAge = maxAge
+    self.collectEvery = collectEvery
+    self.__lock = FileLock(self.pathname + '.lock')
+    self.__ages = None
+
+  def __read(self):
+    '''
+    Internal helper method. Reads and returns the last seen generations.
+    '''
+    try:
+      with open(self.pathname, 'r', encoding='utf-8') as file:
+        return json.load(file)
+    except FileNotFoundError:
+      return {'generation':0, 'names':{}, 'actions':{}}
+
+  def __load(self):
+    '''
+    Internal helper method. On first use reads the last seen generations.
+    '''
+    if self.__ages is None:
+      with self.__lock.shared():
+        self.__ages = self.__read()
+    return self.__ages
+
+  def __save(self):
+    '''
+    Internal helper method. Atomically replaces the last seen generations
+    file. Must be called with the lock held exclusively.
+    '''
+    directory = os.path.dirname(self.pathname) or '.'
+    fd, temp_path = tempfile.mkstemp(dir=directory, prefix='.assemblage-')
+    try:
+      with os.fdopen(fd, 'w', encoding='utf-8') as file:
+        json.dump(self.__ages, file)
+      os.replace(temp_path, self.pathname)
+    except:
+      if os.path.exists(temp_path):
+        os.remove(temp_path)
+      raise
+
+  def __store_supports(self, method):
+    '''
+    Internal helper method. Returns True if the digest store provides, and if
+    it says which it supports, supports the method named by method.
+    '''
+    supports = getattr(self.store, 'supportsCollection', None)
+    return hasattr(self.store, method) and (supports is None or supports(method))
+
+  def generation(self):
+    '''
+    Returns the number of applies recorded.
+    '''
+    return self.__load()['generation']
+
+  def recordApply(self, elements, action):
+    '''
+    Called by Assemblage after action has been applied to its top level
+    elements. Records the action and the names of all elements reachable from
+    elements as seen in a new generation then, if due, makes a collection.
+    The generations are re-read while holding the lock so those recorded by
+    other processes are kept.
+    '''
+    names_seen = []
+    seen = set()
+    pending = list(elements)
+    while pending:
+      element = pending.pop()
+      if id(element) in seen:
+        continue
+      seen.add(id(element))
+      names_seen.append(str(element))
+      subelements = getattr(element, 'elements', None)
+      if callable(subelements):
+        pending.extend(subelements())
+    with self.__lock.exclusive():
+      ages = self.__read()
+      generation = ages['generation'] + 1
+      ages['generation'] = generation
+      ages['actions'][str(action)] = generation
+      names = ages['names']
+      for name in names_seen:
+        names[name] = generation
+      self.__ages = ages
+      self.__save()
+    if self.collectEvery and generation % self.collectEvery == 0:
+      self.collect()
+
+  def __live(self, last_seen):
+    '''
+    Internal helper method. Returns the set of names in the last_seen name to
+    generation map seen in the last maxAge + 1 generations.
+    '''
+    oldest = self.generation() - self.maxAge
+    return set(name for name, generation in last_seen.items() if generation >= oldest)
+
+  def isLive(self, recordName, liveNames=None, liveActions=None):
+    '''
+    Returns True if the record named recordName - an element name or
+    composite digest key - is not stale.
+    '''
+    ages = self.__load()
+    live_names = self.__live(ages['names']) if liveNames is None else liveNames
+    live_actions = self.__live(ages['actions']) if liveActions is None else liveActions
+    if recordName.startswith('\0'):
+      parts = recordName.split('\0', 3)
+      return len(parts)==4 and parts[1]=='composite'\
+             and parts[2] in live_actions and parts[3] in live_names
+    return recordName in live_names
+
+  def storeSize(self):
+    '''
+    Returns the total size in bytes of the digest store's files - those whose
+    pathnames start with the store's pathname.
+    '''
+    pathname = getattr(self.store, 'pathname', None)
+    if not pathname:
+      return None
+    return sum(os.path.getsize(path) for path in glob.glob(glob.escape(pathname) + '*')
+               if os.path.isfile(path)
+              )
+
+  def collect(self, dryRun=False):
+    '''
+    Removes the stale records from the digest store - or if dryRun is True
+    only counts them - and returns a report dictionary (see report) having
+    the additional items 'removed' - the number of stale records - and
+    'sizeAfter' - the store size after collection. Raises RuntimeError if no
+    applies have been recorded, as then all records would be stale. The lock
+    is held exclusively throughout, so applies recorded by other processes
+    while collecting cannot have their records removed.
+    '''
+    with self.__lock.exclusive():
+      self.__ages = self.__read()
+      return self.__collect(dryRun)
+
+  def __collect(self, dryRun):
+    '''
+    Internal helper method. Performs collect with the lock held.
+    '''
+    ages = self.__ages
+    if not ages['generation']:
+      raise RuntimeError("DigestStoreCollector: No applies recorded for store '%s'"
+                        % getattr(self.store, 'pathname', self.store)
+                        )
+    result = self.report()
+    live_names = self.__live(ages['names'])
+    live_actions = self.__live(ages['actions'])
+    if self.__store_supports('names') and self.__store_supports('remove'):
+      stale = [ name for name in self.store.names()
+                if not self.isLive(name, live_names, live_actions)
+              ]
+      removed = len(stale)
+      if stale and not dryRun:
+        self.store.remove(stale)
+    elif self.__store_supports('retain'):
+      live_keys = set(live_names)
+      for name in live_names:
+        for action in live_actions:
+          live_keys.add(DigestCache.compositeKey(name, action))
+      removed = self.store.retain(live_keys, dryRun=dryRun)
+    else:
+      raise TypeError("DigestStoreCollector: Digest store does not support removing records")
+    if removed and not dryRun:
+      if self.__store_supports('compact'):
+        self.store.compact()
+      ages['names'] = dict((n,g) for n,g in ages['names'].items() if n in live_names)
+      ages['actions'] = dict((a,g) for a,g in ages['actions'].items() if a in live_actions)
+      self.__save()
+    result['removed'] = removed
+    result['sizeAfter'] = self.storeSize()
+    return result
+
+  def report(self):
+    '''
+    Returns a dictionary reporting on the digest store: 'generation' - the
+    number of applies recorded, 'entries' - the number of store records if
+    known, 'size' - the store size in bytes, 'ages' - a dictionary mapping
+    ages, in generations, to the number of element names last seen at that
+    age and 'actions' - a dictionary mapping recorded actions to their ages.
+    '''
+    ages = self.__load()
+    generation = ages['generation']
+    by_age = {}
+    for name_generation in ages['names'].values():
+      age = generation - name_generation
+      by_age[age] = by_age.get(age, 0) + 1
+    if self.__store_supports('names'):
+      entries = len(self.store.names())
+    elif hasattr(self.store, '__len__'):
+      entries = len(self.store)
+    else:
+      entries = None
+    return  { 'generation' : generation
+            , 'entries' : entries
+            , 'size' : self.storeSize()
+            , 'ages' : by_age
+            , 'actions' : dict((a, generation - g) for a,g in ages['actions'].items())
+            }
+
+  @staticmethod
+  def formatReport(report):
+    '''
+    Returns a report dictionary, as returned by report or collect, as text.
+    '''
+    lines = [ "Applies recorded: %s" % report['generation']
+            , "Store entries: %s" % report['entries']
+            , "Store size: %s bytes" % report['size']
+            ]
+    if 'removed' in report:
+      lines.append("Stale entries removed: %s" % report['removed'])
+      lines.append("Store size after collection: %s bytes" % report['sizeAfter'])
+    lines.append("Element names by age (applies since last seen):")
+    for age in sorted(report['ages']):
+      lines.append("  %(a)6d: %(n)d" % {'a':age, 'n':report['ages'][age]})
+    lines.append("Actions by age:")
+    for action in sorted(report['actions']):
+      lines.append("  %(x)s: %(a)d" % {'x':action, 'a':report['actions'][action]})
+    return '\n'.join(lines)
+
+if __name__ == '__main__':
+  import argparse
+  from .shelfdigeststore import ShelfDigestStore
+  from .journaldigeststore import JournalDigestStore
+  from .mappeddigeststore import MappedDigestStore
+  store_kinds = { 'shelf' : ShelfDigestStore
+                , 'journal' : JournalDigestStore
+                , 'mapped' : MappedDigestStore
+                }
+  parser = argparse.ArgumentParser(description='Report on and remove stale records from an assemblage digest store.')
+  parser.add_argument('--store', default=None, help='digest store pathname (default: the kind of store\'s default)')
+  parser.add_argument('--kind', choices=sorted(store_kinds), default='shelf')
+  parser.add_argument('--ages', default=None, help='last seen generations file pathname')
+  parser.add_argument('--max-age', type=int, default=0)
+  parser.add_argument('--dry-run', action='store_true', help='report stale records without removing them')
+  parser.add_argument('--report-only', action='store_true', help='report without collecting')
+  args = parser.parse_args()
+  collector = DigestStoreCollector(store_kinds[args.kind](args.store), args.ages, args.max_age)
+  if args.report_only:
+    print(DigestStoreCollector.formatReport(collector.report()))
+  else:
+    try:
+      print(DigestStoreCollector.formatReport(collector.collect(args.dry_run)))
+    except RuntimeError as e:
+      parser.exit(1, "%s\n" % e)
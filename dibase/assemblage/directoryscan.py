@@ -0,0 +1,226 @@
+#! /usr/bin/python3
+# v3.5+
+'''
+Part of the dibase/assemblage package.
+A tool to apply actions to multi-part constructs.
+
+Definition of the DirectoryScan class and related entities.
+
+Developed by R.E. McArdell / Dibase Limited.
+Copyright (c) 2015 Dibase Limited
+License: dual: GPL or BSD.
+'''
+
+from concurrent.futures import ThreadPoolExecutor
+import tempfile
+import time
+import json
+import re
+import os
+
+class DirectoryScan:
+  '''
+  Callable source of element names - usually obtained by calling
+  Blueprint.scan and passed as an addElements names (or elements) argument -
+  that returns the sorted pathnames of the files matching a path pattern:
+
+    blueprint.addElements(Blueprint.scan('src/**/*.csv'), FileComponent)
+
+  Patterns are '/' separated. Within a pattern component '*' matches any
+  characters, '?' any one character and '[...]' any one of the enclosed
+  characters - as for the Python library glob module - and a '**' component
+  matches zero or more directories. Names starting with '.' are not matched
+  unless hidden is True.
+
+  Directories are listed with os.scandir, those at the same depth being
+  listed in parallel if threads is more than 1. If a cache pathname is given
+  the listing of each directory is cached in that file keyed by the
+  directory's modification time so on later scans directories that have not
+  changed are not listed again but are only stat-ed. Directories modified
+  within racyWindow seconds of being listed are not cached.
+  '''
+  def __init__(self, pattern, threads=1, cachePath=None, hidden=False, racyWindow=2.0):
+    '''
+    Creates a scan for files matching pattern, listing directories on up to
+    threads threads and caching listings in the file given by cachePath if it
+    is not None.
+    '''
+    self.pattern = pattern
+    self.threads = threads
+    self.cachePath = cachePath
+    self.hidden = hidden
+    self.racyWindow = racyWindow
+    parts = [part for part in re.split(r'[/\\]' if os.sep == '\\' else '/', pattern) if part]
+    literal = 0
+    while literal < len(parts) - 1 and not re.search(r'[*?\[]', parts[literal]):
+      literal = literal + 1
+    if pattern.startswith(('/', os.sep)):
+      self.__base = os.sep + os.path.join(*parts[:literal]) if literal else os.sep
+    else:
+      self.__base = os.path.join(*parts[:literal]) if literal else ''
+    self.__parts = parts[literal:]
+    self.__recursive = '**' in self.__parts
+    self.__descend_parts = self.__parts[:self.__parts.index('**')] if self.__recursive\
+                           else self.__parts[:-1]
+    self.__descend_regexes = [re.compile(self.__translate(part)) for part in self.__descend_parts]
+    self.__regex = re.compile(self.__translate_path(self.__parts))
+    self.__statistics = {'directories':0, 'listed':0, 'cached':0}
+
+  @staticmethod
+  def __translate(component):
+    '''
+    Internal helper method. Returns a regular expression string matching
+    the pattern component string.
+    '''
+    regex = ''
+    index = 0
+    while index < len(component):
+      c = component[index]
+      index = index + 1
+      if c == '*':
+        regex = regex + '[^/]*'
+      elif c == '?':
+        regex = regex + '[^/]'
+      elif c == '[' and component.find(']', index + 1) > 0:
+        end = component.find(']', index + 1)
+        chars = component[index:end]
+        regex = regex + '[' + ('^' + chars[1:] if chars.startswith('!') else chars).replace('\\', '\\\\') + ']'
+        index = end + 1
+      else:
+        regex = regex + re.escape(c)
+    return regex + r'\Z'
+
+  @classmethod
+  def __translate_path(cls, parts):
+    '''
+    Internal helper method. Returns a regular expression string matching
+    '/' separated relative paths matching the pattern components in parts.
+    '''
+    regex = ''
+    for index, part in enumerate(parts):
+      last = index == len(parts) - 1
+      if part == '**':
+        regex = regex + ('.+' if last else '(?:[^/]+/)*')
+      else:
+        component = cls.__translate(part)[:-2]
+        regex = regex + component + ('' if last else '/')
+    return regex + r'\Z'
+
+  def __load_cache(self):
+    '''
+    Internal helper method. Returns the 'directory:[mtime_ns, files,
+    subdirectories]' cached listings, empty if there is no cache.
+    '''
+    if not self.cachePath:
+      return {}
+    try:
+      with open(self.cachePath, 'r', encoding='utf-8') as file:
+        cache = json.load(file)
+      return cache['directories'] if cache.get('version') == 1 else {}
+    except (FileNotFoundError, ValueError, KeyError, TypeError, AttributeError):
+      return {}
+
+  def __save_cache(self, listings):
+    '''
+    Internal helper method. Atomically replaces the cache file with the
+    directory listings.
+    '''
+    directory = os.path.dirname(self.cachePath) or '.'
+    fd, temp_path = tempfile.mkstemp(dir=directory, prefix='.assemblage-')
+    try:
+      with os.fdopen(fd, 'w', encoding='utf-8') as file:
+        json.dump({'version':1, 'directories':listings}, file)
+      os.replace(temp_path, self.cachePath)
+    except:
+      if os.path.exists(temp_path):
+        os.remove(temp_path)
+      raise
+
+  def __list(self, directory, cached):
+    '''
+    Internal helper method. Returns a (listing, listed) pair for directory
+    where listing is [mtime_ns, files, subdirectories] - or None if the
+    directory cannot be listed - and listed is False if the cached listing
+    was used.
+    '''
+    try:
+      mtime_ns = os.stat(directory or '.').st_mtime_ns
+    except OSError:
+      return None, False
+    if cached and cached[0] == mtime_ns:
+      return cached, False
+    files = []
+    subdirectories = []
+    try:
+      for entry in list(os.scandir(directory or '.')):
+        if not self.hidden and entry.name.startswith('.'):
+          continue
+        if entry.is_dir(follow_symlinks=False):
+          subdirectories.append(entry.name)
+        elif entry.is_file():
+          files.append(entry.name)
+    except OSError:
+      return None, True
+    return [mtime_ns, sorted(files), sorted(subdirectories)], True
+
+  def names(self):
+    '''
+    Scans for and returns the sorted list of pathnames of the files matching
+    the pattern, updating the listing cache if there is one.
+    '''
+    cache = self.__load_cache()
+    listings = {}
+    matches = []
+    statistics = {'directories':0, 'listed':0, 'cached':0}
+    level = [(self.__base, '', 0)]
+    executor = ThreadPoolExecutor(max_workers=self.threads) if self.threads > 1 else None
+    def list_directory(item):
+      return self.__list(item[0], cache.get(item[0]))
+    try:
+      while level:
+        listed = executor.map(list_directory, level) if executor and len(level) > 1\
+                 else map(list_directory, level)
+        next_level = []
+        for (directory, relative, depth), (listing, was_listed) in zip(level, listed):
+          if listing is None:
+            continue
+          outcome = 'listed' if was_listed else 'cached'
+          statistics['directories'] = statistics['directories'] + 1
+          statistics[outcome] = statistics[outcome] + 1
+          if not was_listed or listing[0] < (time.time() - self.racyWindow) * 1e9:
+            listings[directory] = listing
+          mtime_ns, files, subdirectories = listing
+          for name in files:
+            path = relative + name
+            if self.__regex.match(path):
+              matches.append(os.path.join(directory, name))
+          for name in subdirectories:
+            if depth < len(self.__descend_parts):
+              if not self.__descend_regexes[depth].match(name):
+                continue
+            elif not self.__recursive:
+              continue
+            next_level.append((os.path.join(directory, name), relative + name + '/', depth + 1))
+        level = next_level
+    finally:
+      if executor:
+        executor.shutdown()
+    self.__statistics = statistics
+    if self.cachePath and listings != cache:
+      self.__save_cache(listings)
+    return sorted(matches)
+
+  def statistics(self):
+    '''
+    Returns a dictionary of counts for the last scan: 'directories' - the
+    number of directories scanned, 'listed' - the number listed and 'cached' -
+    the number whose cached listing was used.
+    '''
+    return dict(self.__statistics)
+
+  def __call__(self, view=None):
+    '''
+    Returns names(), so a DirectoryScan can be passed as a Blueprint
+    addElements names or elements argument. The element view is not used.
+    '''
+    return self.names()
@@ -22,7 +22,27 @@ class FileComponent(Component):
   the file's pathname.
   The main effect on the behaviour is to provide a digest method that returns
   an MD5 digest of the contents of the file.
+
+  Classes for very large files may enable sampled digests by setting the
+  sampleBlocks class attribute to a non-zero number of blocks. A file of
+  more than sampleBlocks + 2 blocks of sampleBlockSize bytes then also has a
+  sample digest computed from its size, first and last blocks and
+  sampleBlocks evenly spaced blocks in between. If the assemblage has a
+  FileSnapshot in which the file of a leaf component has changed status and
+  the new sample differs from the previous one, the file has definitely
+  changed and its digest is a sampled digest - the MD5 digest of
+  SampledDigestPrefix followed by the sample digest (see sampledDigest) -
+  rather than the MD5 digest of its whole contents. Sampled digests are the
+  same size as whole file digests so fit the fixed width digest slots of
+  compact digest records and MappedDigestStore. The whole file is only
+  read if the samples match. As a sampled digest only distinguishes the
+  file's contents from their previous state, such classes should not be
+  used as inputs to elements whose outputs are kept in an artifact cache.
   '''
+  sampleBlocks = 0
+  sampleBlockSize = 65536
+  SampledDigestPrefix = b'sampled:'
+
   def __init__(self, name, attributes, elements=[], logger=None):
     '''
     Passes all parameters on to the Component base.
@@ -38,15 +58,117 @@ class FileComponent(Component):
     if not self._path:
       self._path = os.path.abspath(os.path.expanduser(str(self)))
     return self._path
+  def outputPaths(self):
+    '''
+    Returns a list containing the normalisedPath() of the component's file.
+    '''
+    return [self.normalisedPath()]
+  def stat(self):
+    '''
+    Returns the os.stat_result for the file at normalisedPath(), or None if
+    it does not exist. If the element belongs to an assemblage the result is
+    obtained via the assemblage's apply-scoped StatCache so the file is
+    stat-ed at most once per apply.
+    '''
+    path = self.normalisedPath()
+    cache = self.statCache()
+    if cache:
+      return cache.stat(path)
+    try:
+      return os.stat(path)
+    except (FileNotFoundError, NotADirectoryError):
+      return None
+  def invalidateCachedStatus(self):
+    '''
+    Discards the file status and digest cached for the current apply as the
+    file may have been (re-)written by the element's actions.
+    '''
+    super().invalidateCachedStatus()
+    cache = self.statCache()
+    if cache:
+      cache.invalidate(self.normalisedPath())
+    snapshot = self.fileSnapshot()
+    if snapshot:
+      snapshot.invalidate(self.normalisedPath())
   def doesNotExist(self):
-    does_not_exist = not os.path.exists(self.normalisedPath())
-    self.debug("Target file '%(f)s' does not exist? %(b)s" % {'f':self.normalisedPath(), 'b':does_not_exist})
+    path = self.normalisedPath()
+    cache = self.statCache()
+    does_not_exist = not cache.exists(path) if cache else self.stat() is None
+    self.debug("Target file '%(f)s' does not exist? %(b)s" % {'f':path, 'b':does_not_exist})
     return does_not_exist
 
   def digest(self):
     '''
     Expects the path given by the component's name (str(self)) to exist then
     opens and read the file to create and return its MD5 digest.
+    The digest is cached in the assemblage's StatCache, if any, for the
+    remainder of the apply. If the component has no (sub-)elements and the
+    assemblage has a FileSnapshot the snapshot's digest is used if the file
+    is unchanged since the snapshot was taken, otherwise the computed digest
+    is recorded in the snapshot. For such components of classes enabling
+    sampled digests the digest may be a sampled digest (see class
+    documentation).
+    '''
+    cache = self.statCache()
+    if cache:
+      return cache.value(self.normalisedPath(), 'digest', self.__snapshot_digest)
+    return self.__snapshot_digest()
+
+  def __snapshot_digest(self):
+    '''
+    Internal helper method. Returns the file's digest from the assemblage's
+    FileSnapshot if the component is a leaf and the file is unchanged,
+    otherwise computes it - as a sampled digest if the file's sample digest
+    differs from the snapshot's - recording it in the snapshot for leaves.
+    '''
+    snapshot = self.fileSnapshot()
+    if not snapshot or len(self.elements()):
+      return self.__file_digest()
+    path = self.normalisedPath()
+    digest = snapshot.unchangedDigest(path)
+    if digest is None:
+      stat_result = self.stat()
+      sample = self.sampleDigest(stat_result) if stat_result else None
+      previous_sample = snapshot.previousSample(path)
+      if sample and previous_sample and sample != previous_sample:
+        digest = self.sampledDigest(sample)
+      else:
+        digest = self.__file_digest()
+      snapshot.record(path, stat_result, digest, sample)
+    return digest
+
+  def sampleDigest(self, statResult):
+    '''
+    Returns the MD5 digest of the size and sampled blocks of the file having
+    the os.stat_result statResult, or None if the class does not enable
+    sampled digests or the file is too small to sample.
+    '''
+    size = statResult.st_size
+    block_size = self.sampleBlockSize
+    blocks = self.sampleBlocks
+    if not blocks or size <= (blocks + 2) * block_size:
+      return None
+    hasher = hashlib.md5(size.to_bytes(8, 'big'))
+    step = (size - block_size) / (blocks + 1)
+    with open(self.normalisedPath(), 'rb') as file:
+      for index in range(blocks + 2):
+        file.seek(round(index * step))
+        hasher.update(file.read(block_size))
+    return hasher.digest()
+
+  @classmethod
+  def sampledDigest(cls, sample):
+    '''
+    Returns the sampled digest for the sample digest sample: the 16 byte MD5
+    digest of SampledDigestPrefix followed by sample, so differing from the
+    digest of the file's whole contents.
+    '''
+    return hashlib.md5(cls.SampledDigestPrefix + sample).digest()
+
+  def __file_digest(self):
+    '''
+    Internal helper method. Reads the file to create and return its MD5
+    digest.
     '''
     if self.doesNotExist():
       raise RuntimeError("FileComponent.digest: Expected file '%s' to exist"%self.normalisedPath())
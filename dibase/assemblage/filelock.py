@@ -0,0 +1,74 @@
+#! /usr/bin/python3
+# v3.4+
+'''
+Part of the dibase/assemblage package.
+A tool to apply actions to multi-part constructs.
+
+Definition of the FileLock class and related entities.
+
+Developed by R.E. McArdell / Dibase Limited.
+Copyright (c) 2015 Dibase Limited
+License: dual: GPL or BSD.
+'''
+
+import os
+try:
+  import fcntl
+except ImportError: # e.g. Windows
+  fcntl = None
+
+class FileLock:
+  '''
+  Advisory lock on a lock file used by digest stores so that several
+  processes - or threads - can safely share a store. Any number of shared
+  holders or a single exclusive holder may hold the lock at a time:
+
+    lock = FileLock('store.lock')
+    with lock.exclusive():
+      ...update store...
+
+  Locks are not re-entrant: a holder must not try to acquire the lock again.
+  The lock file is created if necessary and left in place. Where the fcntl
+  module is not available locking does nothing.
+  '''
+  class __Holder:
+    '''
+    Context manager holding the lock from entry to exit.
+    '''
+    def __init__(self, pathname, operation):
+      self.pathname = pathname
+      self.operation = operation
+      self.fd = None
+    def __enter__(self):
+      if fcntl is not None:
+        self.fd = os.open(self.pathname, os.O_RDWR|os.O_CREAT, 0o666)
+        try:
+          fcntl.flock(self.fd, self.operation)
+        except:
+          os.close(self.fd)
+          raise
+      return self
+    def __exit__(self, *exc_info):
+      if self.fd is not None:
+        os.close(self.fd) # releases the lock
+        self.fd = None
+      return False
+
+  def __init__(self, pathname):
+    '''
+    Creates a lock using the lock file given by pathname.
+    '''
+    self.pathname = pathname
+
+  def shared(self):
+    '''
+    Returns a context manager holding the lock shared with other shared
+    holders.
+    '''
+    return self.__Holder(self.pathname, fcntl and fcntl.LOCK_SH)
+
+  def exclusive(self):
+    '''
+    Returns a context manager holding the lock exclusively.
+    '''
+    return self.__Holder(self.pathname, fcntl and fcntl.LOCK_EX)
@@ -0,0 +1,237 @@
+#! /usr/bin/python3
+# v3.5+
+'''
+Part of the dibase/assemblage package.
+A tool to apply actions to multi-part constructs.
+
+Definition of the FileSnapshot class and related entities.
+
+Developed by R.E. McArdell / Dibase Limited.
+Copyright (c) 2015 Dibase Limited
+License: dual: GPL or BSD.
+'''
+
+from concurrent.futures import ThreadPoolExecutor
+import threading
+import tempfile
+import time
+import json
+import os
+
+class FileSnapshot:
+  '''
+  Persisted snapshot of the status signatures - size, modification time in
+  nanoseconds and inode number - and digests of the files of FileComponent
+  leaf elements (those having no (sub-)elements) as they were when their
+  digests were computed.
+
+  At the start of an apply the snapshot is verified against the file system,
+  listing each directory holding snapshot files once with os.scandir - the
+  directories being listed in parallel on a pool of worker threads. The
+  digests of files whose signatures are unchanged are then used by
+  FileComponent.digest without the files being read. The set of changed
+  paths is available from changedPaths. Digests computed during the apply
+  are recorded and at the end of a successful apply the snapshot file is
+  rewritten with the recorded entries and the verified entries whose
+  digests were used during the apply, so entries for files no longer in
+  the assemblage are dropped rather than kept while the files exist.
+
+  An entry may also hold a sample digest of the file, as computed by
+  FileComponent classes enabling sampled digests, which is available for
+  changed files from previousSample so a change can be detected from a new
+  sample without reading the whole file.
+
+  So that a file modified within the resolution of its file system's
+  modification times after its digest was computed is not taken to be
+  unchanged, files modified within racyWindow seconds of their digest being
+  computed are not recorded.
+
+  Set on an assemblage's Blueprint using Blueprint.setFileSnapshot.
+  '''
+  @staticmethod
+  def defaultPath():
+    '''
+    Returns the default snapshot file pathname to use if a specific pathname
+    is not passed in FileSnapshot construction.
+    '''
+    return '.__assemblage-snapshot__'
+
+  @staticmethod
+  def signature(statResult):
+    '''
+    Returns the (size, mtime_ns, inode) signature tuple for the os.stat_result
+    statResult.
+    '''
+    return (statResult.st_size, statResult.st_mtime_ns, statResult.st_ino)
+
+  def __init__(self, pathname=None, maxWorkers=8, racyWindow=2.0):
+    '''
+    Creates a snapshot kept in the file given by pathname, which if None or
+    omitted is FileSnapshot.defaultPath(). Verification lists directories on
+    up to maxWorkers threads. Files modified within racyWindow seconds of
+    their digest being computed are not recorded.
+    '''
+    self.pathname = pathname if pathname else self.defaultPath()
+    self.maxWorkers = maxWorkers
+    self.racyWindow = racyWindow
+    self.__lock = threading.Lock()
+    self.__unchanged = {}
+    self.__changed = set()
+    self.__previous = {}
+    self.__recorded = {}
+    self.__used = set()
+
+  def __load(self):
+    '''
+    Internal helper method. Returns the path:(signature, digest, sample)
+    entries read from the snapshot file. A missing or unreadable snapshot
+    file has no entries.
+    '''
+    def entry(values):
+      sample = values[4] if len(values) > 4 else None
+      return ( tuple(values[:3]), bytes.fromhex(values[3])
+             , bytes.fromhex(sample) if sample else None
+             )
+    try:
+      with open(self.pathname, 'r', encoding='utf-8') as file:
+        snapshot = json.load(file)
+      return dict( (path, entry(values))
+                   for path, values in snapshot['entries'].items()
+                 )
+    except (FileNotFoundError, ValueError, KeyError, TypeError):
+      return {}
+
+  def __save(self, entries):
+    '''
+    Internal helper method. Atomically replaces the snapshot file with the
+    path:(signature, digest, sample) entries.
+    '''
+    def values(entry):
+      signature, digest, sample = entry
+      return list(signature) + [digest.hex(), sample.hex() if sample else None]
+    snapshot = { 'version' : 1
+               , 'entries' : dict( (path, values(entry))
+                                   for path, entry in entries.items()
+                                 )
+               }
+    directory = os.path.dirname(self.pathname) or '.'
+    fd, temp_path = tempfile.mkstemp(dir=directory, prefix='.assemblage-')
+    try:
+      with os.fdopen(fd, 'w', encoding='utf-8') as file:
+        json.dump(snapshot, file)
+      os.replace(temp_path, self.pathname)
+    except:
+      if os.path.exists(temp_path):
+        os.remove(temp_path)
+      raise
+
+  def verify(self):
+    '''
+    Called by Assemblage at the start of an apply. Reads the snapshot file and
+    compares the signatures of its files with the file system, listing each
+    directory once. Discards any digests recorded by a previous apply and
+    returns the set of snapshot paths that have changed or no longer exist.
+    '''
+    entries = self.__load()
+    by_directory = {}
+    for path in entries:
+      by_directory.setdefault(os.path.dirname(path), []).append(path)
+    def sweep(directory):
+      try:
+        listing = {entry.name:entry for entry in list(os.scandir(directory))}
+      except OSError:
+        return []
+      unchanged = []
+      for path in by_directory[directory]:
+        entry = listing.get(os.path.basename(path))
+        if entry is None:
+          continue
+        try:
+          stat_result = os.stat(path) if entry.is_symlink() else entry.stat()
+        except OSError:
+          continue
+        if self.signature(stat_result) == entries[path][0]:
+          unchanged.append(path)
+      return unchanged
+    directories = list(by_directory)
+    if len(directories) < 2:
+      swept = [sweep(directory) for directory in directories]
+    else:
+      with ThreadPoolExecutor(max_workers=self.maxWorkers) as executor:
+        swept = list(executor.map(sweep, directories))
+    unchanged = {}
+    for paths in swept:
+      for path in paths:
+        unchanged[path] = entries[path]
+    with self.__lock:
+      self.__unchanged = unchanged
+      self.__changed = set(entries) - set(unchanged)
+      self.__previous = dict((path, entries[path]) for path in self.__changed)
+      self.__recorded = {}
+      self.__used = set()
+    return set(self.__changed)
+
+  def changedPaths(self):
+    '''
+    Returns the set of snapshot paths found to have changed, or no longer
+    exist, by the last verify.
+    '''
+    return set(self.__changed)
+
+  def unchangedDigest(self, path):
+    '''
+    Returns the snapshot digest for path if verify found it unchanged and it
+    has not since been invalidated, otherwise None. The path's entry is kept
+    by save.
+    '''
+    with self.__lock:
+      entry = self.__unchanged.get(path)
+      if entry:
+        self.__used.add(path)
+    return entry[1] if entry else None
+
+  def previousSample(self, path):
+    '''
+    Returns the sample digest the snapshot held for path if verify found it
+    changed, otherwise None.
+    '''
+    entry = self.__previous.get(path)
+    return entry[2] if entry else None
+
+  def record(self, path, statResult, digest, sample=None):
+    '''
+    Records the digest, and optional sample digest, for path computed from
+    the file having the os.stat_result statResult, obtained before the file
+    was read. Nothing is recorded if statResult is None, the digest is not a
+    bytes object or the file was modified within racyWindow seconds.
+    '''
+    if statResult is None or not isinstance(digest, bytes):
+      return
+    if statResult.st_mtime_ns > (time.time() - self.racyWindow) * 1e9:
+      return
+    with self.__lock:
+      self.__recorded[path] = (self.signature(statResult), digest, sample)
+
+  def invalidate(self, path):
+    '''
+    Discards any unchanged or recorded digest for path, as it may have been
+    (re-)written.
+    '''
+    with self.__lock:
+      if self.__unchanged.pop(path, None) is not None:
+        self.__changed.add(path)
+      self.__recorded.pop(path, None)
+
+  def save(self):
+    '''
+    Called by Assemblage at the end of a successful apply. Rewrites the
+    snapshot file with the entries found unchanged by verify whose digests
+    were used since, by unchangedDigest, and those recorded since. Entries
+    for paths not used during the apply are dropped.
+    '''
+    with self.__lock:
+      entries = dict( (path, entry) for path, entry in self.__unchanged.items()
+                      if path in self.__used
+                    )
+      entries.update(self.__recorded)
+    self.__save(entries)
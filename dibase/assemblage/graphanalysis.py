@@ -0,0 +1,203 @@
+#! /usr/bin/python3
+# v3.4+
+'''
+Part of the dibase/assemblage package.
+A tool to apply actions to multi-part constructs.
+
+Definition of the GraphAnalysis class and related entities.
+
+Developed by R.E. McArdell / Dibase Limited.
+Copyright (c) 2015 Dibase Limited
+License: dual: GPL or BSD.
+'''
+
+class GraphAnalysis:
+  '''
+  Analyses the shape of the acyclic graph of elements of an Assemblage or
+  Blueprint, or of an iterable of top level elements, in time linear in the
+  number of elements and (sub-)element links:
+
+    report = GraphAnalysis(blueprint, durations).report()
+    print(GraphAnalysis.formatReport(report))
+
+  An element's level is the length of the longest path to it from a top level
+  element, which are at level 0, so an element is at a deeper level than all
+  elements having it as a (sub-)element. The critical path is the path from a
+  top level element to a leaf element having the greatest total duration.
+  Durations are given as a dictionary mapping element names (str(element)) to
+  durations in seconds, such as those recorded for an apply. Elements not in
+  the dictionary have a duration of 0. If no durations are given all elements
+  have a duration of 1 so the critical path is a longest path.
+  '''
+  @staticmethod
+  def subelementsOf(element):
+    '''
+    Returns the list of (sub-)elements of element: the result of calling its
+    elements method if it has one - as do Components - or the value of its
+    elements attribute if that is not callable, or an empty list.
+    '''
+    subelements = getattr(element, 'elements', None)
+    if callable(subelements):
+      subelements = subelements()
+    return list(subelements) if subelements else []
+
+  def __init__(self, source, durations=None):
+    '''
+    Analyses the graph of elements of source: an object with a
+    topLevelElements method - such as a Blueprint - or an elements method -
+    such as an Assemblage - or an iterable of top level elements. durations
+    is an optional 'element name:seconds' dictionary.
+    '''
+    if hasattr(source, 'topLevelElements'):
+      roots = source.topLevelElements()
+    elif callable(getattr(source, 'elements', None)):
+      roots = source.elements()
+    else:
+      roots = source
+    self.durations = durations
+    self.__analyse(list(roots))
+
+  def __duration(self, element):
+    '''
+    Internal helper method. Returns the duration of element.
+    '''
+    if self.durations is None:
+      return 1
+    return self.durations.get(str(element), 0)
+
+  def __analyse(self, roots):
+    '''
+    Internal helper method. Performs a depth first traversal of the graph to
+    obtain the elements in post-order then computes the statistics.
+    '''
+    children = {}
+    elements = {}
+    order = []
+    in_progress = set()
+    done = object()
+    for root in roots:
+      if id(root) in children:
+        continue
+      stack = [(root, None)]
+      while stack:
+        element, pending = stack[-1]
+        key = id(element)
+        if pending is None:
+          if key in children:
+            stack.pop()
+            continue
+          subelements = self.subelementsOf(element)
+          children[key] = [id(e) for e in subelements]
+          elements[key] = element
+          in_progress.add(key)
+          pending = iter(subelements)
+          stack[-1] = (element, pending)
+        subelement = next(pending, done)
+        if subelement is done:
+          stack.pop()
+          in_progress.discard(key)
+          order.append(key)
+        elif id(subelement) in in_progress:
+          raise RuntimeError("Circular reference: Element '%(c)s' is also an ancestor of '%(a)s'"
+                            % {'c':subelement, 'a':element}
+                            )
+        elif id(subelement) not in children:
+          stack.append((subelement, None))
+    fan_in = dict((key, 0) for key in order)
+    for key in order:
+      for child in children[key]:
+        fan_in[child] = fan_in[child] + 1
+    levels = dict((key, 0) for key in order)
+    for key in reversed(order): # parents before (sub-)elements
+      for child in children[key]:
+        levels[child] = max(levels[child], levels[key] + 1)
+    heights = {}
+    weights = {}
+    next_on_path = {}
+    for key in order:          # (sub-)elements before parents
+      height = 0
+      weight = 0
+      for child in children[key]:
+        height = max(height, heights[child])
+        if next_on_path.get(key) is None or weights[child] > weight:
+          weight = weights[child]
+          next_on_path[key] = child
+      heights[key] = height + 1
+      weights[key] = weight + self.__duration(elements[key])
+    root_keys = list(dict.fromkeys(id(root) for root in roots))
+    path = []
+    if root_keys:
+      key = max(root_keys, key=lambda k: weights[k])
+      while key is not None:
+        path.append(key)
+        key = next_on_path.get(key)
+    self.__report = { 'elements' : len(order)
+                    , 'links' : sum(len(c) for c in children.values())
+                    , 'roots' : len(root_keys)
+                    , 'leaves' : sum(1 for c in children.values() if not c)
+                    , 'shared' : sum(1 for n in fan_in.values() if n > 1)
+                    , 'depth' : max(heights.values()) if heights else 0
+                    , 'widths' : self.__histogram(levels.values())
+                    , 'fanIn' : self.__histogram(fan_in.values())
+                    , 'fanOut' : self.__histogram(len(c) for c in children.values())
+                    , 'criticalPath' : [str(elements[key]) for key in path]
+                    , 'criticalPathDuration' : weights[path[0]] if path else 0
+                    }
+
+  @staticmethod
+  def __histogram(values):
+    '''
+    Internal helper method. Returns a dictionary mapping each of values to the
+    number of times it occurs.
+    '''
+    histogram = {}
+    for value in values:
+      histogram[value] = histogram.get(value, 0) + 1
+    return histogram
+
+  def report(self):
+    '''
+    Returns a dictionary of the analysis results:
+      'elements' - the number of distinct elements
+      'links' - the number of element to (sub-)element links (edges)
+      'roots' - the number of top level elements
+      'leaves' - the number of elements having no (sub-)elements
+      'shared' - the number of elements that are (sub-)elements of more than
+                 one element
+      'depth' - the number of elements on the longest path from a top level
+                element to a leaf element
+      'widths' - a dictionary mapping levels to the number of elements at
+                 that level
+      'fanIn' - a dictionary mapping numbers of parent elements to the
+                number of elements having that many parents
+      'fanOut' - a dictionary mapping numbers of (sub-)elements to the
+                 number of elements having that many (sub-)elements
+      'criticalPath' - the list of the names of the elements on the
+                       critical path, from its top level element
+      'criticalPathDuration' - the total duration of the critical path
+    '''
+    return dict(self.__report)
+
+  @staticmethod
+  def formatReport(report):
+    '''
+    Returns a report dictionary, as returned by report, as text.
+    '''
+    lines = [ "Elements: %s" % report['elements']
+            , "Links: %s" % report['links']
+            , "Top level elements: %s" % report['roots']
+            , "Leaf elements: %s" % report['leaves']
+            , "Shared elements: %s" % report['shared']
+            , "Depth: %s" % report['depth']
+            , "Width by level:"
+            ]
+    for level in sorted(report['widths']):
+      lines.append("  %(l)6d: %(n)d" % {'l':level, 'n':report['widths'][level]})
+    for title, key in (("Fan-in (parents: elements):", 'fanIn'), ("Fan-out ((sub-)elements: elements):", 'fanOut')):
+      lines.append(title)
+      for count in sorted(report[key]):
+        lines.append("  %(c)6d: %(n)d" % {'c':count, 'n':report[key][count]})
+    lines.append("Critical path (duration %s):" % report['criticalPathDuration'])
+    for name in report['criticalPath']:
+      lines.append("  %s" % name)
+    return '\n'.join(lines)
@@ -0,0 +1,153 @@
+#! /usr/bin/python3
+# v3.4+
+'''
+Part of the dibase/assemblage package.
+A tool to apply actions to multi-part constructs.
+
+Definition of the GraphExport class and related entities.
+
+Developed by R.E. McArdell / Dibase Limited.
+Copyright (c) 2015 Dibase Limited
+License: dual: GPL or BSD.
+'''
+
+from .graphanalysis import GraphAnalysis
+import json
+
+class GraphExport:
+  '''
+  Exports the acyclic graph of elements of an Assemblage or Blueprint, or of
+  an iterable of top level elements, in Graphviz DOT or JSON format:
+
+    with open('graph.dot', 'w') as file:
+      GraphExport(assemblage, durations).writeDot(file)
+
+  Each element is written - as a node - together with its links to its
+  (sub-)elements as the graph is traversed, so the output is streamed to the
+  file rather than built up in memory. Elements are annotated with their
+  last apply's results where available: the duration from the optional
+  'element name:seconds' durations dictionary, whether the before and after
+  elements actions (hooks) were done and the element's cache status (see
+  Component.queryCacheStatus).
+
+  In DOT output elements are shaded by their duration relative to the longest
+  duration, elements whose outputs were restored from an artifact cache are
+  drawn dashed and those skipped because their composite digest was unchanged
+  are drawn dotted.
+  '''
+  def __init__(self, source, durations=None):
+    '''
+    Exports the graph of elements of source: an object with a
+    topLevelElements method - such as a Blueprint - or an elements method -
+    such as an Assemblage - or an iterable of top level elements. durations
+    is an optional 'element name:seconds' dictionary.
+    '''
+    if hasattr(source, 'topLevelElements'):
+      roots = source.topLevelElements()
+    elif callable(getattr(source, 'elements', None)):
+      roots = source.elements()
+    else:
+      roots = source
+    self.roots = list(roots)
+    self.durations = durations
+
+  def nodes(self):
+    '''
+    Generates a (node number, element, annotations, (sub-)element node numbers)
+    tuple for each distinct element, in breadth first order from the top
+    level elements. Node numbers are consecutive from 0 in the order
+    elements are first encountered. annotations is a dictionary of the
+    element's 'name' and 'kind' - its class' qualified name - and, if known,
+    'duration', 'before', 'after' and 'cache' values.
+    '''
+    numbers = {}
+    pending = []
+    def number(element):
+      key = id(element)
+      if key not in numbers:
+        numbers[key] = len(numbers)
+        pending.append(element)
+      return numbers[key]
+    for root in self.roots:
+      number(root)
+    index = 0
+    while index < len(pending):
+      element = pending[index]
+      index = index + 1
+      subelements = [number(e) for e in GraphAnalysis.subelementsOf(element)]
+      yield numbers[id(element)], element, self.annotations(element), subelements
+      pending[index - 1] = None # written - allow to be forgotten
+
+  def annotations(self, element):
+    '''
+    Returns the annotations dictionary for element (see nodes).
+    '''
+    kind = type(element)
+    annotations = { 'name' : str(element)
+                  , 'kind' : '.'.join([kind.__module__, kind.__qualname__])
+                  }
+    if self.durations is not None and str(element) in self.durations:
+      annotations['duration'] = self.durations[str(element)]
+    for key, query in ( ('before', 'queryBeforeElementsActionsDone')
+                      , ('after', 'queryAfterElementsActionsDone')
+                      , ('cache', 'queryCacheStatus')
+                      ):
+      if callable(getattr(element, query, None)):
+        annotations[key] = getattr(element, query)()
+    return annotations
+
+  @staticmethod
+  def __quote(text):
+    '''
+    Internal helper method. Returns text as a DOT quoted string.
+    '''
+    return '"' + str(text).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') + '"'
+
+  def writeDot(self, file, graphName='assemblage'):
+    '''
+    Writes the graph to the text file object file in Graphviz DOT format.
+    '''
+    longest = max(self.durations.values()) if self.durations else 0
+    file.write('digraph %s {\n' % self.__quote(graphName))
+    file.write('  node [shape=box, style=filled, fillcolor=white];\n')
+    for number, element, annotations, subelements in self.nodes():
+      label = annotations['name']
+      details = []
+      if 'duration' in annotations:
+        details.append('%.3fs' % annotations['duration'])
+      hooks = [h for h in ('before', 'after') if annotations.get(h)]
+      if hooks:
+        details.append('+'.join(hooks))
+      if annotations.get('cache'):
+        details.append(annotations['cache'])
+      if details:
+        label = label + '\n' + ' '.join(details)
+      attributes = [ 'label=' + self.__quote(label)
+                   , 'tooltip=' + self.__quote(annotations['kind'])
+                   ]
+      if longest and 'duration' in annotations:
+        attributes.append('fillcolor="0.000 %.3f 1.000"' % (annotations['duration'] / longest))
+      style = {'restored':'filled,dashed', 'unchanged':'filled,dotted'}.get(annotations.get('cache'))
+      if style:
+        attributes.append('style=' + self.__quote(style))
+      file.write('  n%(n)d [%(a)s];\n' % {'n':number, 'a':', '.join(attributes)})
+      for subelement in subelements:
+        file.write('  n%(n)d -> n%(s)d;\n' % {'n':number, 's':subelement})
+    file.write('}\n')
+
+  def writeJson(self, file):
+    '''
+    Writes the graph to the text file object file as a JSON object having a
+    'nodes' array of node objects each having an 'id' - its node number - an
+    'elements' array of its (sub-)elements' node numbers, and its
+    annotations (see nodes).
+    '''
+    file.write('{"nodes": [')
+    separator = '\n'
+    for number, element, annotations, subelements in self.nodes():
+      node = {'id':number, 'elements':subelements}
+      node.update(annotations)
+      file.write(separator)
+      file.write(json.dumps(node))
+      separator = ',\n'
+    file.write('\n]}\n')
@@ -0,0 +1,173 @@
+#! /usr/bin/python3
+# v3.4+
+'''
+Part of the dibase/assemblage package.
+A tool to apply actions to multi-part constructs.
+
+Definition of the HTTPArtifactCache class and related entities.
+
+Developed by R.E. McArdell / Dibase Limited.
+Copyright (c) 2015 Dibase Limited
+License: dual: GPL or BSD.
+'''
+
+from .interfaces import ArtifactCacheBase
+from concurrent.futures import ThreadPoolExecutor
+import http.client
+import urllib.parse
+import threading
+import tempfile
+import shutil
+import os
+
+class HTTPArtifactCache(ArtifactCacheBase):
+  '''
+  Client for a shared artifact cache served over HTTP, such as one served by
+  assemblage.ArtifactCacheServer. Each file of an entry is got from or put to
+  the URL path /KEY/INDEX below the cache's base URL.
+
+  The files of an entry are transferred in parallel by a pool of worker
+  threads, each of which keeps its HTTP connection open for reuse by later
+  transfers. An unreachable or failing server is treated as a cache miss so
+  never causes actions to fail.
+  '''
+  def __init__(self, url, maxWorkers=4, timeout=30):
+    '''
+    Creates a client for the artifact cache served at url (e.g.
+    'http://localhost:8765'), transferring up to maxWorkers files in parallel
+    over connections having the given timeout in seconds.
+    '''
+    parts = urllib.parse.urlsplit(url)
+    if parts.scheme not in ('http', 'https'):
+      raise ValueError("HTTPArtifactCache: Expected an http or https URL, got '%s'" % url)
+    self.url = url
+    self.__scheme = parts.scheme
+    self.__netloc = parts.netloc
+    self.__base_path = parts.path.rstrip('/')
+    self.__timeout = timeout
+    self.__max_workers = maxWorkers
+    self.__executor = None
+    self.__local = threading.local()
+    self.__connections = []
+    self.__lock = threading.Lock()
+
+  def __connection(self):
+    '''
+    Internal helper method. Returns the calling thread's connection, creating
+    it if necessary.
+    '''
+    connection = getattr(self.__local, 'connection', None)
+    if connection is None:
+      connection_class = http.client.HTTPSConnection if self.__scheme=='https'\
+                         else http.client.HTTPConnection
+      connection = connection_class(self.__netloc, timeout=self.__timeout)
+      self.__local.connection = connection
+      with self.__lock:
+        self.__connections.append(connection)
+    return connection
+
+  def __request(self, method, key, index, body=None, headers={}):
+    '''
+    Internal helper method. Sends a request for file index of the entry for
+    key on the calling thread's connection, retrying once on a fresh
+    connection if the kept alive connection has been dropped. Returns the
+    response, which must be read before the connection is used again.
+    '''
+    path = '/'.join([self.__base_path, key, str(index)])
+    for attempt in (1, 2):
+      connection = self.__connection()
+      try:
+        if body is not None:
+          body.seek(0)
+        connection.request(method, path, body=body, headers=headers)
+        return connection.getresponse()
+      except (http.client.HTTPException, ConnectionError):
+        connection.close()
+        if attempt == 2:
+          raise
+
+  def __map(self, function, items):
+    '''
+    Internal helper method. Calls function for each of items on the worker
+    threads, returning the list of results once all calls have completed.
+    '''
+    if self.__executor is None:
+      self.__executor = ThreadPoolExecutor(max_workers=self.__max_workers)
+    return list(self.__executor.map(function, items))
+
+  def restore(self, key, paths):
+    '''
+    Gets the files of the entry for key in parallel into temporary files
+    alongside paths then, if all were got, moves them into place. Returns
+    True if restored, False if the entry is not complete on the server or the
+    server could not be reached or gave a malformed response. Temporary
+    files are always removed if not moved into place.
+    '''
+    if not key or not paths:
+      return False
+    created = []
+    def get(index_path):
+      index, path = index_path
+      directory = os.path.dirname(path) or '.'
+      try:
+        os.makedirs(directory, exist_ok=True)
+        response = self.__request('GET', key, index)
+        if response.status != 200:
+          response.read()
+          return None
+        fd, temp_path = tempfile.mkstemp(dir=directory, prefix='.assemblage-')
+        created.append(temp_path)
+        with os.fdopen(fd, 'wb') as file:
+          shutil.copyfileobj(response, file)
+        return temp_path
+      except (OSError, http.client.HTTPException):
+        self.__connection().close()
+        return None
+    restored = False
+    try:
+      temp_paths = self.__map(get, enumerate(paths))
+      if all(temp_paths):
+        for temp_path, path in zip(temp_paths, paths):
+          os.replace(temp_path, path)
+        restored = True
+    finally:
+      for temp_path in created:
+        if os.path.exists(temp_path):
+          os.remove(temp_path)
+    return restored
+
+  def store(self, key, paths):
+    '''
+    Puts the files given by paths as the entry for key in parallel. Returns
+    True if all were stored, False if any file does not exist or the server
+    did not accept it.
+    '''
+    if not key or not paths or not all(os.path.isfile(path) for path in paths):
+      return False
+    def put(index_path):
+      index, path = index_path
+      try:
+        with open(path, 'rb') as file:
+          size = os.fstat(file.fileno()).st_size
+          response = self.__request( 'PUT', key, index, body=file
+                                   , headers={'Content-Length':str(size)}
+                                   )
+        response.read()
+        return response.status in (200, 201, 204)
+      except (OSError, http.client.HTTPException):
+        self.__connection().close()
+        return False
+    return all(self.__map(put, enumerate(paths)))
+
+  def close(self):
+    '''
+    Shuts down the worker threads and closes their connections.
+    '''
+    if self.__executor is not None:
+      self.__executor.shutdown()
+      self.__executor = None
+    with self.__lock:
+      for connection in self.__connections:
+        connection.close()
+      self.__connections = []
+    self.__local = threading.local()
@@ -0,0 +1,203 @@
+#! /usr/bin/python3
+# v3.4+
+'''
+Part of the dibase/assemblage package.
+A tool to apply actions to multi-part constructs.
+
+Definition of the IncrementalWriteBack class and related entities.
+
+Developed by R.E. McArdell / Dibase Limited.
+Copyright (c) 2015 Dibase Limited
+License: dual: GPL or BSD.
+'''
+
+from .digestcache import DigestCache
+import threading
+import queue
+import time
+
+class IncrementalWriteBack:
+  '''
+  Writes back updated digests to an assemblage's digest store while an action
+  is being applied, rather than only once all elements have been processed,
+  so an interrupted apply does not lose the digest updates of top level
+  elements that completed applying the action.
+
+  An element's digests - its resource digest and its composite digests - are
+  only safe to write back once every ancestor of the element - every element
+  having it as a (sub-)element, their parents and so on up to the top level
+  elements - has completed applying the action: until then an ancestor yet
+  to run its actions relies on the changed digest still being seen as
+  changed on the next apply, as it is only rebuilt if one of its elements
+  did actions. So digests are committed only once the top level elements an
+  element is reachable from have completed; the digests of elements below
+  an interrupted top level element are not written back and those elements
+  are seen as changed again on the next apply. Committable digests are
+  collected and passed, in batches, to a background writer thread once
+  threshold have been collected or interval seconds have passed since the
+  last batch. At most
+  queueSize batches are queued for writing; when the queue is full digests
+  continue to be collected and are passed on with a later batch so that the
+  traversal of elements is never blocked.
+
+  Set on an assemblage's Blueprint using Blueprint.setIncrementalWriteBack.
+  Requires a digest cache providing detachDirty, markDirty and updateStore
+  methods, such as assemblage.DigestCache.
+  '''
+  def __init__(self, threshold=1000, interval=30.0, queueSize=4):
+    '''
+    Creates an incremental write back object that passes committable digests
+    to the writer thread once threshold have been collected or interval
+    seconds have passed, queueing at most queueSize batches.
+    '''
+    self.threshold = threshold
+    self.interval = interval
+    self.queueSize = queueSize
+    self.__reset()
+    self.__batches = 0
+    self.__written = 0
+
+  def __reset(self):
+    '''
+    Internal helper method. Discards all per-apply state.
+    '''
+    self.__digest_cache = None
+    self.__logger = None
+    self.__action = None
+    self.__elements = {}
+    self.__remaining = {}
+    self.__completed = set()
+    self.__keys = []
+    self.__batch = []
+    self.__queue = None
+    self.__thread = None
+    self.__failed = []
+    self.__last_time = 0
+
+  def begin(self, digestCache, elements, action, logger=None):
+    '''
+    Called by Assemblage before applying action to its top level elements.
+    Counts the parents of each element reachable from elements, an element's
+    digests being committed once all its parents have been, then starts the
+    writer thread.
+    '''
+    self.__reset()
+    self.__digest_cache = digestCache
+    self.__logger = logger
+    self.__action = action
+    pending = list(elements)
+    while pending:
+      element = pending.pop()
+      if id(element) in self.__elements:
+        continue
+      self.__elements[id(element)] = element
+      subelements = getattr(element, 'elements', None)
+      if callable(subelements):
+        for subelement in subelements():
+          self.__remaining[id(subelement)] = self.__remaining.get(id(subelement), 0) + 1
+          pending.append(subelement)
+    self.__queue = queue.Queue(maxsize=self.queueSize)
+    self.__thread = threading.Thread(target=self.__write_batches, daemon=True)
+    self.__thread.start()
+    self.__last_time = time.monotonic()
+
+  def __write_batches(self):
+    '''
+    Internal helper method. The writer thread function: writes queued batches
+    to the digest store until passed None. Failed batches are kept so finish
+    can mark them dirty again.
+    '''
+    while True:
+      batch = self.__queue.get()
+      if batch is None:
+        return
+      try:
+        self.__digest_cache.updateStore(batch)
+        self.__batches = self.__batches + 1
+        self.__written = self.__written + len(batch)
+      except Exception as e:
+        self.__failed.append((batch, e))
+
+  def __commit(self, element):
+    '''
+    Internal helper method. Collects the digest keys of element for writing,
+    then those of each of its (sub-)elements, recursively, that have no
+    other parents left to commit.
+    '''
+    pending = [element]
+    while pending:
+      element = pending.pop()
+      self.__keys.append(str(element))
+      self.__keys.append(DigestCache.compositeKey(element, self.__action))
+      subelements = getattr(element, 'elements', None)
+      if callable(subelements):
+        for subelement in subelements():
+          remaining = self.__remaining.get(id(subelement), 1) - 1
+          self.__remaining[id(subelement)] = remaining
+          if remaining==0:
+            pending.append(subelement)
+
+  def elementCompleted(self, element):
+    '''
+    Called by an element once it has completed applying the action, including
+    if it was skipped as its composite digest was unchanged. Only the first
+    completion of an element counts. If the element is a top level element
+    collects the digest keys of it and of all its descendants that have no
+    other ancestors left to complete, and if threshold keys have been
+    collected or interval seconds have passed queues them for writing.
+    '''
+    if self.__thread is None or id(element) in self.__completed:
+      return
+    self.__completed.add(id(element))
+    if id(element) not in self.__remaining:
+      self.__commit(element)
+    if len(self.__keys) >= self.threshold\
+     or time.monotonic() - self.__last_time >= self.interval:
+      self.__queue_batch(block=False)
+
+  def __queue_batch(self, block):
+    '''
+    Internal helper method. Detaches the dirty digests of the collected keys
+    from the digest cache and queues them, along with any not yet queued, for
+    writing. If block is False and the queue is full they are kept for the
+    next batch.
+    '''
+    self.__batch.extend(self.__digest_cache.detachDirty(self.__keys))
+    self.__keys = []
+    self.__last_time = time.monotonic()
+    if not self.__batch:
+      return
+    try:
+      self.__queue.put(self.__batch, block=block)
+      self.__batch = []
+    except queue.Full:
+      pass
+
+  def finish(self):
+    '''
+    Called by Assemblage once the action has been applied, or applying it
+    failed. Queues the remaining committable digests, waits for the writer
+    thread to write all queued batches and stops it. Digests of batches that
+    failed to be written are marked dirty again in the digest cache and a
+    warning logged. Digests not committable, because applying the action
+    failed, are left dirty in the digest cache.
+    '''
+    if self.__thread is None:
+      return
+    self.__queue_batch(block=True)
+    self.__queue.put(None)
+    self.__thread.join()
+    for batch, e in self.__failed:
+      self.__digest_cache.markDirty(batch)
+      if self.__logger:
+        self.__logger.warning("Incremental digest write back of %(n)d digests failed: %(e)s"
+                             % {'n':len(batch), 'e':e}
+                             )
+    self.__reset()
+
+  def statistics(self):
+    '''
+    Returns a dictionary of write back statistics: 'batches' - the number of
+    batches written and 'written' - the number of digests they contained.
+    '''
+    return {'batches' : self.__batches, 'written' : self.__written}
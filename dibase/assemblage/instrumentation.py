@@ -0,0 +1,174 @@
+#! /usr/bin/python3
+# v3.4+
+'''
+Part of the dibase/assemblage package.
+A tool to apply actions to multi-part constructs.
+
+Definition of the Instrumentation class and related entities.
+
+Developed by R.E. McArdell / Dibase Limited.
+Copyright (c) 2015 Dibase Limited
+License: dual: GPL or BSD.
+'''
+
+from collections import namedtuple
+import threading
+import time
+import os
+
+class Instrumentation:
+  '''
+  Times the phases of applying an action to each element, set with
+  Blueprint.setInstrumentation:
+
+    instrumentation = Instrumentation()
+    Assemblage(blueprint.setInstrumentation(instrumentation)).apply('build')
+    print(Instrumentation.formatSummary(instrumentation.summary()))
+
+  Times are taken with time.perf_counter, in nanoseconds. The phases timed for each
+  Component are:
+    'apply' - the whole application of the action to the element
+    'queryDoBeforeElementsActions', 'beforeElementsActions',
+    'queryProcessElements', 'queryDoAfterElementsActions' and
+    'afterElementsActions' - resolving and calling the action functions
+    'elements' - applying the action to the element's (sub-)elements
+    'resolve' - each resolution of an action function by the resolver
+    'digest' - each check of whether the element has changed made while
+               applying an action
+    'artifactCache' - restoring and storing outputs, if there is an artifact
+                      cache
+    'compositeDigest' - checking and updating composite digests
+  Phases nest: 'apply' includes all the element's other phases, 'elements'
+  includes the (sub-)elements' applies and the action function phases
+  include their 'resolve' and - for queries - 'digest' times.
+
+  Each timing is passed as an Instrumentation.Event to each sink - a callable
+  taking an event argument - and is aggregated by element kind (class),
+  action and phase and by element and phase. If no instrumentation is set
+  elements are not timed, so there is no timing overhead.
+  '''
+  Event = namedtuple('Event', 'name kind action phase startNs endNs pid tid')
+
+  def __init__(self, *sinks):
+    '''
+    Creates an instrumentation object passing events to sinks.
+    '''
+    self.__sinks = list(sinks)
+    self.__lock = threading.Lock()
+    self.__local = threading.local()
+    self.__pid = os.getpid()
+    self.reset()
+
+  def addSink(self, sink):
+    '''
+    Adds sink, a callable taking an Instrumentation.Event argument, to those
+    passed each event.
+    '''
+    self.__sinks.append(sink)
+    return self
+
+  def reset(self):
+    '''
+    Discards the aggregated timings.
+    '''
+    with self.__lock:
+      self.__by_kind = {}
+      self.__by_element = {}
+
+  @staticmethod
+  def now():
+    '''
+    Returns the current time in nanoseconds, as used for event times.
+    '''
+    return int(time.perf_counter() * 1e9)
+
+  def setAction(self, action):
+    '''
+    Sets the action being applied by the current thread, None if it is not
+    applying an action.
+    '''
+    self.__local.action = action
+
+  def currentAction(self):
+    '''
+    Returns the action being applied by the current thread, or None if it is
+    not applying an action.
+    '''
+    return getattr(self.__local, 'action', None)
+
+  def record(self, element, action, phase, startNs, endNs):
+    '''
+    Records a phase of applying action to element timed from startNs to endNs
+    nanoseconds, aggregating it and passing it to the sinks as an event.
+    '''
+    kind = type(element)
+    event = self.Event( str(element), '.'.join([kind.__module__, kind.__qualname__])
+                      , action, phase, startNs, endNs, self.__pid, threading.get_ident()
+                      )
+    duration = endNs - startNs
+    with self.__lock:
+      for totals, key in ( (self.__by_kind, (event.kind, action, phase))
+                         , (self.__by_element, (event.name, phase))
+                         ):
+        entry = totals.get(key)
+        if entry is None:
+          totals[key] = [1, duration, duration]
+        else:
+          entry[0] = entry[0] + 1
+          entry[1] = entry[1] + duration
+          entry[2] = max(entry[2], duration)
+    for sink in self.__sinks:
+      sink(event)
+
+  def timed(self, element, action, phase, function):
+    '''
+    Returns a function that calls function, passing on its arguments and
+    returning its result, recording the call as phase of applying action to
+    element.
+    '''
+    def timed_function(*args, **kwargs):
+      start = self.now()
+      try:
+        return function(*args, **kwargs)
+      finally:
+        self.record(element, action, phase, start, self.now())
+    return timed_function
+
+  def summary(self):
+    '''
+    Returns a dictionary mapping (kind, action, phase) tuples to dictionaries
+    of the 'count' of timings and their 'totalNs' and 'maxNs' nanoseconds.
+    kind is the qualified name of the elements' class.
+    '''
+    with self.__lock:
+      return dict( (key, {'count':count, 'totalNs':total, 'maxNs':longest})
+                   for key, (count, total, longest) in self.__by_kind.items()
+                 )
+
+  def elementDurations(self, phase='apply'):
+    '''
+    Returns a dictionary mapping element names to the total seconds recorded
+    for phase, suitable as GraphAnalysis and GraphExport durations.
+    '''
+    with self.__lock:
+      return dict( (name, entry[1] / 1e9)
+                   for (name, entry_phase), entry in self.__by_element.items()
+                   if entry_phase == phase
+                 )
+
+  @staticmethod
+  def formatSummary(summary):
+    '''
+    Returns a summary dictionary, as returned by summary, as text ordered by
+    decreasing total time.
+    '''
+    lines = ["%(t)12s %(c)8s %(m)12s  %(k)s" % {'t':'total ms', 'c':'count', 'm':'max ms', 'k':'kind action phase'}]
+    for (kind, action, phase), entry in sorted( summary.items()
+                                              , key=lambda item: (-item[1]['totalNs'], str(item[0]))
+                                              ):
+      lines.append( "%(t)12.3f %(c)8d %(m)12.3f  %(k)s %(a)s %(p)s"
+                  % { 't':entry['totalNs'] / 1e6, 'c':entry['count'], 'm':entry['maxNs'] / 1e6
+                    , 'k':kind, 'a':action, 'p':phase
+                    }
+                  )
+    return '\n'.join(lines)
@@ -288,3 +288,27 @@ class DigestStoreBase(metaclass=ABCMeta):
     None should be returned
     '''
     pass
+
+class ArtifactCacheBase(metaclass=ABCMeta):
+  '''
+  Artifact caches hold copies of the output files created by elements' actions
+  keyed by a string that is a digest of everything the outputs were created
+  from. They allow the outputs to be restored rather than re-created when the
+  same inputs are seen again.
+  '''
+  @abstractmethod
+  def restore(self, key, paths):
+    '''
+    The paths parameter is a sequence of pathnames to which the files cached
+    for the key string should be restored, in the same order as they were
+    stored. Returns True if all the files were restored, or a value
+    convertible to False if there is no complete entry for key.
+    '''
+    pass
+  @abstractmethod
+  def store(self, key, paths):
+    '''
+    Stores copies of the files given by the sequence of pathnames in the paths
+    parameter as the entry for the key string. Returns True if stored.
+    '''
+    pass
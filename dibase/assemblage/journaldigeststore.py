@@ -0,0 +1,341 @@
+#! /usr/bin/python3
+# v3.4+
+'''
+Part of the dibase/assemblage package.
+A tool to apply actions to multi-part constructs.
+
+Definition of the JournalDigestStore class and related entities.
+
+Developed by R.E. McArdell / Dibase Limited.
+Copyright (c) 2015 Dibase Limited
+License: dual: GPL or BSD.
+'''
+
+from .interfaces import DigestStoreBase
+from .filelock import FileLock
+import tempfile
+import struct
+import zlib
+import os
+
+class JournalDigestStore(DigestStoreBase):
+  '''
+  Digest store held as an append-only journal of updates.
+
+  Each update appends one block holding all its (name, digest) pairs to the
+  journal file and syncs it, so writes are purely sequential. Blocks are
+  framed by their length and a CRC32 checksum: a block torn by a crash while
+  being written fails its check and is ignored, along with anything after
+  it, and is overwritten by the next update.
+
+  On first use the store reads a snapshot file, if there is one, then
+  replays the journal, into memory. Once the proportion of superseded
+  records in the snapshot and journal - the garbage ratio - exceeds the
+  compaction threshold the live records are written to a new snapshot, which
+  replaces the old one, and the journal is emptied. Until the journal is
+  emptied replaying it over the new snapshot gives the same records so a
+  crash during compaction loses nothing.
+
+  Several processes may share a store. Updates and compactions hold a lock
+  file - the store pathname with '.lock' appended - exclusively and first
+  catch up with blocks appended, or a compaction made, by other processes
+  since the store was last read, so never overwrite others' updates.
+  Loading holds the lock shared; retrievals are then made from memory.
+
+  Records are removed by appending tombstone records for their names, which
+  count as garbage until the next compaction.
+
+  The files used are the store pathname with '.snapshot', '.journal' and
+  '.lock' appended. Digests must be bytes values shorter than 65535 bytes.
+  '''
+  __block_header = struct.Struct('>II')
+  __entry_header = struct.Struct('>IH')
+  __snapshot_block_entries = 65536
+  __tombstone = 0xFFFF
+
+  @staticmethod
+  def defaultPath():
+    '''
+    Returns the default store pathname to use if a specific pathname is not
+    passed in JournalDigestStore construction.
+    '''
+    return '.__assemblage-journal__'
+
+  def __init__(self, pathname=None, compactionThreshold=0.5, minimumCompactionRecords=1024, sync=True):
+    '''
+    Creates a digest store using files named from the pathname parameter,
+    which if None or omitted will be JournalDigestStore.defaultPath().
+    The store is compacted when the garbage ratio exceeds compactionThreshold
+    and the snapshot and journal hold at least minimumCompactionRecords
+    records. If sync is False files are not synced to disk after being
+    written, trading crash safety for speed.
+    '''
+    self.pathname = pathname if pathname else self.defaultPath()
+    self.compactionThreshold = compactionThreshold
+    self.minimumCompactionRecords = minimumCompactionRecords
+    self.sync = sync
+    self.__digests = None
+    self.__records = 0
+    self.__journal_end = 0
+    self.__snapshot_id = None
+    self.__lock = FileLock(self.pathname + '.lock')
+
+  def snapshotPath(self):
+    '''
+    Returns the pathname of the snapshot file.
+    '''
+    return self.pathname + '.snapshot'
+
+  def journalPath(self):
+    '''
+    Returns the pathname of the journal file.
+    '''
+    return self.pathname + '.journal'
+
+  @classmethod
+  def __encode_block(cls, nameDigestPairs):
+    '''
+    Internal helper method. Returns the bytes of a block holding the
+    (name, digest) pairs. A digest of None encodes a tombstone record.
+    '''
+    parts = []
+    for name, digest in nameDigestPairs:
+      if digest is None:
+        digest, digest_length = b'', cls.__tombstone
+      elif not isinstance(digest, (bytes, bytearray)):
+        raise TypeError("JournalDigestStore: Expected bytes digest, got %s" % type(digest).__name__)
+      elif len(digest) >= cls.__tombstone:
+        raise ValueError("JournalDigestStore: Digest of %d bytes is too long" % len(digest))
+      else:
+        digest_length = len(digest)
+      encoded_name = name.encode('utf-8', 'surrogateescape')
+      parts.append(cls.__entry_header.pack(len(encoded_name), digest_length))
+      parts.append(encoded_name)
+      parts.append(bytes(digest))
+    payload = b''.join(parts)
+    return cls.__block_header.pack(len(payload), zlib.crc32(payload)) + payload
+
+  @classmethod
+  def __read_blocks(cls, file):
+    '''
+    Internal helper method. Generator yielding (pairs, end offset) for each
+    intact block read from file, stopping at the end of the file or the first
+    torn or corrupt block. Tombstone records have a digest of None.
+    '''
+    offset = 0
+    while True:
+      header = file.read(cls.__block_header.size)
+      if len(header) < cls.__block_header.size:
+        return
+      length, checksum = cls.__block_header.unpack(header)
+      payload = file.read(length)
+      if len(payload) < length or zlib.crc32(payload) != checksum:
+        return
+      pairs = []
+      position = 0
+      while position < length:
+        name_length, digest_length = cls.__entry_header.unpack_from(payload, position)
+        position = position + cls.__entry_header.size
+        name = payload[position:position + name_length].decode('utf-8', 'surrogateescape')
+        position = position + name_length
+        if digest_length == cls.__tombstone:
+          pairs.append((name, None))
+        else:
+          pairs.append((name, payload[position:position + digest_length]))
+          position = position + digest_length
+      offset = offset + cls.__block_header.size + length
+      yield pairs, offset
+
+  def __replay(self, pathname, start=0):
+    '''
+    Internal helper method. Applies the intact blocks of the file given by
+    pathname, from offset start, to the in-memory digests. Returns the offset
+    of the end of the last intact block.
+    '''
+    end = start
+    try:
+      file = open(pathname, 'rb')
+    except FileNotFoundError:
+      return end
+    with file:
+      file.seek(start)
+      for pairs, offset in self.__read_blocks(file):
+        end = start + offset
+        for name, digest in pairs:
+          if digest is None:
+            self.__digests.pop(name, None)
+          else:
+            self.__digests[name] = digest
+        self.__records = self.__records + len(pairs)
+    return end
+
+  def __file_id(self, pathname):
+    '''
+    Internal helper method. Returns a value identifying the current version of
+    the file given by pathname, or None if it does not exist.
+    '''
+    try:
+      st = os.stat(pathname)
+    except FileNotFoundError:
+      return None
+    return (st.st_dev, st.st_ino, st.st_size, st.st_mtime_ns)
+
+  def __read(self):
+    '''
+    Internal helper method. Reads the snapshot then replays the journal into
+    memory. The caller holds the lock.
+    '''
+    self.__digests = {}
+    self.__records = 0
+    self.__snapshot_id = self.__file_id(self.snapshotPath())
+    self.__replay(self.snapshotPath())
+    self.__journal_end = self.__replay(self.journalPath())
+
+  def __load(self):
+    '''
+    Internal helper method. On first use reads the store into memory.
+    '''
+    if self.__digests is None:
+      with self.__lock.shared():
+        self.__read()
+
+  def __catch_up(self):
+    '''
+    Internal helper method. Brings the in-memory digests up to date with
+    updates made by other processes: if the snapshot has been replaced or the
+    journal emptied by a compaction the store is read again, otherwise any
+    blocks appended to the journal are replayed. The caller holds the lock
+    exclusively.
+    '''
+    try:
+      journal_size = os.path.getsize(self.journalPath())
+    except FileNotFoundError:
+      journal_size = 0
+    if self.__digests is None\
+     or self.__file_id(self.snapshotPath()) != self.__snapshot_id\
+     or journal_size < self.__journal_end:
+      self.__read()
+    elif journal_size > self.__journal_end:
+      self.__journal_end = self.__replay(self.journalPath(), self.__journal_end)
+
+  def __sync(self, file):
+    '''
+    Internal helper method. Flushes file and, if sync is True, syncs it to
+    disk.
+    '''
+    file.flush()
+    if self.sync:
+      os.fsync(file.fileno())
+
+  def update(self, nameDigestPairs):
+    '''
+    nameDigestPairs is a sequences of (name, digest) sequence pairs commonly
+    presented as a list of tuples. The names are assumed to be unique strings
+    naming an element in an assemblage. The digests are assumed to be bytes
+    values.
+    The pairs are appended to the journal as one block, overwriting any torn
+    block left by an earlier failed update, then the store is compacted if
+    the garbage ratio exceeds the compaction threshold.
+    '''
+    if nameDigestPairs:
+      if any(digest is None for name, digest in nameDigestPairs):
+        raise TypeError("JournalDigestStore: Expected bytes digest, got NoneType")
+      self.__append(nameDigestPairs)
+
+  def __append(self, nameDigestPairs):
+    '''
+    Internal helper method. Appends a block holding nameDigestPairs - in which
+    digests of None are tombstones - to the journal and applies them to the
+    in-memory digests, then compacts the store if required.
+    '''
+    block = self.__encode_block(nameDigestPairs)
+    with self.__lock.exclusive():
+      self.__catch_up()
+      mode = 'r+b' if os.path.exists(self.journalPath()) else 'wb'
+      with open(self.journalPath(), mode) as file:
+        file.seek(self.__journal_end)
+        file.truncate()
+        file.write(block)
+        self.__sync(file)
+      self.__journal_end = self.__journal_end + len(block)
+      for name, digest in nameDigestPairs:
+        if digest is None:
+          self.__digests.pop(name, None)
+        else:
+          self.__digests[name] = bytes(digest)
+      self.__records = self.__records + len(nameDigestPairs)
+      if self.__records >= self.minimumCompactionRecords\
+       and self.garbageRatio() > self.compactionThreshold:
+        self.__compact()
+
+  def remove(self, names):
+    '''
+    Removes the records for each of the names, by appending tombstone records
+    for those having records.
+    '''
+    self.__load()
+    pairs = [(name, None) for name in names if name in self.__digests]
+    if pairs:
+      self.__append(pairs)
+
+  def names(self):
+    '''
+    Returns a list of the names of the records in the store.
+    '''
+    self.__load()
+    return list(self.__digests)
+
+  def retrieveDigest(self, recordName):
+    '''
+    The recordName parameter is the key string to the digest record to be
+    retrieved and returned. It is commonly the str value of an assemblage
+    element. If not found None is returned.
+    '''
+    if not recordName:
+      return None
+    self.__load()
+    return self.__digests.get(recordName)
+
+  def garbageRatio(self):
+    '''
+    Returns the proportion of the records in the snapshot and journal that
+    have been superseded by later records for the same name or are
+    tombstones.
+    '''
+    self.__load()
+    if not self.__records:
+      return 0.0
+    return 1.0 - len(self.__digests) / self.__records
+
+  def compact(self):
+    '''
+    Writes the live records to a new snapshot file that replaces any existing
+    snapshot, then empties the journal.
+    '''
+    with self.__lock.exclusive():
+      self.__catch_up()
+      self.__compact()
+
+  def __compact(self):
+    '''
+    Internal helper method. Performs compaction. The caller holds the lock
+    exclusively.
+    '''
+    directory = os.path.dirname(self.pathname) or '.'
+    fd, temp_path = tempfile.mkstemp(dir=directory, prefix='.assemblage-')
+    try:
+      with os.fdopen(fd, 'wb') as file:
+        items = list(self.__digests.items())
+        for start in range(0, len(items), self.__snapshot_block_entries):
+          file.write(self.__encode_block(items[start:start + self.__snapshot_block_entries]))
+        self.__sync(file)
+      os.replace(temp_path, self.snapshotPath())
+    except:
+      if os.path.exists(temp_path):
+        os.remove(temp_path)
+      raise
+    with open(self.journalPath(), 'wb') as file:
+      self.__sync(file)
+    self.__journal_end = 0
+    self.__records = len(self.__digests)
+    self.__snapshot_id = self.__file_id(self.snapshotPath())
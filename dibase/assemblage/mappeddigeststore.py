@@ -0,0 +1,322 @@
+#! /usr/bin/python3
+# v3.4+
+'''
+Part of the dibase/assemblage package.
+A tool to apply actions to multi-part constructs.
+
+Definition of the MappedDigestStore class and related entities.
+
+Developed by R.E. McArdell / Dibase Limited.
+Copyright (c) 2015 Dibase Limited
+License: dual: GPL or BSD.
+'''
+
+from .interfaces import DigestStoreBase
+from .filelock import FileLock
+import hashlib
+import tempfile
+import struct
+import mmap
+import os
+
+class MappedDigestStore(DigestStoreBase):
+  '''
+  Digest store held in a single file of fixed size records sorted by a hash
+  of their key name, intended for read-mostly use such as null builds.
+
+  The file is memory mapped and searched in place by interpolation search on
+  the - uniformly distributed - key hashes, so opening it requires no reading
+  or deserialisation of its contents however many records it holds.
+  Each update merges the new and changed records with the existing ones into
+  a fresh file that atomically replaces the old one, so is proportional to the
+  size of the store: stores that are updated often in small batches are better
+  served by other digest stores. A store object continues to use the file
+  it mapped until it next updates the store or is closed.
+
+  Updates by several processes sharing a store are serialised by a lock file,
+  the store pathname with '.lock' appended. An update holding the lock first
+  maps the current file if another process has replaced the one it mapped,
+  so merges its records with all previous updates. Retrievals take no lock:
+  files are replaced atomically so a reader only ever sees complete files.
+
+  The file consists of a 16 byte header - the magic bytes b'ADSI', a format
+  version byte, the digest size byte, 2 reserved bytes and the 8 byte record
+  count - followed by the records. Each record is the 16 byte MD5 hash of
+  the UTF-8 encoded key name, a digest length byte and the digest padded to
+  the digest size. Digests must be bytes values no longer than the digest
+  size. Key names are not stored so cannot be retrieved from the store.
+  '''
+  __magic = b'ADSI'
+  __version = 1
+  __header = struct.Struct('>4sBBxxQ')
+  __hash_size = 16
+
+  @staticmethod
+  def defaultPath():
+    '''
+    Returns the default store file pathname to use if a specific pathname is
+    not passed in MappedDigestStore construction.
+    '''
+    return '.__assemblage-digest-index__'
+
+  @staticmethod
+  def keyHash(recordName):
+    '''
+    Returns the hash of recordName by which its record is sorted and found.
+    '''
+    return hashlib.md5(recordName.encode('utf-8', 'surrogateescape')).digest()
+
+  def __init__(self, pathname=None, digestSize=16):
+    '''
+    Creates a digest store backed by the file given by the pathname
+    parameter, which if None or omitted will be the value of
+    MappedDigestStore.defaultPath(). The file is created by the first update.
+    digestSize is the maximum digest length in bytes for a new file; the
+    digest size of an existing file is read from its header.
+    '''
+    if not 0 < digestSize < 256:
+      raise ValueError("MappedDigestStore: Expected digestSize in range 1..255, got %s" % digestSize)
+    self.pathname = pathname if pathname else self.defaultPath()
+    self.__digest_size = digestSize
+    self.__file = None
+    self.__map = None
+    self.__count = 0
+    self.__lock = FileLock(self.pathname + '.lock')
+
+  @property
+  def recordSize(self):
+    '''
+    The size in bytes of each record.
+    '''
+    return self.__hash_size + 1 + self.__digest_size
+
+  def __len__(self):
+    self.__open()
+    return self.__count
+
+  def __open(self):
+    '''
+    Internal helper method. Maps the store file if it exists and is not
+    already mapped, reading the digest size and record count from its header.
+    '''
+    if self.__map is not None:
+      return
+    try:
+      file = open(self.pathname, 'rb')
+    except FileNotFoundError:
+      self.__count = 0
+      return
+    try:
+      header = file.read(self.__header.size)
+      if len(header) != self.__header.size:
+        raise ValueError("MappedDigestStore: '%s' is truncated" % self.pathname)
+      magic, version, digest_size, count = self.__header.unpack(header)
+      if magic != self.__magic or version != self.__version:
+        raise ValueError("MappedDigestStore: '%s' is not a digest index file" % self.pathname)
+      self.__digest_size = digest_size
+      self.__count = count
+      expected_size = self.__header.size + count * self.recordSize
+      if os.fstat(file.fileno()).st_size < expected_size:
+        raise ValueError("MappedDigestStore: '%s' is truncated" % self.pathname)
+      self.__map = mmap.mmap(file.fileno(), expected_size, access=mmap.ACCESS_READ)
+    except:
+      file.close()
+      raise
+    self.__file = file
+
+  def close(self):
+    '''
+    Unmaps and closes the store file. It is reopened when next needed.
+    '''
+    if self.__map is not None:
+      self.__map.close()
+      self.__file.close()
+    self.__map = None
+    self.__file = None
+    self.__count = 0
+
+  def __refresh(self):
+    '''
+    Internal helper method. Maps the current store file, closing the mapped
+    file first if the store file has since been replaced.
+    '''
+    if self.__map is not None:
+      try:
+        current = os.stat(self.pathname)
+      except FileNotFoundError:
+        current = None
+      mapped = os.fstat(self.__file.fileno())
+      if current is None or (current.st_dev, current.st_ino) != (mapped.st_dev, mapped.st_ino):
+        self.close()
+    self.__open()
+
+  def __hash_at(self, index):
+    '''
+    Internal helper method. Returns the key hash of the record at index.
+    '''
+    offset = self.__header.size + index * self.recordSize
+    return self.__map[offset:offset + self.__hash_size]
+
+  def __search(self, key_hash):
+    '''
+    Internal helper method. Interpolation search for key_hash, falling back to
+    binary search once the range is small or interpolation is making poor
+    progress. Returns (index, found) where index is that of the record having
+    key_hash if found, or else that at which such a record would be inserted.
+    '''
+    low, high = 0, self.__count
+    if not high:
+      return 0, False
+    target = int.from_bytes(key_hash[:8], 'big')
+    low_value, high_value = 0, 1 << 64
+    while high - low > 8:
+      span = high - low
+      guess = low + (target - low_value) * span // max(high_value - low_value, 1)
+      guess = min(max(guess, low), high - 1)
+      guess_hash = self.__hash_at(guess)
+      if guess_hash == key_hash:
+        return guess, True
+      if guess_hash < key_hash:
+        low, low_value = guess + 1, int.from_bytes(guess_hash[:8], 'big')
+      else:
+        high, high_value = guess, int.from_bytes(guess_hash[:8], 'big')
+      if high - low > span // 2:
+        middle = (low + high) // 2
+        middle_hash = self.__hash_at(middle)
+        if middle_hash == key_hash:
+          return middle, True
+        if middle_hash < key_hash:
+          low, low_value = middle + 1, int.from_bytes(middle_hash[:8], 'big')
+        else:
+          high, high_value = middle, int.from_bytes(middle_hash[:8], 'big')
+    while low < high:
+      middle = (low + high) // 2
+      middle_hash = self.__hash_at(middle)
+      if middle_hash == key_hash:
+        return middle, True
+      if middle_hash < key_hash:
+        low = middle + 1
+      else:
+        high = middle
+    return low, False
+
+  def retrieveDigest(self, recordName):
+    '''
+    The recordName parameter is the key string to the digest record to be
+    retrieved and returned. It is commonly the str value of an assemblage
+    element. If not found None is returned.
+    '''
+    if not recordName:
+      return None
+    self.__open()
+    index, found = self.__search(self.keyHash(recordName))
+    if not found:
+      return None
+    offset = self.__header.size + index * self.recordSize + self.__hash_size
+    length = self.__map[offset]
+    return self.__map[offset + 1:offset + 1 + length]
+
+  def __record(self, key_hash, digest):
+    '''
+    Internal helper method. Returns the bytes of the record for key_hash and
+    digest.
+    '''
+    if not isinstance(digest, (bytes, bytearray)):
+      raise TypeError("MappedDigestStore: Expected bytes digest, got %s" % type(digest).__name__)
+    if len(digest) > self.__digest_size:
+      raise ValueError( "MappedDigestStore: Digest of %(l)d bytes longer than digest size %(s)d"
+                      % {'l':len(digest), 's':self.__digest_size}
+                      )
+    return b''.join([ key_hash, bytes([len(digest)]), digest
+                    , bytes(self.__digest_size - len(digest))
+                    ])
+
+  def update(self, nameDigestPairs):
+    '''
+    nameDigestPairs is a sequences of (name, digest) sequence pairs commonly
+    presented as a list of tuples. The names are assumed to be unique strings
+    naming an element in an assemblage. The digests are assumed to be bytes
+    values no longer than the store's digest size.
+    The records for the pairs are merged with the existing records into a new
+    store file that then replaces the existing file, holding the store's lock
+    throughout.
+    '''
+    if not nameDigestPairs:
+      return
+    self.__open()
+    records = {}
+    for name, digest in nameDigestPairs:
+      key_hash = self.keyHash(name)
+      records[key_hash] = self.__record(key_hash, digest)
+    new_records = sorted(records.items())
+    with self.__lock.exclusive():
+      self.__refresh()
+      self.__rewrite(lambda file: self.__merge(file, new_records))
+
+  def retain(self, names, dryRun=False):
+    '''
+    Removes all records other than those for the names, rewriting the store
+    file, and returns the number of records removed. If dryRun is True the
+    number of records that would be removed is returned and nothing is
+    removed.
+    '''
+    keep = set(self.keyHash(name) for name in names)
+    with self.__lock.exclusive():
+      self.__refresh()
+      kept = [index for index in range(self.__count) if self.__hash_at(index) in keep]
+      removed = self.__count - len(kept)
+      if removed and not dryRun:
+        def write_kept(file):
+          for index in kept:
+            offset = self.__header.size + index * self.recordSize
+            file.write(self.__map[offset:offset + self.recordSize])
+          return len(kept)
+        self.__rewrite(write_kept)
+    return removed
+
+  def __rewrite(self, write_records):
+    '''
+    Internal helper method. Writes a new store file - calling write_records
+    with the file to write the records and return their number - that then
+    replaces the existing file. The caller holds the lock.
+    '''
+    directory = os.path.dirname(self.pathname) or '.'
+    fd, temp_path = tempfile.mkstemp(dir=directory, prefix='.assemblage-')
+    try:
+      with os.fdopen(fd, 'wb') as file:
+        file.write(bytes(self.__header.size))
+        count = write_records(file)
+        file.seek(0)
+        file.write(self.__header.pack(self.__magic, self.__version, self.__digest_size, count))
+        file.flush()
+        os.fsync(file.fileno())
+      self.close()
+      os.replace(temp_path, self.pathname)
+    except:
+      if os.path.exists(temp_path):
+        os.remove(temp_path)
+      raise
+
+  def __merge(self, file, new_records):
+    '''
+    Internal helper method. Writes the existing records merged with the sorted
+    sequence of (key hash, record) pairs in new_records to file, copying runs
+    of unchanged existing records in bulk. Returns the number of records
+    written.
+    '''
+    record_size = self.recordSize
+    start = self.__header.size
+    copied = 0
+    count = 0
+    for key_hash, record in new_records:
+      index, found = self.__search(key_hash)
+      if index > copied:
+        file.write(self.__map[start + copied * record_size:start + index * record_size])
+        count = count + index - copied
+      file.write(record)
+      count = count + 1
+      copied = index + 1 if found else index
+    if self.__count > copied:
+      file.write(self.__map[start + copied * record_size:start + self.__count * record_size])
+      count = count + self.__count - copied
+    return count
@@ -0,0 +1,186 @@
+#! /usr/bin/python3
+# v3.4+
+'''
+Part of the dibase/assemblage package.
+A tool to apply actions to multi-part constructs.
+
+Definition of the ShardedDigestStore class and related entities.
+
+Developed by R.E. McArdell / Dibase Limited.
+Copyright (c) 2015 Dibase Limited
+License: dual: GPL or BSD.
+'''
+
+from .interfaces import DigestStoreBase
+from concurrent.futures import ThreadPoolExecutor
+import hashlib
+
+class ShardedDigestStore(DigestStoreBase):
+  '''
+  Digest store partitioning records by a hash of their names across a number
+  of underlying digest stores - shards - so no single store file has to hold,
+  or be rewritten for, all the records.
+
+  An update only updates the shards holding records for its names, updating
+  them in parallel on a pool of worker threads, as are the lookups of
+  retrieveDigests. The shards must therefore be distinct stores not sharing
+  any files.
+
+  The store also provides the names, remove, retain and compact methods used
+  by assemblage.DigestStoreCollector, each applying to all the shards. They
+  can only be used if all the shards provide them, as reported by
+  supportsCollection; otherwise they raise NotImplementedError.
+  '''
+  @staticmethod
+  def create(storeClass, pathname, shardCount=16, maxWorkers=4, **kwargs):
+    '''
+    Returns a ShardedDigestStore of shardCount stores created by calling
+    storeClass with pathnames formed by appending '.0', '.1',... to pathname
+    (or storeClass.defaultPath() if pathname is None) plus any additional
+    kwargs.
+    '''
+    if not pathname:
+      pathname = storeClass.defaultPath()
+    shards = [ storeClass('%(p)s.%(i)d' % {'p':pathname, 'i':index}, **kwargs)
+               for index in range(shardCount)
+             ]
+    return ShardedDigestStore(shards, maxWorkers, pathname)
+
+  def __init__(self, shards, maxWorkers=4, pathname=None):
+    '''
+    Creates a sharded store over the sequence of digest store objects in
+    shards. Updates and lookups use up to maxWorkers threads. The optional
+    pathname is the common stem of the shards' pathnames.
+    '''
+    if not shards:
+      raise ValueError("ShardedDigestStore: Expected at least one shard")
+    self.shards = list(shards)
+    self.pathname = pathname
+    self.__max_workers = maxWorkers
+    self.__executor = None
+
+  def shardIndex(self, recordName):
+    '''
+    Returns the index of the shard holding the record for recordName.
+    '''
+    key_hash = hashlib.md5(recordName.encode('utf-8', 'surrogateescape')).digest()
+    return int.from_bytes(key_hash[:4], 'big') % len(self.shards)
+
+  def __partition(self, items, name=lambda item: item):
+    '''
+    Internal helper method. Returns a dictionary mapping shard indexes to the
+    lists of items - named by calling name - for the shards.
+    '''
+    by_shard = {}
+    for item in items:
+      by_shard.setdefault(self.shardIndex(name(item)), []).append(item)
+    return by_shard
+
+  def __map(self, function, items):
+    '''
+    Internal helper method. Calls function for each of items, on the worker
+    threads if there is more than one, returning the list of results.
+    '''
+    items = list(items)
+    if len(items) < 2:
+      return [function(item) for item in items]
+    if self.__executor is None:
+      self.__executor = ThreadPoolExecutor(max_workers=self.__max_workers)
+    return list(self.__executor.map(function, items))
+
+  def update(self, nameDigestPairs):
+    '''
+    nameDigestPairs is a sequences of (name, digest) sequence pairs. The pairs
+    are partitioned by shard and each shard having pairs is updated with them,
+    in parallel.
+    '''
+    if not nameDigestPairs:
+      return
+    by_shard = self.__partition(nameDigestPairs, lambda pair: pair[0])
+    self.__map(lambda item: self.shards[item[0]].update(item[1]), by_shard.items())
+
+  def retrieveDigest(self, recordName):
+    '''
+    Returns the digest for recordName from the shard holding it, or None if
+    not found.
+    '''
+    if not recordName:
+      return None
+    return self.shards[self.shardIndex(recordName)].retrieveDigest(recordName)
+
+  def retrieveDigests(self, recordNames):
+    '''
+    Returns a dictionary mapping each of recordNames to its digest, or None if
+    not found, looking up the names of each shard in parallel.
+    '''
+    def retrieve(item):
+      shard = self.shards[item[0]]
+      return [(name, shard.retrieveDigest(name)) for name in item[1]]
+    digests = {}
+    for pairs in self.__map(retrieve, self.__partition(recordNames).items()):
+      digests.update(pairs)
+    return digests
+
+  def supportsCollection(self, method):
+    '''
+    Returns True if the collection method named by method - 'names',
+    'remove', 'retain' or 'compact' - can be used, that is if all the shards
+    provide it.
+    '''
+    return all(hasattr(shard, method) for shard in self.shards)
+
+  def __require(self, method):
+    '''
+    Internal helper method. Raises NotImplementedError if the collection
+    method named by method cannot be used.
+    '''
+    if not self.supportsCollection(method):
+      raise NotImplementedError("ShardedDigestStore: Not all shards provide a '%s' method" % method)
+
+  def names(self):
+    '''
+    Returns a list of the names of the records in all shards.
+    '''
+    self.__require('names')
+    names = []
+    for shard_names in self.__map(lambda shard: shard.names(), self.shards):
+      names.extend(shard_names)
+    return names
+
+  def remove(self, names):
+    '''
+    Removes the records for names from the shards holding them.
+    '''
+    self.__require('remove')
+    by_shard = self.__partition(names)
+    self.__map(lambda item: self.shards[item[0]].remove(item[1]), by_shard.items())
+
+  def retain(self, names, dryRun=False):
+    '''
+    Removes all records other than those for names from all shards, returning
+    the number removed. If dryRun is True nothing is removed.
+    '''
+    self.__require('retain')
+    by_shard = self.__partition(names)
+    def retain(index):
+      return self.shards[index].retain(by_shard.get(index, []), dryRun=dryRun)
+    return sum(self.__map(retain, range(len(self.shards))))
+
+  def compact(self):
+    '''
+    Compacts all shards.
+    '''
+    self.__require('compact')
+    self.__map(lambda shard: shard.compact(), self.shards)
+
+  def close(self):
+    '''
+    Shuts down the worker threads and closes any shards having a close
+    method.
+    '''
+    if self.__executor is not None:
+      self.__executor.shutdown()
+      self.__executor = None
+    for shard in self.shards:
+      if hasattr(shard, 'close'):
+        shard.close()
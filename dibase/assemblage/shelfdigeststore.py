@@ -12,12 +12,31 @@ License: dual: GPL or BSD.
 '''
 
 from .interfaces import DigestStoreBase
+from .filelock import FileLock
+import tempfile
 import shelve
+import json
+import dbm
+import os
 
 class ShelfDigestStore(DigestStoreBase):
   '''
   Digest store based on a Python shelve persistent object store.
+
+  The store may be shared by several processes - such as build scripts run at
+  the same time using the default store pathname. Access is serialised by a
+  lock file, the store pathname with '.lock' appended: an update holds the
+  lock exclusively while it writes its changed records, so concurrent updates
+  are merged record by record rather than one losing the other's changes
+  or corrupting the store, and a retrieval holds it shared only while it
+  reads one record.
+
+  Removing records does not necessarily shrink the shelf's files - that
+  depends on the dbm module in use - but compact does, in a way that an
+  interrupted compaction is completed or has no effect.
   '''
+  __dbm_suffixes = ('', '.db', '.dat', '.dir', '.bak', '.pag')
+
   @staticmethod
   def defaultPath():
     '''
@@ -33,6 +52,7 @@ class ShelfDigestStore(DigestStoreBase):
     value of ShelfDigestStore.defaultPath()
     '''
     self.pathname = pathname if pathname else self.defaultPath()
+    self.__lock = FileLock(self.pathname + '.lock')
 
   def update(self, nameDigestPairs):
     '''
@@ -45,9 +65,11 @@ class ShelfDigestStore(DigestStoreBase):
     then synchronises the shelf to ensure values are written back to file.
     '''
     if nameDigestPairs:
-      with shelve.open(self.pathname) as store:
-        for nd in nameDigestPairs:
-          store[nd[0]] = nd[1]
+      with self.__lock.exclusive():
+        self.__complete_compaction()
+        with shelve.open(self.pathname) as store:
+          for nd in nameDigestPairs:
+            store[nd[0]] = nd[1]
     
   def retrieveDigest(self, recordName):
     '''
@@ -57,7 +79,134 @@ class ShelfDigestStore(DigestStoreBase):
     '''
     digest = None
     if recordName:
-      with shelve.open(self.pathname) as store:
-        if recordName in store:
-          digest = store[recordName]
+      try:
+        digest = self.__read(lambda store: store.get(recordName))
+      except dbm.error: # store does not yet exist - create it
+        with self.__lock.exclusive():
+          self.__complete_compaction()
+          with shelve.open(self.pathname) as store:
+            digest = store.get(recordName)
     return digest
+
+  def names(self):
+    '''
+    Returns a list of the names of the records in the store.
+    '''
+    try:
+      return self.__read(lambda store: list(store.keys()))
+    except dbm.error: # store does not exist
+      return []
+
+  def remove(self, names):
+    '''
+    Removes the records for each of the names having records.
+    '''
+    if names:
+      with self.__lock.exclusive():
+        self.__complete_compaction()
+        with shelve.open(self.pathname) as store:
+          for name in names:
+            if name in store:
+              del store[name]
+
+  def compact(self):
+    '''
+    Rewrites the store as a new shelf holding just its current records, under
+    temporary names, then replaces the existing shelf with it, all while
+    holding the lock exclusively. A dbm module may keep a shelf in several
+    files, which cannot all be replaced at once, so once the new shelf has
+    been written a marker file, the store pathname with '.compacted'
+    appended, listing its files is atomically created before they are moved
+    over the existing shelf's files. Should compaction be interrupted before
+    the marker is created the existing shelf is used; once it is created
+    the next access to the store completes the replacement first. So the
+    store never consists of a mix of old and new files.
+    '''
+    compacting_pathname = self.pathname + '.compacting'
+    with self.__lock.exclusive():
+      self.__complete_compaction()
+      self.__remove_files(compacting_pathname) # left by a failed compaction
+      try:
+        with shelve.open(self.pathname) as store,\
+             shelve.open(compacting_pathname, flag='n') as compacted:
+          for name in store.keys():
+            compacted[name] = store[name]
+        suffixes = [ suffix for suffix in self.__dbm_suffixes
+                     if os.path.exists(compacting_pathname + suffix)
+                   ]
+        self.__write_marker(suffixes)
+      finally:
+        if not os.path.exists(self.__marker_pathname()):
+          self.__remove_files(compacting_pathname)
+      self.__complete_compaction()
+
+  def __read(self, read):
+    '''
+    Internal helper method. Returns the result of calling read passing the
+    shelf opened read only, holding the lock shared, unless a compaction
+    needs completing in which case it is completed first. Raises dbm.error if
+    the store does not exist.
+    '''
+    with self.__lock.shared():
+      if not os.path.exists(self.__marker_pathname()):
+        with shelve.open(self.pathname, flag='r') as store:
+          return read(store)
+    with self.__lock.exclusive():
+      self.__complete_compaction()
+    return self.__read(read)
+
+  def __marker_pathname(self):
+    '''
+    Internal helper method. Returns the pathname of the file marking that the
+    files of a compacted shelf are to replace those of the existing shelf.
+    '''
+    return self.pathname + '.compacted'
+
+  def __write_marker(self, suffixes):
+    '''
+    Internal helper method. Atomically creates the compaction marker file
+    listing the suffixes of the compacted shelf's files.
+    '''
+    marker_pathname = self.__marker_pathname()
+    directory = os.path.dirname(os.path.abspath(marker_pathname))
+    fd, temp_path = tempfile.mkstemp(dir=directory, prefix='.assemblage-')
+    try:
+      with os.fdopen(fd, 'w', encoding='utf-8') as file:
+        json.dump(suffixes, file)
+        file.flush()
+        os.fsync(file.fileno())
+      os.replace(temp_path, marker_pathname)
+    except:
+      if os.path.exists(temp_path):
+        os.remove(temp_path)
+      raise
+
+  def __complete_compaction(self):
+    '''
+    Internal helper method. If there is a compaction marker file moves the
+    compacted shelf's files it lists that have not yet been moved over the
+    existing shelf's files, removes the existing shelf's other files then
+    removes the marker. May be repeated if interrupted. Must be called with
+    the lock held exclusively.
+    '''
+    marker_pathname = self.__marker_pathname()
+    if not os.path.exists(marker_pathname):
+      return
+    with open(marker_pathname, encoding='utf-8') as file:
+      suffixes = json.load(file)
+    compacting_pathname = self.pathname + '.compacting'
+    for suffix in suffixes:
+      if os.path.exists(compacting_pathname + suffix):
+        os.replace(compacting_pathname + suffix, self.pathname + suffix)
+    for suffix in self.__dbm_suffixes:
+      if suffix not in suffixes and os.path.exists(self.pathname + suffix):
+        os.remove(self.pathname + suffix)
+    os.remove(marker_pathname)
+
+  def __remove_files(self, pathname):
+    '''
+    Internal helper method. Removes any dbm files of the shelf at pathname.
+    '''
+    for suffix in self.__dbm_suffixes:
+      if os.path.exists(pathname + suffix):
+        os.remove(pathname + suffix)
@@ -0,0 +1,136 @@
+#! /usr/bin/python3
+# v3.5+
+'''
+Part of the dibase/assemblage package.
+A tool to apply actions to multi-part constructs.
+
+Definition of the StatCache class and related entities.
+
+Developed by R.E. McArdell / Dibase Limited.
+Copyright (c) 2015 Dibase Limited
+License: dual: GPL or BSD.
+'''
+
+import os
+
+class StatCache:
+  '''
+  Apply-scoped cache of file system status information shared by all the
+  FileComponent (or similar) elements of an assemblage.
+
+  Each path is stat-ed at most once between calls to clear - which an
+  Assemblage does at the start of each apply - unless it is explicitly
+  invalidated, as is done for an element's path after its before or after
+  elements actions have been performed as they may have (re-)written it.
+  Values derived from a path's contents, such as digests, may also be cached
+  against the path and are discarded along with its status.
+
+  By default the first query for a path lists the path's directory with
+  os.scandir and existence (and, where the platform provides it with the
+  listing, status) queries for all other paths in the same directory that
+  are in the listing are answered from the listing's DirEntry objects
+  rather than by a system call per path. Paths not in the listing are
+  stat-ed directly, as they may have been created since the directory was
+  listed - by an action writing several files - or differ from the listed
+  name only in case on a case-insensitive file system.
+  '''
+  def __init__(self, listDirectories=True):
+    '''
+    Initialises an empty cache. If listDirectories is False then paths are
+    always stat-ed individually rather than by listing their directory.
+    '''
+    self.__list_directories = listDirectories
+    self.__stats = {}
+    self.__values = {}
+    self.__listings = {}
+    self.__direct = set()
+  def clear(self):
+    '''
+    Discard all cached status information, directory listings and values.
+    '''
+    self.__stats.clear()
+    self.__values.clear()
+    self.__listings.clear()
+    self.__direct.clear()
+  def invalidate(self, path):
+    '''
+    Discard cached status information and values for the path parameter so
+    the next query for it goes to the file system. As the listing of the
+    path's directory is out of date with respect to path, path is stat-ed
+    directly from then on.
+    '''
+    self.__stats.pop(path, None)
+    self.__values.pop(path, None)
+    self.__direct.add(path)
+  def __listing(self, directory):
+    '''
+    Internal helper method. Returns the name:DirEntry map for directory,
+    listing it with os.scandir if not already listed. A directory that does
+    not exist has an empty listing. Returns None if the directory cannot be
+    listed for other reasons.
+    '''
+    if directory not in self.__listings:
+      try:
+        listing = {entry.name:entry for entry in list(os.scandir(directory))}
+      except (FileNotFoundError, NotADirectoryError):
+        listing = {}
+      except OSError:
+        listing = None
+      self.__listings[directory] = listing
+    return self.__listings[directory]
+  def __entry(self, path):
+    '''
+    Internal helper method. Returns a (listed, entry) pair for path. listed is
+    False and entry None if path's status has to be obtained directly.
+    Otherwise entry is the DirEntry for path from its directory's listing.
+    Paths not in the listing are stat-ed directly, as are symbolic links as
+    they are not followed by listings.
+    '''
+    if not self.__list_directories or path in self.__direct:
+      return False, None
+    directory, name = os.path.split(path)
+    listing = self.__listing(directory) if name else None
+    if listing is None:
+      return False, None
+    entry = listing.get(name)
+    if entry is None or entry.is_symlink():
+      return False, None
+    return True, entry
+  def stat(self, path):
+    '''
+    Returns the os.stat_result for path, or None if path does not exist. The
+    file system is only queried the first time a path is asked about.
+    '''
+    if path in self.__stats:
+      return self.__stats[path]
+    listed, entry = self.__entry(path)
+    result = None
+    if entry or not listed:
+      try:
+        result = entry.stat() if entry else os.stat(path)
+      except (FileNotFoundError, NotADirectoryError):
+        pass
+    self.__stats[path] = result
+    return result
+  def exists(self, path):
+    '''
+    Returns True if path exists, False if it does not. Paths in a directory's
+    listing are answered from the listing without stat-ing them.
+    '''
+    if path in self.__stats:
+      return self.__stats[path] is not None
+    listed, entry = self.__entry(path)
+    if listed:
+      return entry is not None
+    return self.stat(path) is not None
+  def value(self, path, name, compute):
+    '''
+    Returns a value named by the name parameter derived from the file at path.
+    If not already cached the value is obtained by calling compute with no
+    arguments and cached against path until it is invalidated or the cache
+    cleared.
+    '''
+    values = self.__values.setdefault(path, {})
+    if name not in values:
+      values[name] = compute()
+    return values[name]
@@ -12,8 +12,24 @@ if __name__ == '__main__':
               , ('assemblage-Component-tests', 'TestAssemblageComponent')
               , ('assemblage-Compound-tests', 'TestAssemblageCompound')
               , ('assemblage-DigestCache-tests', 'TestAssemblageDigestCache')
+              , ('assemblage-DigestRecords-tests', 'TestAssemblageDigestRecords')
+              , ('assemblage-IncrementalWriteBack-tests', 'TestAssemblageIncrementalWriteBack')
               , ('assemblage-ShelfDigestStore-tests', 'TestAssemblageDigestStore')
+              , ('assemblage-MappedDigestStore-tests', 'TestAssemblageMappedDigestStore')
+              , ('assemblage-JournalDigestStore-tests', 'TestAssemblageJournalDigestStore')
+              , ('assemblage-ShardedDigestStore-tests', 'TestAssemblageShardedDigestStore')
+              , ('assemblage-DigestStoreCollector-tests', 'TestAssemblageDigestStoreCollector')
+              , ('assemblage-FileLock-tests', 'TestAssemblageFileLock')
               , ('assemblage-FileComponent-tests', 'TestAssemblageFileComponent')
+              , ('assemblage-StatCache-tests', 'TestAssemblageStatCache')
+              , ('assemblage-FileSnapshot-tests', 'TestAssemblageFileSnapshot')
+              , ('assemblage-DirectoryScan-tests', 'TestAssemblageDirectoryScan')
+              , ('assemblage-GraphAnalysis-tests', 'TestAssemblageGraphAnalysis')
+              , ('assemblage-GraphExport-tests', 'TestAssemblageGraphExport')
+              , ('assemblage-Instrumentation-tests', 'TestAssemblageInstrumentation')
+              , ('assemblage-TraceEventWriter-tests', 'TestAssemblageTraceEventWriter')
+              , ('assemblage-ArtifactCache-tests', 'TestAssemblageArtifactCache')
+              , ('assemblage-HTTPArtifactCache-tests', 'TestAssemblageHTTPArtifactCache')
               , ('assemblage-CompositeResolver-tests', 'TestAssemblageCompositeResolver')
               , ('assemblage-ResolverFactory-tests', 'TestAssemblageResolverFactory')
               , ('assemblage-ResolutionPlan-tests', 'TestAssemblageResolutionPlan')
@@ -0,0 +1,138 @@
+#! /usr/bin/python3
+# v3.4+
+"""
+Tests for dibase.assemblage.artifactcache.ArtifactCache 
+"""
+import unittest
+import tempfile
+import shutil
+
+import os,sys
+project_root_dir = os.path.dirname(
+                    os.path.dirname(
+                      os.path.dirname(
+                        os.path.dirname( os.path.realpath(__file__)
+                        )    # this directory 
+                      )      # assemblage directory 
+                    )        # dibase directory 
+                  )          # project directory
+if project_root_dir not in sys.path:
+  sys.path.insert(0, project_root_dir)
+from dibase.assemblage.artifactcache import ArtifactCache
+from dibase.assemblage.filecomponent import FileComponent
+from dibase.assemblage.statcache import StatCache
+
+class SpoofResolver:
+  def __init__(self, actionName, **unused):
+    self.actionname = actionName
+  def resolve(self, fnName, object=None):
+    return getattr(object, "%(a)s_%(f)s"%{'a':self.actionname, 'f':fnName}, None)
+class SpoofResolutionPlan:
+  def create(self, actionName, **dynArgs):
+    return SpoofResolver(actionName, **dynArgs)
+
+class CopyFileComponent(FileComponent):
+  def __init__(self, name, attributes, elements=[], logger=None):
+    super().__init__(name,attributes,elements,logger)
+    self.copy_count = 0
+  def build_queryProcessElements(self):
+    return True
+  def build_queryDoAfterElementsActions(self):
+    return True
+  def build_afterElementsActions(self):
+    self.copy_count = self.copy_count + 1
+    with open(self.normalisedPath(), 'w') as out:
+      for e in self.elements():
+        with open(e.normalisedPath()) as f:
+          out.write(f.read())
+
+class TestAssemblageArtifactCache(unittest.TestCase):
+  def setUp(self):
+    self.dir = tempfile.mkdtemp()
+    self.cache_dir = os.path.join(self.dir, 'cache')
+  def tearDown(self):
+    shutil.rmtree(self.dir)
+  def path(self, name):
+    return os.path.join(self.dir, name)
+  def write(self, name, content):
+    with open(self.path(name), 'w') as f:
+      f.write(content)
+    return self.path(name)
+  def read(self, name):
+    with open(self.path(name)) as f:
+      return f.read()
+  def test_restore_returns_False_for_unknown_key(self):
+    self.assertFalse(ArtifactCache(self.cache_dir).restore('nosuchkey', [self.path('out')]))
+  def test_restore_restores_stored_files(self):
+    ac = ArtifactCache(self.cache_dir)
+    paths = [self.write('out1', 'one'), self.write('out2', 'two')]
+    self.assertTrue(ac.store('key', paths))
+    for p in paths:
+      os.remove(p)
+    self.assertTrue(ac.restore('key', paths))
+    self.assertEqual(self.read('out1'), 'one')
+    self.assertEqual(self.read('out2'), 'two')
+  def test_restore_by_hard_link(self):
+    ac = ArtifactCache(self.cache_dir, useHardLinks=True)
+    path = self.write('out', 'content')
+    ac.store('key', [path])
+    os.remove(path)
+    self.assertTrue(ac.restore('key', [path]))
+    self.assertEqual(self.read('out'), 'content')
+  def test_entries_persist_between_cache_instances(self):
+    path = self.write('out', 'content')
+    ArtifactCache(self.cache_dir).store('key', [path])
+    os.remove(path)
+    self.assertTrue(ArtifactCache(self.cache_dir).restore('key', [path]))
+  def test_store_returns_False_if_file_does_not_exist(self):
+    self.assertFalse(ArtifactCache(self.cache_dir).store('key', [self.path('nosuchfile')]))
+  def test_least_recently_used_entries_evicted_when_over_maximum_size(self):
+    ac = ArtifactCache(self.cache_dir, maxSize=10)
+    ac.store('k1', [self.write('o1', '1234')])
+    ac.store('k2', [self.write('o2', '1234')])
+    self.assertTrue(ac.restore('k1', [self.path('o1')]))
+    ac.store('k3', [self.write('o3', '1234')])
+    self.assertTrue(ac.contains('k1'))
+    self.assertFalse(ac.contains('k2'))
+    self.assertTrue(ac.contains('k3'))
+    self.assertEqual(ac.size(), 8)
+  def test_key_changes_when_input_changes(self):
+    attrs = {'__stat_cache__' : StatCache()}
+    source = FileComponent(self.write('in', 'input'), attrs)
+    target = CopyFileComponent(self.path('out'), attrs, elements=[source])
+    key = target.artifactKey('build')
+    self.assertEqual(target.artifactKey('build'), key)
+    self.assertNotEqual(target.artifactKey('clean'), key)
+    self.write('in', 'changed')
+    source.invalidateCachedStatus()
+    self.assertNotEqual(target.artifactKey('build'), key)
+  def test_key_is_None_if_element_does_not_support_composite_digests(self):
+    class NoComposite:
+      pass
+    target = CopyFileComponent(self.path('out'), {}, elements=[NoComposite()])
+    self.assertIsNone(target.artifactKey('build'))
+  def test_apply_restores_outputs_instead_of_performing_after_actions(self):
+    attrs = { '__logger__' : None
+            , '__resolution_plan__' : SpoofResolutionPlan()
+            , '__stat_cache__' : StatCache()
+            , '__artifact_cache__' : ArtifactCache(self.cache_dir)
+            }
+    source = FileComponent(self.write('in', 'input'), attrs)
+    target = CopyFileComponent(self.path('out'), attrs, elements=[source])
+    target.apply('build')
+    self.assertEqual(target.copy_count, 1)
+    self.assertEqual(target.queryCacheStatus(), 'missed')
+    os.remove(self.path('out'))
+    target.apply('build')
+    self.assertEqual(target.copy_count, 1)
+    self.assertEqual(self.read('out'), 'input')
+    self.assertTrue(target.queryAfterElementsActionsDone())
+    self.assertEqual(target.queryCacheStatus(), 'restored')
+    self.write('in', 'changed')
+    target.apply('build')
+    self.assertEqual(target.copy_count, 2)
+    self.assertEqual(target.queryCacheStatus(), 'missed')
+    self.assertEqual(self.read('out'), 'changed')
+
+if __name__ == '__main__':
+  unittest.main()
@@ -19,7 +19,9 @@ project_root_dir = os.path.dirname(
 if project_root_dir not in sys.path:
   sys.path.insert(0, project_root_dir)
 from dibase.assemblage.assemblage import Assemblage
-from dibase.assemblage.interfaces import AssemblagePlanBase,DigestCacheBase
+from dibase.assemblage.interfaces import AssemblagePlanBase,DigestCacheBase,DigestStoreBase
+from dibase.assemblage.digestcache import DigestCache as AssemblageDigestCache
+from dibase.assemblage.shardeddigeststore import ShardedDigestStore
 
 class Component:
   def _applyInner(self, action, resolver):
@@ -54,6 +56,58 @@ class NoteLastAppliedAction:
 class NotApplicable:
   pass
 
+class RaiseOnApply(Component):
+  def _applyInner(self, action, resolver):
+    raise RuntimeError("RaiseOnApply: apply failed!!!")
+
+class DigestChecked:
+  def __init__(self, name, subelements=[]):
+    self.name = name
+    self.subelements = subelements
+    self.digestCache = None
+  def __str__(self):
+    return self.name
+  def elements(self):
+    return self.subelements
+  def digest(self):
+    return b'digest'
+  def _applyInner(self, action, resolver):
+    for element in self.subelements:
+      element._applyInner(action, resolver)
+    if not self.subelements:
+      self.digestCache.updateIfDifferent(self)
+  def queryBeforeElementsActionsDone(self):
+    return False
+  def queryAfterElementsActionsDone(self):
+    return True
+
+class CountingDigestStore(DigestStoreBase):
+  def __init__(self):
+    self.store = {}
+    self.lookups = 0
+  def retrieveDigest(self, recordName):
+    self.lookups = self.lookups + 1
+    return self.store.get(recordName)
+  def update(self, nameDigestPairs):
+    for nd in nameDigestPairs:
+      self.store[nd[0]] = nd[1]
+
+class NoteRetrieveDigestsCalls(ShardedDigestStore):
+  def __init__(self, shards):
+    super().__init__(shards)
+    self.calls = []
+  def retrieveDigests(self, recordNames):
+    self.calls.append(sorted(recordNames))
+    return super().retrieveDigests(recordNames)
+
+class NoteWriteBackCalls:
+  def __init__(self):
+    self.calls = []
+  def begin(self, digestCache, elements, action, logger=None):
+    self.calls.append(('begin', action))
+  def finish(self):
+    self.calls.append(('finish',))
+
 class DigestCache(DigestCacheBase):
   def updateIfDifferent(self, element):
     pass
@@ -166,6 +220,78 @@ class TestAssemblageAssemblage(unittest.TestCase):
     self.assertIsInstance(Assemblage(Blueprint([Component()])).logger(), logging.Logger)
   def test_can_call_digestCache_method_ok(self):
     self.assertIsInstance(Assemblage(Blueprint([Component()])).digestCache(), DigestCache)
+  def test_statCache_is_cleared_on_each_apply(self):
+    path = os.path.realpath(__file__)
+    a = Assemblage(Blueprint([Component()]))
+    a.statCache().value(path, 'v', lambda : 'old')
+    a.apply("anAction")
+    self.assertEqual(a.statCache().value(path, 'v', lambda : 'new'), 'new')
+  def test_leaf_digests_preloaded_in_one_call_from_store_supporting_it(self):
+    shards = [CountingDigestStore() for i in range(3)]
+    store = NoteRetrieveDigestsCalls(shards)
+    leaves = [DigestChecked('leaf%d' % i) for i in range(6)]
+    top = [DigestChecked('top1', leaves[:4]), DigestChecked('top2', leaves[2:])]
+    bp = Blueprint(top)
+    try:
+      for apply_count in range(2): # each with a new cache, as by a new process
+        bp.attributes()['__store__'] = AssemblageDigestCache(store)
+        for element in leaves:
+          element.digestCache = bp.attributes()['__store__']
+        Assemblage(bp).apply("anAction")
+        self.assertEqual(store.calls[apply_count], ['leaf%d' % i for i in range(6)])
+        self.assertEqual(sum(shard.lookups for shard in shards), 6 * (apply_count + 1))
+      self.assertEqual(len(store.calls), 2)
+      self.assertEqual(sum(len(shard.store) for shard in shards), 6)
+    finally:
+      store.close()
+  def test_incremental_write_back_begun_and_finished_on_each_apply(self):
+    bp = Blueprint([Component()])
+    wb = NoteWriteBackCalls()
+    bp.attributes()['__incremental_write_back__'] = wb
+    Assemblage(bp).apply("anAction")
+    self.assertEqual(wb.calls, [('begin', 'anAction'), ('finish',)])
+  def test_incremental_write_back_finished_if_apply_fails(self):
+    bp = Blueprint([RaiseOnApply()])
+    wb = NoteWriteBackCalls()
+    bp.attributes()['__incremental_write_back__'] = wb
+    with self.assertRaises(RuntimeError):
+      Assemblage(bp).apply("anAction")
+    self.assertEqual(wb.calls, [('begin', 'anAction'), ('finish',)])
+  def test_digest_store_collector_records_each_successful_apply(self):
+    class NoteRecordApplyCalls:
+      def __init__(self):
+        self.actions = []
+      def recordApply(self, elements, action):
+        self.actions.append(action)
+    collector = NoteRecordApplyCalls()
+    bp = Blueprint([Component()])
+    bp.attributes()['__digest_store_collector__'] = collector
+    Assemblage(bp).apply("anAction")
+    self.assertEqual(collector.actions, ['anAction'])
+    bp = Blueprint([RaiseOnApply()])
+    bp.attributes()['__digest_store_collector__'] = collector
+    with self.assertRaises(RuntimeError):
+      Assemblage(bp).apply("anotherAction")
+    self.assertEqual(collector.actions, ['anAction'])
+  def test_file_snapshot_verified_before_and_saved_after_successful_apply(self):
+    class NoteSnapshotCalls:
+      def __init__(self):
+        self.calls = []
+      def verify(self):
+        self.calls.append('verify')
+      def save(self):
+        self.calls.append('save')
+    snapshot = NoteSnapshotCalls()
+    bp = Blueprint([Component()])
+    bp.attributes()['__file_snapshot__'] = snapshot
+    Assemblage(bp).apply("anAction")
+    self.assertEqual(snapshot.calls, ['verify', 'save'])
+    snapshot.calls = []
+    bp = Blueprint([RaiseOnApply()])
+    bp.attributes()['__file_snapshot__'] = snapshot
+    with self.assertRaises(RuntimeError):
+      Assemblage(bp).apply("anAction")
+    self.assertEqual(snapshot.calls, ['verify'])
 
 if __name__ == '__main__':
   unittest.main()
@@ -7,6 +7,9 @@ import unittest
 import logging
 import io
 import re
+import tempfile
+import shutil
+import json
 
 import os,sys
 project_root_dir = os.path.dirname(
@@ -509,6 +512,235 @@ class TestAssemblageBlueprint(unittest.TestCase):
     b.addElements('child1', TestComponent, elements='grandchild0')
     b.addElements('grandchild0', grandchildElement)
     self.assertEqual(len(b.topLevelElements()),1)
+  def test_element_view_is_live_and_names_returned_from_it_are_snapshots(self):
+    b = Blueprint()
+    views = []
+    b.addElements(lambda view: views.append(view) or ['a.cpp', 'b.cpp'], TestComponent, group='src')
+    view = views[0]
+    self.assertEqual(view.elements('src'), ['a.cpp', 'b.cpp'])
+    b.addElements(lambda view: (n[:-4] + '.o' for n in view.elements('src')), TestComponent, group='src')
+    b.addElements('exe', TestComponent, elements=lambda view: view.elements('src'))
+    self.assertEqual(view.elements('src'), ['a.cpp', 'b.cpp', 'a.o', 'b.o'])
+    self.assertTrue(view.has_element('src', 'b.o'))
+    self.assertFalse(view.has_element('obj', 'b.o'))
+    self.assertEqual(view.elements('obj'), [])
+    self.assertEqual(view.groups(), ['src', ''])
+    b.addElements('late.cpp', TestComponent, group='src')
+    exe = [e for e in b.topLevelElements() if e.name == 'exe'][0]
+    self.assertEqual(sorted(e.name for e in exe.elements), ['a.cpp', 'a.o', 'b.cpp', 'b.o'])
+  def test_loadElements_adds_mapping_and_sequence_specifications_in_chunks(self):
+    b = Blueprint()
+    b.addElements('existing', TestComponent)
+    specifications = [ {'name':'root', 'kind':'component', 'elements':['a','b'], 'colour':'red'}
+                     , ('a', TestComponent, 'leaves')
+                     , ('b', 'component', 'leaves', 'existing', {'colour':'blue'})
+                     ]
+    report = b.loadElements(iter(specifications), {'component':TestComponent}, chunkSize=2)
+    self.assertEqual(report['elements'], 3)
+    self.assertEqual(report['chunks'], 2)
+    self.assertIn('elementsPerSecond', report)
+    elements = b.topLevelElements()
+    self.assertEqual([e.name for e in elements], ['root'])
+    self.assertEqual(elements[0].args['colour'], 'red')
+    self.assertEqual(sorted(e.args.get('colour') or '' for e in elements[0].elements), ['', 'blue'])
+    b.addElements(lambda view: ['leaf-count-%d' % len(view.elements('leaves'))], TestComponent)
+    self.assertEqual(sorted(e.name for e in b.topLevelElements()), ['leaf-count-2', 'root'])
+  def test_loadElements_raises_for_duplicate_unknown_kind_or_incomplete_specifications(self):
+    b = Blueprint()
+    b.addElements('existing', TestComponent)
+    with self.assertRaisesRegex(RuntimeError, 'Duplicate'):
+      b.loadElements([('new0', TestComponent), ('new1', TestComponent), ('existing', TestComponent)])
+    with self.assertRaisesRegex(RuntimeError, 'Duplicate'):
+      b.loadElements([('new0', TestComponent), ('new0', TestComponent)])
+    self.assertEqual([e.name for e in b.topLevelElements()], ['existing'])
+    with self.assertRaisesRegex(RuntimeError, 'kind unknown'):
+      b.loadElements([('new0', 'no.such.Kind')])
+    with self.assertRaisesRegex(RuntimeError, 'incomplete'):
+      b.loadElements([{'name':'new0'}])
+  def test_readManifest_reads_csv_json_and_jsonl_manifests(self):
+    directory = tempfile.mkdtemp()
+    try:
+      kind = TestComponent.__module__ + '.TestComponent'
+      csv_path = os.path.join(directory, 'elements.csv')
+      with open(csv_path, 'w') as f:
+        f.write('name,kind,group,elements,colour\n')
+        f.write('root,%s,,a;b,red\n' % kind)
+        f.write('a,%s,leaves,,\n' % kind)
+      jsonl_path = os.path.join(directory, 'elements.jsonl')
+      with open(jsonl_path, 'w') as f:
+        f.write('{"name":"b", "kind":"%s", "group":"leaves"}\n\n' % kind)
+      json_path = os.path.join(directory, 'elements.json')
+      with open(json_path, 'w') as f:
+        f.write('[{"name":"c", "kind":"%s", "size":3}]' % kind)
+      self.assertEqual( list(Blueprint.readManifest(csv_path))
+                      , [ {'name':'root', 'kind':kind, 'group':'', 'elements':['a','b'], 'colour':'red'}
+                        , {'name':'a', 'kind':kind, 'group':'leaves'}
+                        ]
+                      )
+      self.assertEqual( list(Blueprint.readManifest(jsonl_path))
+                      , [{'name':'b', 'kind':kind, 'group':'leaves'}]
+                      )
+      self.assertEqual( list(Blueprint.readManifest(json_path))
+                      , [{'name':'c', 'kind':kind, 'size':3}]
+                      )
+      b = Blueprint()
+      for path in (csv_path, jsonl_path):
+        b.loadElements(Blueprint.readManifest(path))
+      self.assertEqual([e.name for e in b.topLevelElements()], ['root'])
+      with self.assertRaises(ValueError):
+        list(Blueprint.readManifest(os.path.join(directory, 'elements.txt')))
+    finally:
+      shutil.rmtree(directory)
+  def test_topLevelElements_returns_same_elements_until_invalidated(self):
+    b = Blueprint()
+    b.addElements('root', TestComponent, elements='child')
+    b.addElements('child', TestComponent)
+    elements = b.topLevelElements()
+    self.assertIs(b.topLevelElements(), elements)
+    self.assertIs(b.topLevelElements()[0].elements[0], elements[0].elements[0])
+    b.addElements('other', TestComponent)
+    self.assertEqual(len(b.topLevelElements()), 2)
+    self.assertIsNot(b.topLevelElements()[0], elements[0])
+    elements = b.topLevelElements()
+    logger = logging.getLogger('assemblage-Blueprint-tests.topLevelElements')
+    b.setLogger(logger)
+    self.assertIsNot(b.topLevelElements(), elements)
+    self.assertIs(b.topLevelElements()[0].logger, logger)
+    self.assertIs(b.topLevelElements()[0].elements[0].logger, logger)
+    elements = b.topLevelElements()
+    b.setDigestCache(NullDigestCache())
+    self.assertIsNot(b.topLevelElements(), elements)
+    elements = b.topLevelElements()
+    b.loadElements([('loaded', TestComponent)])
+    self.assertEqual(len(b.topLevelElements()), 3)
+  def test_element_view_names_in_dict_and_indexed_elements_are_not_live(self):
+    b = Blueprint()
+    b.addElements(['a.o', 'b.o'], TestComponent, group='obj')
+    b.addElements(['a.c', 'b.c'], TestComponent, group='src')
+    b.addElements('exe', TestComponent, elements=lambda view: {'exe': view.elements('obj')})
+    b.addElements('first', TestComponent, elements=lambda view: view.elements('src')[0])
+    b.addElements( ['lib1', 'lib2'], TestComponent
+                 , elements=lambda view: [view.elements('obj'), view.elements('src')]
+                 )
+    b.addElements('c.o', TestComponent, group='obj')
+    elements = dict((e.name, e) for e in b.topLevelElements())
+    self.assertEqual(sorted(elements), ['c.o', 'exe', 'first', 'lib1', 'lib2'])
+    self.assertEqual([e.name for e in elements['exe'].elements], ['a.o', 'b.o'])
+    self.assertEqual([e.name for e in elements['first'].elements], ['a.c'])
+    self.assertEqual([e.name for e in elements['lib1'].elements], ['a.o', 'b.o'])
+    self.assertEqual([e.name for e in elements['lib2'].elements], ['a.c', 'b.c'])
+  def test_addCachedElements_loads_cached_specifications_while_sources_unchanged(self):
+    directory = tempfile.mkdtemp()
+    try:
+      cache_path = os.path.join(directory, 'cache')
+      data_path = os.path.join(directory, 'data')
+      with open(data_path, 'w') as f:
+        f.write('child')
+      calls = []
+      def define(b):
+        calls.append(b)
+        b.addElements('root', TestComponent, group='roots', elements=['child'], colour='red')
+        b.addElements('child', TestComponent)
+      b = Blueprint().addCachedElements(define, cache_path, [data_path])
+      b = Blueprint()
+      b.addElements('other', TestComponent)
+      b.addCachedElements(define, cache_path, [data_path])
+      self.assertEqual(len(calls), 1)
+      elements = sorted(b.topLevelElements())
+      self.assertEqual([e.name for e in elements], ['other', 'root'])
+      self.assertEqual(elements[1].args['colour'], 'red')
+      self.assertEqual([e.name for e in elements[1].elements], ['child'])
+      b.addElements(lambda view: ['in-roots'] if view.has_element('roots', 'root') else [], TestComponent)
+      self.assertEqual(len(b.topLevelElements()), 3)
+      with open(data_path, 'w') as f:
+        f.write('changed')
+      Blueprint().addCachedElements(define, cache_path, [data_path])
+      self.assertEqual(len(calls), 2)
+    finally:
+      shutil.rmtree(directory)
+  def test_addCachedElements_caches_json_data_and_ignores_other_cache_files(self):
+    directory = tempfile.mkdtemp()
+    try:
+      cache_path = os.path.join(directory, 'cache')
+      with open(cache_path, 'wb') as f:
+        f.write(b'\x80\x04not json')
+      calls = []
+      logger = logging.getLogger('assemblage-Blueprint-tests.json')
+      def define(b):
+        calls.append(b)
+        b.loadElements([ { 'name':'root', 'kind':TestComponent, 'logger':logger
+                         , 'sizes':[1, 2], 'options':{'x':None}
+                         }
+                       ])
+      Blueprint().addCachedElements(define, cache_path)
+      with open(cache_path, encoding='utf-8') as f:
+        cached = json.load(f)
+      self.assertEqual( cached['specifications']
+                      , [ [ 'root', TestComponent.__module__ + '.TestComponent', '', []
+                          , logger.name, {'sizes':[1, 2], 'options':{'x':None}}
+                          ]
+                        ]
+                      )
+      element = Blueprint().addCachedElements(define, cache_path).topLevelElements()[0]
+      self.assertEqual(len(calls), 1)
+      self.assertIs(element.logger, logger)
+      self.assertEqual((element.args['sizes'], element.args['options']), ([1, 2], {'x':None}))
+    finally:
+      shutil.rmtree(directory)
+  def test_addCachedElements_does_not_cache_non_JSON_arguments(self):
+    directory = tempfile.mkdtemp()
+    try:
+      cache_path = os.path.join(directory, 'cache')
+      def define(b):
+        b.addElements('root', TestComponent, size=(1, 2))
+      logger = logging.getLogger('assemblage-Blueprint-tests.cache')
+      with self.assertLogs(logger, logging.WARNING):
+        Blueprint().setLogger(logger).addCachedElements(define, cache_path)
+      self.assertFalse(os.path.exists(cache_path))
+    finally:
+      shutil.rmtree(directory)
+  def test_addCachedElements_does_not_use_cache_if_kind_source_changed(self):
+    directory = tempfile.mkdtemp()
+    sys.path.insert(0, directory)
+    try:
+      module_name = 'assemblage_blueprint_tests_kinds'
+      module_path = os.path.join(directory, module_name + '.py')
+      with open(module_path, 'w') as f:
+        f.write('class Kind:\n  pass\n')
+      module = __import__(module_name)
+      cache_path = os.path.join(directory, 'cache')
+      calls = []
+      def define(b):
+        calls.append(b)
+        b.addElements('element', module.Kind)
+      Blueprint().addCachedElements(define, cache_path)
+      Blueprint().addCachedElements(define, cache_path)
+      self.assertEqual(len(calls), 1)
+      with open(module_path, 'a') as f:
+        f.write('# changed\n')
+      Blueprint().addCachedElements(define, cache_path)
+      self.assertEqual(len(calls), 2)
+    finally:
+      sys.path.remove(directory)
+      sys.modules.pop('assemblage_blueprint_tests_kinds', None)
+      shutil.rmtree(directory)
+  def test_addCachedElements_does_not_cache_non_class_kinds(self):
+    directory = tempfile.mkdtemp()
+    try:
+      cache_path = os.path.join(directory, 'cache')
+      calls = []
+      def define(b):
+        calls.append(b)
+        b.addElements('object', TestComponent('object', elements=[], logger=None))
+      logger = logging.getLogger('assemblage-Blueprint-tests.cache')
+      with self.assertLogs(logger, logging.WARNING):
+        Blueprint().setLogger(logger).addCachedElements(define, cache_path)
+      self.assertFalse(os.path.exists(cache_path))
+      with self.assertLogs(logger, logging.WARNING):
+        Blueprint().setLogger(logger).addCachedElements(define, cache_path)
+      self.assertEqual(len(calls), 2)
+    finally:
+      shutil.rmtree(directory)
 
 if __name__ == '__main__':
   unittest.main()
@@ -20,7 +20,9 @@ project_root_dir = os.path.dirname(
 if project_root_dir not in sys.path:
   sys.path.insert(0, project_root_dir)
 from dibase.assemblage.component import Component
-from dibase.assemblage.interfaces import AssemblageBase, DigestCacheBase
+from dibase.assemblage.digestcache import DigestCache
+from dibase.assemblage.statcache import StatCache
+from dibase.assemblage.interfaces import AssemblageBase, DigestCacheBase, DigestStoreBase
 import inspect
 
 class AlwaysDoAllComponent(Component):
@@ -73,6 +75,32 @@ class SpoofResolutionPlan:
 
 testAttributes = {'__logger__' : None, '__store__' : SpoofDigestCache(), '__resolution_plan__' : SpoofResolutionPlan()}
 
+class SpoofDigestStore(DigestStoreBase):
+  def __init__(self):
+    self.store = {}
+  def retrieveDigest(self, recordName):
+    return self.store.get(recordName)
+  def update(self, nameDigestPairs):
+    for nd in nameDigestPairs:
+      self.store[nd[0]] = nd[1]
+
+class DigestedComponent(AlwaysDoAllComponent):
+  def __init__(self,name,attr,elements=[],logger=None):
+    self.the_digest = b'digest'
+    super().__init__(name,attr,elements,logger)
+  def doesNotExist(self):
+    return False
+  def digest(self):
+    return self.the_digest
+
+def compositeDigestAttributes():
+  return  { '__logger__' : None
+          , '__store__' : DigestCache(SpoofDigestStore())
+          , '__resolution_plan__' : SpoofResolutionPlan()
+          , '__stat_cache__' : StatCache()
+          , '__composite_digests__' : True
+          }
+
 class TestAssemblageComponent(unittest.TestCase):
 #  log_level = logging.INFO 
   log_level = logging.DEBUG
@@ -214,6 +242,20 @@ class TestAssemblageComponent(unittest.TestCase):
     self.assertTrue(dstr>=c)
     self.assertFalse(cstr>=d)
     self.assertFalse(c>=dstr)
+  def test_component_hash_equals_hash_of_name(self):
+    c = Component('CCC', testAttributes)
+    self.assertEqual(hash(c), hash('CCC'))
+    self.assertIn('CCC', {c})
+    self.assertIn(c, {'CCC'})
+  def test_component_name_is_interned(self):
+    name = ''.join(['C','C','C'])
+    c = Component(name, testAttributes)
+    self.assertIs(str(c), sys.intern('CCC'))
+  def test_components_sort_by_name(self):
+    b = Component('b', testAttributes)
+    a = Component('a', testAttributes)
+    c = Component('c', testAttributes)
+    self.assertEqual([str(e) for e in sorted([b,c,a])], ['a','b','c'])
   def test_Component_logs_to_logger_passed_in_construction(self):
     self.logger.setLevel(logging.DEBUG)
     with self.assertLogs(self.logger,logging.DEBUG):
@@ -509,6 +551,66 @@ class TestAssemblageComponent(unittest.TestCase):
     c.apply('someAction')
     self.assertFalse(c.queryBeforeElementsActionsDone())
     self.assertTrue(c.queryAfterElementsActionsDone())
+  def test_compositeDigest_changes_if_sub_element_digest_changes(self):
+    child = DigestedComponent('child', {})
+    root = DigestedComponent('root', {}, elements=[child])
+    before = root.compositeDigest()
+    self.assertEqual(root.compositeDigest(), before)
+    child.the_digest = b'changed'
+    self.assertNotEqual(root.compositeDigest(), before)
+  def test_compositeDigest_cached_per_apply_apart_from_StatCache(self):
+    attrs = compositeDigestAttributes()
+    child = DigestedComponent('child', attrs)
+    root = DigestedComponent('root', attrs, elements=[child])
+    before = root.compositeDigest()
+    child.the_digest = b'changed'
+    self.assertEqual(root.compositeDigest(), before)
+    self.assertEqual(attrs['__composite_digest_values__'][id(root)], (root, before))
+    attrs['__stat_cache__'].clear()
+    self.assertEqual(root.compositeDigest(), before)
+    child.invalidateCachedStatus()
+    root.invalidateCachedStatus()
+    self.assertNotEqual(root.compositeDigest(), before)
+    values = attrs['__composite_digest_values__']
+    root.apply('someAction')
+    self.assertIsNot(attrs['__composite_digest_values__'], values)
+  def test_compositeDigest_is_None_if_sub_element_does_not_support_composite_digests(self):
+    class NoComposite:
+      pass
+    self.assertIsNone(Component('root', {}, elements=[NoComposite()]).compositeDigest())
+  def test_apply_skips_element_with_unchanged_composite_digest(self):
+    attrs = compositeDigestAttributes()
+    child = DigestedComponent('child', attrs)
+    root = DigestedComponent('root', attrs, elements=[child])
+    root.apply('someAction')
+    self.assertTrue(root.after)
+    self.assertIsNone(root.queryCacheStatus())
+    attrs['__store__'].writeBack()
+    root.after = False
+    child.after = False
+    root.apply('someAction')
+    self.assertFalse(root.after)
+    self.assertFalse(child.after)
+    self.assertFalse(root.queryAfterElementsActionsDone())
+    self.assertEqual(root.queryCacheStatus(), 'unchanged')
+  def test_apply_does_not_skip_element_with_changed_composite_digest(self):
+    attrs = compositeDigestAttributes()
+    child = DigestedComponent('child', attrs)
+    root = DigestedComponent('root', attrs, elements=[child])
+    root.apply('someAction')
+    attrs['__store__'].writeBack()
+    root.after = False
+    child.the_digest = b'changed'
+    root.apply('someAction')
+    self.assertTrue(root.after)
+  def test_apply_does_not_skip_element_if_composite_digest_recorded_for_different_action(self):
+    attrs = compositeDigestAttributes()
+    child = DigestedComponent('child', attrs)
+    root = DigestedComponent('root', attrs, elements=[child])
+    root.apply('otherAction')
+    attrs['__store__'].writeBack()
+    root.apply('someAction')
+    self.assertTrue(root.after)
     
 if __name__ == '__main__':
   unittest.main()
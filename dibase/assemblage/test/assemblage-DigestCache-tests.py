@@ -43,6 +43,13 @@ class SpoofElement:
   def digest(self):
     return self.the_digest
 
+class SpoofCompositeElement(SpoofElement):
+  def __init__(self, name, composite_digest):
+    super().__init__(name, None)
+    self.composite_digest = composite_digest
+  def compositeDigest(self):
+    return self.composite_digest
+
 class TestAssemblageDigestCache(unittest.TestCase):
   def test_updateIfDifferent_True_for_new_element(self):
     self.assertTrue(DigestCache(SpoofDigestStore()).updateIfDifferent(SpoofElement(name="new",digest="digest-new")))
@@ -137,6 +144,194 @@ class TestAssemblageDigestCache(unittest.TestCase):
     for c in changed:
       self.assertFalse(dc.updateIfDifferent(c))
       self.assertEqual(ds.store[str(c)],c.digest())
+  def test_compositeDigestMatches_False_if_none_recorded(self):
+    dc = DigestCache(SpoofDigestStore())
+    self.assertFalse(dc.compositeDigestMatches(SpoofCompositeElement('e', b'c'), 'build'))
+  def test_compositeDigestMatches_True_after_updateCompositeDigest_with_same_digest(self):
+    dc = DigestCache(SpoofDigestStore())
+    e = SpoofCompositeElement('e', b'c')
+    dc.updateCompositeDigest(e, 'build')
+    self.assertTrue(dc.compositeDigestMatches(e, 'build'))
+    self.assertFalse(dc.compositeDigestMatches(e, 'clean'))
+    e.composite_digest = b'changed'
+    self.assertFalse(dc.compositeDigestMatches(e, 'build'))
+  def test_composite_digests_are_written_back_under_composite_keys(self):
+    ds = SpoofDigestStore()
+    dc = DigestCache(ds)
+    e = SpoofCompositeElement('e', b'c')
+    dc.updateCompositeDigest(e, 'build')
+    dc.writeBack()
+    self.assertNotIn('e', ds.store)
+    self.assertEqual(ds.store[DigestCache.compositeKey(e, 'build')], b'c')
+    self.assertTrue(DigestCache(ds).compositeDigestMatches(e, 'build'))
+  def test_None_composite_digest_is_not_recorded_and_never_matches(self):
+    ds = SpoofDigestStore()
+    dc = DigestCache(ds)
+    e = SpoofCompositeElement('e', None)
+    dc.updateCompositeDigest(e, 'build')
+    dc.writeBack()
+    self.assertEqual(ds.store, {})
+    self.assertFalse(dc.compositeDigestMatches(e, 'build'))
+  def test_statistics_count_hits_and_misses(self):
+    dc = DigestCache(SpoofDigestStore())
+    e = SpoofElement(name="e",digest="d")
+    dc.updateIfDifferent(e)
+    dc.updateIfDifferent(e)
+    dc.updateIfDifferent(e)
+    stats = dc.statistics()
+    self.assertEqual(stats['misses'], 1)
+    self.assertEqual(stats['hits'], 2)
+    self.assertEqual(stats['evictions'], 0)
+    self.assertEqual(stats['entries'], 1)
+    self.assertIsNone(stats['capacity'])
+  def test_bounded_cache_evicts_least_recently_used_clean_entries(self):
+    ds = SpoofDigestStore()
+    for n in ('a','b','c'):
+      ds.store[n] = 'digest-'+n
+    dc = DigestCache(ds, capacity=2)
+    a = SpoofElement(name='a',digest='digest-a')
+    b = SpoofElement(name='b',digest='digest-b')
+    c = SpoofElement(name='c',digest='digest-c')
+    dc.updateIfDifferent(a)
+    dc.updateIfDifferent(b)
+    dc.updateIfDifferent(a)
+    dc.updateIfDifferent(c)
+    stats = dc.statistics()
+    self.assertEqual(stats['evictions'], 1)
+    self.assertEqual(stats['entries'], 2)
+    dc.updateIfDifferent(a)
+    self.assertEqual(dc.statistics()['misses'], 3) # b evicted, a still cached
+    dc.updateIfDifferent(b)
+    self.assertEqual(dc.statistics()['misses'], 4)
+  def test_bounded_cache_does_not_evict_dirty_entries_before_writeBack(self):
+    ds = SpoofDigestStore()
+    dc = DigestCache(ds, capacity=1)
+    new = [SpoofElement(name=n,digest='digest-'+n) for n in ('a','b','c')]
+    for e in new:
+      self.assertTrue(dc.updateIfDifferent(e))
+    self.assertEqual(dc.statistics()['entries'], 3)
+    self.assertEqual(dc.statistics()['evictions'], 0)
+    dc.writeBack()
+    for e in new:
+      self.assertEqual(ds.store[str(e)], e.digest())
+    self.assertEqual(dc.statistics()['entries'], 1)
+    self.assertEqual(dc.statistics()['evictions'], 2)
+    for e in new:
+      self.assertFalse(dc.updateIfDifferent(e))
+  def test_bounded_cache_over_capacity_with_dirty_entries_evicts_clean_entries_in_use_order(self):
+    ds = SpoofDigestStore()
+    for n in ('stale','recent'):
+      ds.store[n] = 'digest-'+n
+    dc = DigestCache(ds, capacity=2)
+    stale = SpoofElement(name='stale',digest='digest-stale')
+    recent = SpoofElement(name='recent',digest='digest-recent')
+    dc.updateIfDifferent(stale)
+    dc.updateIfDifferent(recent)
+    dc.updateIfDifferent(SpoofElement(name='new1',digest='digest-new1'))
+    self.assertEqual(dc.statistics()['evictions'], 1)
+    dc.updateIfDifferent(recent)
+    self.assertEqual(dc.statistics()['misses'], 3) # stale evicted, recent still cached
+    for i in range(1000):
+      dc.updateIfDifferent(SpoofElement(name='more%d'%i,digest='digest'))
+    self.assertEqual(dc.statistics()['evictions'], 2)
+    self.assertEqual(dc.statistics()['entries'], 1001)
+    dc.writeBack()
+    self.assertEqual(dc.statistics()['entries'], 2)
+  def test_compact_cache_writes_back_new_and_changed_digests(self):
+    ds = SpoofDigestStore()
+    ds.store['existing'] = b'0123456789abcdef'
+    dc = DigestCache(ds, compact=True)
+    changed = SpoofElement(name='existing',digest=b'fedcba9876543210')
+    new = SpoofElement(name='new',digest=b'new digest')
+    self.assertTrue(dc.updateIfDifferent(changed))
+    self.assertTrue(dc.updateIfDifferent(new))
+    dc.writeBack()
+    self.assertEqual(ds.store['existing'], b'fedcba9876543210')
+    self.assertEqual(ds.store['new'], b'new digest')
+    self.assertFalse(dc.updateIfDifferent(changed))
+    self.assertFalse(dc.updateIfDifferent(new))
+  def test_bounded_compact_cache_evicts_clean_entries(self):
+    ds = SpoofDigestStore()
+    dc = DigestCache(ds, capacity=1, compact=True)
+    for n in ('a','b','c'):
+      dc.updateIfDifferent(SpoofElement(name=n,digest=n.encode()))
+    dc.writeBack()
+    self.assertEqual(dc.statistics()['entries'], 1)
+    self.assertEqual(dc.statistics()['evictions'], 2)
+    self.assertEqual(ds.store, {'a':b'a', 'b':b'b', 'c':b'c'})
+  def test_detachDirty_returns_dirty_digests_of_keys_and_marks_them_clean(self):
+    ds = SpoofDigestStore()
+    ds.store['clean'] = b'clean'
+    dc = DigestCache(ds)
+    for n in ['clean', 'a', 'b']:
+      dc.updateIfDifferent(SpoofElement(name=n,digest=n.encode()))
+    self.assertEqual(dc.detachDirty(['clean', 'a', 'unknown']), [('a', b'a')])
+    self.assertFalse(dc.updateIfDifferent(SpoofElement(name='a',digest=b'a')))
+    dc.writeBack()
+    self.assertEqual(ds.store, {'clean':b'clean', 'b':b'b'})
+  def test_updateStore_writes_detached_digests(self):
+    ds = SpoofDigestStore()
+    dc = DigestCache(ds)
+    dc.updateIfDifferent(SpoofElement(name='a',digest=b'a'))
+    dc.updateStore(dc.detachDirty(['a']))
+    self.assertEqual(ds.store, {'a':b'a'})
+  def test_markDirty_makes_detached_digests_dirty_again(self):
+    ds = SpoofDigestStore()
+    dc = DigestCache(ds)
+    dc.updateIfDifferent(SpoofElement(name='a',digest=b'a'))
+    dc.markDirty(dc.detachDirty(['a']))
+    self.assertTrue(dc.updateIfDifferent(SpoofElement(name='a',digest=b'a')))
+    dc.writeBack()
+    self.assertEqual(ds.store, {'a':b'a'})
+  def test_markDirty_leaves_digests_updated_since_detached(self):
+    ds = SpoofDigestStore()
+    dc = DigestCache(ds)
+    dc.updateIfDifferent(SpoofElement(name='a',digest=b'a'))
+    detached = dc.detachDirty(['a'])
+    dc.updateIfDifferent(SpoofElement(name='a',digest=b'newer'))
+    dc.markDirty(detached)
+    dc.writeBack()
+    self.assertEqual(ds.store, {'a':b'newer'})
+  def test_preload_caches_stored_digests_as_clean(self):
+    ds = SpoofDigestStore()
+    ds.store['a'] = b'a'
+    dc = DigestCache(ds)
+    dc.preload(['a', 'new'])
+    self.assertEqual(dc.statistics()['entries'], 1)
+    del ds.store['a']
+    self.assertFalse(dc.updateIfDifferent(SpoofElement(name='a',digest=b'a')))
+    self.assertEqual(dc.statistics()['hits'], 1)
+  def test_preload_uses_store_retrieveDigests_if_provided(self):
+    class BulkDigestStore(SpoofDigestStore):
+      def __init__(self):
+        super().__init__()
+        self.bulk_calls = []
+      def retrieveDigests(self, recordNames):
+        self.bulk_calls.append(list(recordNames))
+        return dict((n, self.retrieveDigest(n)) for n in recordNames)
+    ds = BulkDigestStore()
+    ds.store['a'] = b'a'
+    ds.store['b'] = b'b'
+    dc = DigestCache(ds)
+    self.assertTrue(dc.supportsPreload())
+    self.assertFalse(DigestCache(SpoofDigestStore()).supportsPreload())
+    dc.updateIfDifferent(SpoofElement(name='a',digest=b'a'))
+    dc.preload(['a', 'b'])
+    self.assertEqual(ds.bulk_calls, [['b']])
+  def test_preloaded_keys_without_stored_digests_not_looked_up_again(self):
+    class NoteLookups(SpoofDigestStore):
+      def __init__(self):
+        super().__init__()
+        self.lookups = []
+      def retrieveDigest(self, recordName):
+        self.lookups.append(recordName)
+        return super().retrieveDigest(recordName)
+    ds = NoteLookups()
+    dc = DigestCache(ds)
+    dc.preload(['new'])
+    self.assertEqual(ds.lookups, ['new'])
+    self.assertTrue(dc.updateIfDifferent(SpoofElement(name='new',digest=b'n')))
+    self.assertEqual(ds.lookups, ['new'])
 
 if __name__ == '__main__':
   unittest.main()
@@ -0,0 +1,100 @@
+#! /usr/bin/python3
+# v3.4+
+"""
+Tests for dibase.assemblage.digestrecords.DigestRecords and
+CompactDigestRecords
+"""
+import unittest
+
+import os,sys
+project_root_dir = os.path.dirname(
+                    os.path.dirname(
+                      os.path.dirname(
+                        os.path.dirname( os.path.realpath(__file__)
+                        )    # this directory 
+                      )      # assemblage directory 
+                    )        # dibase directory 
+                  )          # project directory
+if project_root_dir not in sys.path:
+  sys.path.insert(0, project_root_dir)
+from dibase.assemblage.digestrecords import DigestRecords, CompactDigestRecords
+
+class TestAssemblageDigestRecords(unittest.TestCase):
+  def all_kinds(self, ordered=False):
+    return [DigestRecords(ordered), CompactDigestRecords(ordered, digestSize=16)]
+  def test_get_returns_None_for_unknown_key(self):
+    for r in self.all_kinds():
+      self.assertIsNone(r.get('nosuchkey'))
+      self.assertNotIn('nosuchkey', r)
+      self.assertEqual(len(r), 0)
+  def test_get_returns_set_digest_and_dirty_state(self):
+    for r in self.all_kinds():
+      r.set('a', b'0123456789abcdef', dirty=True)
+      r.set('b', b'short', dirty=False)
+      r.set('c', 'not bytes', dirty=False)
+      r.set('d', b'longer than sixteen bytes', dirty=True)
+      self.assertEqual(r.get('a'), (b'0123456789abcdef', True))
+      self.assertEqual(r.get('b'), (b'short', False))
+      self.assertEqual(r.get('c'), ('not bytes', False))
+      self.assertEqual(r.get('d'), (b'longer than sixteen bytes', True))
+      self.assertEqual(len(r), 4)
+  def test_set_replaces_existing_record(self):
+    for r in self.all_kinds():
+      r.set('a', b'first', dirty=True)
+      r.set('a', 'second', dirty=False)
+      r.set('a', b'third', dirty=False)
+      self.assertEqual(r.get('a'), (b'third', False))
+      self.assertEqual(len(r), 1)
+  def test_dirtyItems_returns_only_dirty_records_until_markClean(self):
+    for r in self.all_kinds():
+      for i in range(20):
+        r.set('k%d' % i, b'd%d' % i, dirty=(i % 3 == 0))
+      self.assertEqual( sorted(r.dirtyItems())
+                      , sorted([('k%d' % i, b'd%d' % i) for i in range(20) if i % 3 == 0])
+                      )
+      r.markClean()
+      self.assertEqual(r.dirtyItems(), [])
+      self.assertEqual(r.get('k0'), (b'd0', False))
+  def test_removed_records_are_gone_and_slots_reused(self):
+    for r in self.all_kinds():
+      r.set('a', b'a', dirty=True)
+      r.set('b', b'b', dirty=True)
+      r.remove('a')
+      self.assertIsNone(r.get('a'))
+      self.assertEqual(r.dirtyItems(), [('b', b'b')])
+      r.set('c', b'c', dirty=False)
+      self.assertEqual(r.get('c'), (b'c', False))
+      self.assertEqual(r.get('b'), (b'b', True))
+  def test_ordered_records_track_least_recently_used(self):
+    for r in self.all_kinds(ordered=True):
+      r.set('a', b'a', dirty=False)
+      r.set('b', b'b', dirty=False)
+      self.assertEqual(r.leastRecentlyUsedClean(), 'a')
+      r.touch('a')
+      self.assertEqual(r.leastRecentlyUsedClean(), 'b')
+  def test_ordered_records_keep_dirty_records_out_of_use_order(self):
+    for r in self.all_kinds(ordered=True):
+      r.set('d1', b'd1', dirty=True)
+      self.assertIsNone(r.leastRecentlyUsedClean())
+      r.set('a', b'a', dirty=False)
+      r.set('d2', b'd2', dirty=True)
+      r.set('b', b'b', dirty=False)
+      r.touch('d1')
+      self.assertEqual(r.leastRecentlyUsedClean(), 'a')
+      r.set('a', b'a2', dirty=True)
+      self.assertEqual(r.leastRecentlyUsedClean(), 'b')
+      r.markClean()
+      self.assertEqual(r.leastRecentlyUsedClean(), 'b')
+      r.remove('b')
+      self.assertIn(r.leastRecentlyUsedClean(), ('d1', 'd2', 'a'))
+      self.assertEqual(len(r), 3)
+  def test_unordered_records_have_no_least_recently_used(self):
+    for r in self.all_kinds():
+      r.set('a', b'a', dirty=False)
+      self.assertIsNone(r.leastRecentlyUsedClean())
+  def test_compact_records_reject_invalid_digest_size(self):
+    with self.assertRaises(ValueError):
+      CompactDigestRecords(digestSize=0)
+
+if __name__ == '__main__':
+  unittest.main()
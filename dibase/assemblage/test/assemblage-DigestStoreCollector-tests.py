@@ -0,0 +1,185 @@
+#! /usr/bin/python3
+# v3.4+
+"""
+Tests for dibase.assemblage.DigestStoreCollector
+"""
+import unittest
+import tempfile
+import shutil
+import subprocess
+
+import os,sys
+project_root_dir = os.path.dirname(
+                    os.path.dirname(
+                      os.path.dirname(
+                        os.path.dirname( os.path.realpath(__file__)
+                        )    # this directory
+                      )      # assemblage directory
+                    )        # dibase directory
+                  )          # project directory
+if project_root_dir not in sys.path:
+  sys.path.insert(0, project_root_dir)
+from dibase.assemblage.digeststorecollector import DigestStoreCollector
+from dibase.assemblage.digestcache import DigestCache
+from dibase.assemblage.shelfdigeststore import ShelfDigestStore
+from dibase.assemblage.journaldigeststore import JournalDigestStore
+from dibase.assemblage.mappeddigeststore import MappedDigestStore
+from dibase.assemblage.shardeddigeststore import ShardedDigestStore
+
+stress_worker_script = """
+import sys
+sys.path.insert(0, sys.argv[1])
+from dibase.assemblage.digeststorecollector import DigestStoreCollector
+class Element:
+  def __init__(self, name):
+    self.name = name
+  def __str__(self):
+    return self.name
+process, count = int(sys.argv[3]), int(sys.argv[4])
+for i in range(count):
+  DigestStoreCollector(None, sys.argv[2]).recordApply([Element('p%d-%d' % (process, i))], 'build')
+"""
+
+class SpoofElement:
+  def __init__(self, name, elements=[]):
+    self.name = name
+    self.subelements = elements
+  def __str__(self):
+    return self.name
+  def elements(self):
+    return self.subelements
+
+def composite(name, action='build'):
+  return DigestCache.compositeKey(name, action)
+
+class TestAssemblageDigestStoreCollector(unittest.TestCase):
+  def setUp(self):
+    self.dir = tempfile.mkdtemp()
+    self.ages_path = os.path.join(self.dir, 'ages')
+  def tearDown(self):
+    shutil.rmtree(self.dir)
+  def collector(self, store, **kwargs):
+    return DigestStoreCollector(store, self.ages_path, **kwargs)
+  def journal_store(self):
+    store = JournalDigestStore(os.path.join(self.dir, 'journal'), sync=False)
+    store.update([ ('a',b'a'), ('b',b'b'), ('old',b'old')
+                 , (composite('b'),b'cb'), (composite('old'),b'co')
+                 , (composite('b','clean'),b'cc')
+                 ])
+    return store
+  def test_collect_without_recorded_applies_raises_RuntimeError(self):
+    with self.assertRaises(RuntimeError):
+      self.collector(self.journal_store()).collect()
+  def test_collect_removes_records_of_elements_not_in_last_apply(self):
+    store = self.journal_store()
+    collector = self.collector(store)
+    collector.recordApply([SpoofElement('b', [SpoofElement('a')])], 'build')
+    report = collector.collect()
+    self.assertEqual(report['removed'], 3)
+    self.assertEqual(sorted(store.names()), sorted(['a', 'b', composite('b')]))
+  def test_collect_keeps_records_seen_within_max_age(self):
+    store = self.journal_store()
+    collector = self.collector(store, maxAge=1)
+    collector.recordApply([SpoofElement('old')], 'clean')
+    collector.recordApply([SpoofElement('b', [SpoofElement('a')])], 'build')
+    collector.collect()
+    self.assertEqual( sorted(store.names())
+                    , sorted(['a', 'b', 'old', composite('b'), composite('old'), composite('b','clean')])
+                    )
+    collector.recordApply([SpoofElement('b', [SpoofElement('a')])], 'build')
+    collector.collect()
+    self.assertEqual(sorted(store.names()), sorted(['a', 'b', composite('b')]))
+  def test_dry_run_collect_removes_nothing(self):
+    store = self.journal_store()
+    collector = self.collector(store)
+    collector.recordApply([SpoofElement('a')], 'build')
+    self.assertEqual(collector.collect(dryRun=True)['removed'], 5)
+    self.assertEqual(len(store.names()), 6)
+  def test_applies_recorded_by_one_collector_seen_by_another(self):
+    store = self.journal_store()
+    self.collector(store).recordApply([SpoofElement('a')], 'build')
+    collector = self.collector(store)
+    self.assertEqual(collector.generation(), 1)
+    self.assertTrue(collector.isLive('a'))
+    self.assertFalse(collector.isLive('b'))
+  def test_applies_recorded_by_interleaved_collectors_are_merged(self):
+    store = self.journal_store()
+    first = self.collector(store, maxAge=1)
+    second = self.collector(store)
+    first.recordApply([SpoofElement('a')], 'build')
+    second.recordApply([SpoofElement('b')], 'build')
+    first.recordApply([SpoofElement('a')], 'build')
+    self.assertEqual(first.generation(), 3)
+    self.assertTrue(first.isLive('b'))
+    first.collect()
+    self.assertEqual(sorted(store.names()), sorted(['a', 'b', composite('b')]))
+  def test_concurrent_applies_by_several_processes_are_all_recorded(self):
+    processes, count = 4, 10
+    workers = [ subprocess.Popen([ sys.executable, '-c', stress_worker_script
+                                 , project_root_dir, self.ages_path, str(p), str(count)
+                                 ])
+                for p in range(processes)
+              ]
+    for worker in workers:
+      self.assertEqual(worker.wait(), 0)
+    collector = self.collector(None, maxAge=processes * count)
+    self.assertEqual(collector.generation(), processes * count)
+    for p in range(processes):
+      for i in range(count):
+        self.assertTrue(collector.isLive('p%d-%d' % (p, i)))
+  def test_collectEvery_collects_when_due(self):
+    store = self.journal_store()
+    collector = self.collector(store, collectEvery=2)
+    collector.recordApply([SpoofElement('a')], 'build')
+    self.assertEqual(len(store.names()), 6)
+    collector.recordApply([SpoofElement('a')], 'build')
+    self.assertEqual(store.names(), ['a'])
+  def test_collect_from_shelf_store_removes_and_compacts(self):
+    store = ShelfDigestStore(os.path.join(self.dir, 'shelf'))
+    store.update([('n%d' % i, b'x'*64) for i in range(200)])
+    collector = self.collector(store)
+    collector.recordApply([SpoofElement('n0')], 'build')
+    report = collector.collect()
+    self.assertEqual(report['removed'], 199)
+    self.assertEqual(store.names(), ['n0'])
+    self.assertEqual(store.retrieveDigest('n0'), b'x'*64)
+    self.assertLess(report['sizeAfter'], report['size'])
+  def test_collect_from_mapped_store_retains_live_records(self):
+    store = MappedDigestStore(os.path.join(self.dir, 'mapped'))
+    try:
+      store.update([('a',b'a'), ('b',b'b'), (composite('a'),b'ca'), (composite('b'),b'cb')])
+      collector = self.collector(store)
+      collector.recordApply([SpoofElement('a')], 'build')
+      self.assertEqual(collector.collect()['removed'], 2)
+      self.assertEqual(store.retrieveDigest('a'), b'a')
+      self.assertEqual(store.retrieveDigest(composite('a')), b'ca')
+      self.assertIsNone(store.retrieveDigest('b'))
+      self.assertEqual(len(store), 2)
+    finally:
+      store.close()
+  def test_collect_from_sharded_mapped_store_retains_live_records(self):
+    store = ShardedDigestStore.create(MappedDigestStore, os.path.join(self.dir, 'mapped'), shardCount=3)
+    try:
+      store.update([('a',b'a'), ('b',b'b'), (composite('a'),b'ca'), (composite('b'),b'cb')])
+      collector = self.collector(store)
+      collector.recordApply([SpoofElement('a')], 'build')
+      self.assertEqual(collector.collect()['removed'], 2)
+      self.assertEqual(store.retrieveDigest(composite('a')), b'ca')
+      self.assertIsNone(store.retrieveDigest('b'))
+    finally:
+      store.close()
+  def test_report_gives_entries_and_ages(self):
+    store = self.journal_store()
+    collector = self.collector(store)
+    collector.recordApply([SpoofElement('old')], 'clean')
+    collector.recordApply([SpoofElement('a')], 'build')
+    report = collector.report()
+    self.assertEqual(report['generation'], 2)
+    self.assertEqual(report['entries'], 6)
+    self.assertEqual(report['ages'], {0:1, 1:1})
+    self.assertEqual(report['actions'], {'build':0, 'clean':1})
+    self.assertGreater(report['size'], 0)
+    self.assertIn("Applies recorded: 2", DigestStoreCollector.formatReport(report))
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,98 @@
+#! /usr/bin/python3
+# v3.4+
+"""
+Tests for dibase.assemblage.DirectoryScan
+"""
+import unittest
+import tempfile
+import shutil
+
+import os,sys
+project_root_dir = os.path.dirname(
+                    os.path.dirname(
+                      os.path.dirname(
+                        os.path.dirname( os.path.realpath(__file__)
+                        )    # this directory
+                      )      # assemblage directory
+                    )        # dibase directory
+                  )          # project directory
+if project_root_dir not in sys.path:
+  sys.path.insert(0, project_root_dir)
+from dibase.assemblage.directoryscan import DirectoryScan
+from dibase.assemblage.blueprint import Blueprint
+
+class TestComponent:
+  def __init__(self, name, elements, logger, **kwargs):
+    self.name = name
+
+class TestAssemblageDirectoryScan(unittest.TestCase):
+  def setUp(self):
+    self.dir = tempfile.mkdtemp()
+    for path in ( 'top.csv', 'top.txt', '.hidden.csv'
+                , 'src/a.csv', 'src/b.txt', 'src/sub/c.csv', 'src/sub/deeper/d.csv'
+                , 'src/.git/e.csv', 'other/f.csv'
+                ):
+      self.make_file(path)
+  def tearDown(self):
+    shutil.rmtree(self.dir)
+  def make_file(self, path):
+    path = os.path.join(self.dir, path)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w') as f:
+      f.write(path)
+  def scan(self, pattern, **kwargs):
+    return DirectoryScan(self.dir + '/' + pattern, **kwargs)
+  def relative(self, names):
+    return [os.path.relpath(name, self.dir).replace(os.sep, '/') for name in names]
+  def test_pattern_without_recursion_matches_at_its_depth(self):
+    self.assertEqual(self.relative(self.scan('*.csv').names()), ['top.csv'])
+    self.assertEqual(self.relative(self.scan('src/*.csv').names()), ['src/a.csv'])
+    self.assertEqual(self.relative(self.scan('*/*.csv').names()), ['other/f.csv', 'src/a.csv'])
+    self.assertEqual(self.relative(self.scan('src/s?b/[bc].csv').names()), ['src/sub/c.csv'])
+  def test_double_star_matches_zero_or_more_directories(self):
+    self.assertEqual( self.relative(self.scan('src/**/*.csv').names())
+                    , ['src/a.csv', 'src/sub/c.csv', 'src/sub/deeper/d.csv']
+                    )
+    self.assertEqual( self.relative(self.scan('**/sub/*.csv').names())
+                    , ['src/sub/c.csv']
+                    )
+    self.assertEqual(len(self.scan('**').names()), 7)
+  def test_hidden_names_only_matched_if_requested(self):
+    self.assertEqual( self.relative(self.scan('**/*.csv', hidden=True).names())
+                    , [ '.hidden.csv', 'other/f.csv', 'src/.git/e.csv', 'src/a.csv'
+                      , 'src/sub/c.csv', 'src/sub/deeper/d.csv', 'top.csv'
+                      ]
+                    )
+  def test_threaded_scan_gives_same_names(self):
+    self.assertEqual( self.scan('**/*.csv', threads=4).names()
+                    , self.scan('**/*.csv').names()
+                    )
+  def test_cached_listings_used_for_unchanged_directories(self):
+    cache_path = os.path.join(self.dir, '.cache')
+    scan = self.scan('src/**/*.csv', cachePath=cache_path, racyWindow=0)
+    names = scan.names()
+    self.assertEqual(scan.statistics(), {'directories':3, 'listed':3, 'cached':0})
+    scan = self.scan('src/**/*.csv', cachePath=cache_path, racyWindow=0)
+    self.assertEqual(scan.names(), names)
+    self.assertEqual(scan.statistics(), {'directories':3, 'listed':0, 'cached':3})
+    self.make_file('src/sub/new.csv')
+    os.utime(os.path.join(self.dir, 'src/sub'), ns=(0, 0))
+    self.assertEqual( self.relative(scan.names())
+                    , ['src/a.csv', 'src/sub/c.csv', 'src/sub/deeper/d.csv', 'src/sub/new.csv']
+                    )
+    self.assertEqual(scan.statistics(), {'directories':3, 'listed':1, 'cached':2})
+  def test_recently_modified_directories_are_not_cached(self):
+    cache_path = os.path.join(self.dir, '.cache')
+    self.scan('src/**/*.csv', cachePath=cache_path).names()
+    scan = self.scan('src/**/*.csv', cachePath=cache_path)
+    scan.names()
+    self.assertEqual(scan.statistics()['cached'], 0)
+  def test_scan_passed_to_Blueprint_addElements_names_files(self):
+    b = Blueprint()
+    b.addElements(Blueprint.scan(self.dir + '/src/**/*.csv'), TestComponent)
+    self.assertEqual( sorted(self.relative(e.name for e in b.topLevelElements()))
+                    , ['src/a.csv', 'src/sub/c.csv', 'src/sub/deeper/d.csv']
+                    )
+
+if __name__ == '__main__':
+  unittest.main()
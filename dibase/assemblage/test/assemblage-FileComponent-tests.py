@@ -19,6 +19,7 @@ project_root_dir = os.path.dirname(
 if project_root_dir not in sys.path:
   sys.path.insert(0, project_root_dir)
 from dibase.assemblage.filecomponent import FileComponent
+from dibase.assemblage.statcache import StatCache
 from dibase.assemblage.interfaces import AssemblageBase,DigestCacheBase
 
 class SpoofDigestCache(DigestCacheBase):
@@ -106,6 +107,73 @@ class TestAssemblageFileComponent(unittest.TestCase):
     except RuntimeError as e:
       print("\ntest_hasChanged_receives_RuntimeError_if_file_does_not_exist\n"
             "  INFORMATION: RuntimeError raised with message:\n     '%(e)s'" % {'e':e})
+  def test_doesNotExist_uses_cached_status_until_invalidated(self):
+    tf = tempfile.NamedTemporaryFile(delete=False)
+    tf.close()
+    fc = FileComponent(tf.name,{'__stat_cache__' : StatCache()})
+    self.assertFalse(fc.doesNotExist())
+    os.remove(fc.normalisedPath())
+    self.assertFalse(fc.doesNotExist())
+    fc.invalidateCachedStatus()
+    self.assertTrue(fc.doesNotExist())
+  def test_sibling_file_created_by_action_after_directory_listed_exists(self):
+    tf = tempfile.NamedTemporaryFile(delete=False)
+    tf.close()
+    attributes = {'__stat_cache__' : StatCache()}
+    fc = FileComponent(tf.name, attributes)
+    sibling = FileComponent(tf.name + '.map', attributes)
+    try:
+      self.assertFalse(fc.doesNotExist())
+      with open(fc.normalisedPath(), "w") as f: # action writing two files
+        f.write("test")
+      with open(sibling.normalisedPath(), "w") as f:
+        f.write("map")
+      fc.invalidateCachedStatus()
+      self.assertFalse(sibling.doesNotExist())
+    finally:
+      os.remove(fc.normalisedPath())
+      if os.path.exists(sibling.normalisedPath()):
+        os.remove(sibling.normalisedPath())
+  def test_digest_is_cached_until_invalidated(self):
+    tf = tempfile.NamedTemporaryFile(delete=False)
+    tf.close()
+    fc = FileComponent(tf.name,{'__stat_cache__' : StatCache()})
+    digest = fc.digest()
+    with open(fc.normalisedPath(), "w") as f:
+      f.write("test")
+    self.assertEqual(fc.digest(), digest)
+    fc.invalidateCachedStatus()
+    self.assertNotEqual(fc.digest(), digest)
+    os.remove(fc.normalisedPath())
+  def test_sampleDigest_None_if_sampling_not_enabled_or_file_small(self):
+    class SampledFileComponent(FileComponent):
+      sampleBlocks = 2
+      sampleBlockSize = 4
+    tf = tempfile.NamedTemporaryFile(delete=False)
+    tf.write(b'0123456789abcdef')
+    tf.close()
+    self.assertIsNone(FileComponent(tf.name,{}).sampleDigest(os.stat(tf.name)))
+    self.assertIsNone(SampledFileComponent(tf.name,{}).sampleDigest(os.stat(tf.name)))
+    os.remove(tf.name)
+  def test_sampleDigest_changes_only_for_changes_to_size_or_sampled_blocks(self):
+    class SampledFileComponent(FileComponent):
+      sampleBlocks = 2
+      sampleBlockSize = 4
+    tf = tempfile.NamedTemporaryFile(delete=False)
+    tf.close()
+    fc = SampledFileComponent(tf.name,{})
+    def sample(content):
+      with open(tf.name, 'wb') as f:
+        f.write(content)
+      return fc.sampleDigest(os.stat(tf.name))
+    # 4 byte blocks sampled at offsets 0, 7, 14 and 21 of 25 bytes
+    digest = sample(b'0123456789abcdefghijklmno')
+    self.assertEqual(sample(b'01234X6789abcdefghijklmno'), digest)
+    self.assertEqual(sample(b'0123456789abcdefghiXklmno'), digest)
+    self.assertNotEqual(sample(b'01234567X9abcdefghijklmno'), digest)
+    self.assertNotEqual(sample(b'0123456789abcdefghijklmnX'), digest)
+    self.assertNotEqual(sample(b'0123456789abcdefghijklmno!'), digest)
+    os.remove(tf.name)
 
 if __name__ == '__main__':
   unittest.main()
@@ -0,0 +1,63 @@
+#! /usr/bin/python3
+# v3.4+
+"""
+Tests for dibase.assemblage.FileLock
+"""
+import unittest
+import tempfile
+import shutil
+import threading
+import time
+
+import os,sys
+project_root_dir = os.path.dirname(
+                    os.path.dirname(
+                      os.path.dirname(
+                        os.path.dirname( os.path.realpath(__file__)
+                        )    # this directory
+                      )      # assemblage directory
+                    )        # dibase directory
+                  )          # project directory
+if project_root_dir not in sys.path:
+  sys.path.insert(0, project_root_dir)
+from dibase.assemblage import filelock
+from dibase.assemblage.filelock import FileLock
+
+@unittest.skipIf(filelock.fcntl is None, "file locking not supported")
+class TestAssemblageFileLock(unittest.TestCase):
+  def setUp(self):
+    self.dir = tempfile.mkdtemp()
+    self.lock = FileLock(os.path.join(self.dir, 'lock'))
+  def tearDown(self):
+    shutil.rmtree(self.dir)
+  def hold(self, holder, events, name):
+    with holder:
+      events.append(name + ' acquired')
+      time.sleep(0.05)
+      events.append(name + ' released')
+  def run_concurrently(self, first, second):
+    events = []
+    thread = threading.Thread(target=self.hold, args=(first, events, 'first'))
+    thread.start()
+    while not events:
+      time.sleep(0.001)
+    self.hold(second, events, 'second')
+    thread.join()
+    return events
+  def test_lock_file_created(self):
+    with self.lock.exclusive():
+      self.assertTrue(os.path.exists(self.lock.pathname))
+  def test_exclusive_holders_are_serialised(self):
+    events = self.run_concurrently(self.lock.exclusive(), self.lock.exclusive())
+    self.assertEqual(events, [ 'first acquired', 'first released'
+                             , 'second acquired', 'second released'
+                             ])
+  def test_exclusive_holder_waits_for_shared_holder(self):
+    events = self.run_concurrently(self.lock.shared(), self.lock.exclusive())
+    self.assertEqual(events.index('second acquired'), 2)
+  def test_shared_holders_hold_lock_together(self):
+    events = self.run_concurrently(self.lock.shared(), self.lock.shared())
+    self.assertEqual(events[1], 'second acquired')
+
+if __name__ == '__main__':
+  unittest.main()
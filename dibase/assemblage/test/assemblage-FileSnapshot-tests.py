@@ -0,0 +1,191 @@
+#! /usr/bin/python3
+# v3.4+
+"""
+Tests for dibase.assemblage.FileSnapshot
+"""
+import unittest
+import json
+import tempfile
+import shutil
+
+import os,sys
+project_root_dir = os.path.dirname(
+                    os.path.dirname(
+                      os.path.dirname(
+                        os.path.dirname( os.path.realpath(__file__)
+                        )    # this directory
+                      )      # assemblage directory
+                    )        # dibase directory
+                  )          # project directory
+if project_root_dir not in sys.path:
+  sys.path.insert(0, project_root_dir)
+from dibase.assemblage.filesnapshot import FileSnapshot
+from dibase.assemblage.filecomponent import FileComponent
+from dibase.assemblage.statcache import StatCache
+from dibase.assemblage.digestcache import DigestCache
+from dibase.assemblage.mappeddigeststore import MappedDigestStore
+
+class TestAssemblageFileSnapshot(unittest.TestCase):
+  def setUp(self):
+    self.dir = tempfile.mkdtemp()
+    self.snapshot_path = os.path.join(self.dir, 'snapshot')
+  def tearDown(self):
+    shutil.rmtree(self.dir)
+  def make_file(self, name, content=b'content', subdirectory=None):
+    directory = os.path.join(self.dir, subdirectory) if subdirectory else self.dir
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, name)
+    with open(path, 'wb') as f:
+      f.write(content)
+    return path
+  def snapshot(self):
+    return FileSnapshot(self.snapshot_path, racyWindow=0)
+  def component(self, path, snapshot, elements=[]):
+    return FileComponent( path
+                        , { '__logger__':None, '__file_snapshot__':snapshot
+                          , '__stat_cache__':StatCache()
+                          }
+                        , elements
+                        )
+  def saved_snapshot(self, entries):
+    snapshot = self.snapshot()
+    snapshot.verify()
+    for path, digest in entries:
+      snapshot.record(path, os.stat(path), digest)
+    snapshot.save()
+    return self.snapshot()
+  def test_verify_without_snapshot_file_finds_nothing(self):
+    snapshot = self.snapshot()
+    self.assertEqual(snapshot.verify(), set())
+    self.assertIsNone(snapshot.unchangedDigest(self.make_file('a')))
+  def test_saved_entries_for_unchanged_files_are_used_after_verify(self):
+    a = self.make_file('a')
+    b = self.make_file('b', subdirectory='sub')
+    snapshot = self.saved_snapshot([(a, b'da'), (b, b'db')])
+    self.assertIsNone(snapshot.unchangedDigest(a))
+    self.assertEqual(snapshot.verify(), set())
+    self.assertEqual(snapshot.unchangedDigest(a), b'da')
+    self.assertEqual(snapshot.unchangedDigest(b), b'db')
+  def test_changed_and_removed_files_are_in_changed_set(self):
+    a = self.make_file('a')
+    b = self.make_file('b')
+    c = self.make_file('c')
+    snapshot = self.saved_snapshot([(a, b'da'), (b, b'db'), (c, b'dc')])
+    self.make_file('a', b'changed content')
+    os.remove(b)
+    self.assertEqual(snapshot.verify(), set([a, b]))
+    self.assertEqual(snapshot.changedPaths(), set([a, b]))
+    self.assertIsNone(snapshot.unchangedDigest(a))
+    self.assertEqual(snapshot.unchangedDigest(c), b'dc')
+  def test_files_modified_within_racy_window_are_not_recorded(self):
+    a = self.make_file('a')
+    snapshot = FileSnapshot(self.snapshot_path, racyWindow=3600)
+    snapshot.verify()
+    snapshot.record(a, os.stat(a), b'da')
+    snapshot.save()
+    snapshot.verify()
+    self.assertIsNone(snapshot.unchangedDigest(a))
+  def test_invalidated_paths_are_not_saved(self):
+    a = self.make_file('a')
+    b = self.make_file('b')
+    snapshot = self.saved_snapshot([(a, b'da')])
+    snapshot.verify()
+    snapshot.record(b, os.stat(b), b'db')
+    snapshot.invalidate(a)
+    snapshot.invalidate(b)
+    self.assertIn(a, snapshot.changedPaths())
+    snapshot.save()
+    snapshot.verify()
+    self.assertIsNone(snapshot.unchangedDigest(a))
+    self.assertIsNone(snapshot.unchangedDigest(b))
+  def test_entries_not_used_or_recorded_during_apply_are_not_saved(self):
+    a = self.make_file('a')
+    b = self.make_file('b')
+    c = self.make_file('c')
+    snapshot = self.saved_snapshot([(a, b'da'), (b, b'db')])
+    snapshot.verify()
+    self.assertEqual(snapshot.unchangedDigest(a), b'da')
+    snapshot.record(c, os.stat(c), b'dc')
+    snapshot.save()
+    snapshot.verify()
+    self.assertEqual(snapshot.unchangedDigest(a), b'da')
+    self.assertIsNone(snapshot.unchangedDigest(b))
+    self.assertEqual(snapshot.unchangedDigest(c), b'dc')
+    with open(self.snapshot_path, encoding='utf-8') as f:
+      self.assertEqual(sorted(json.load(f)['entries']), [a, c])
+  def test_corrupt_snapshot_file_is_ignored(self):
+    with open(self.snapshot_path, 'w') as f:
+      f.write('{"entries": [')
+    self.assertEqual(self.snapshot().verify(), set())
+  def test_FileComponent_leaf_digest_recorded_then_taken_from_snapshot(self):
+    a = self.make_file('a')
+    snapshot = self.snapshot()
+    snapshot.verify()
+    digest = self.component(a, snapshot).digest()
+    snapshot.save()
+    stat_result = os.stat(a)
+    self.make_file('a', b'CONTENT')
+    os.utime(a, ns=(stat_result.st_atime_ns, stat_result.st_mtime_ns))
+    snapshot.verify()
+    self.assertEqual(self.component(a, snapshot).digest(), digest)
+  def test_FileComponent_with_elements_does_not_use_snapshot(self):
+    a = self.make_file('a')
+    b = self.make_file('b')
+    snapshot = self.snapshot()
+    snapshot.verify()
+    self.component(a, snapshot, [b]).digest()
+    snapshot.save()
+    snapshot.verify()
+    self.assertIsNone(snapshot.unchangedDigest(a))
+  def test_sampled_digest_used_for_definite_changes_full_digest_otherwise(self):
+    class SampledFileComponent(FileComponent):
+      sampleBlocks = 2
+      sampleBlockSize = 4
+    def sampled_digest(path):
+      component = SampledFileComponent(path, {})
+      return component.sampledDigest(component.sampleDigest(os.stat(path)))
+    a = self.make_file('a', b'0123456789abcdefghijklmno')
+    snapshot = self.snapshot()
+    snapshot.verify()
+    full_digest = SampledFileComponent(a, {'__file_snapshot__':snapshot}).digest()
+    self.assertNotEqual(full_digest, sampled_digest(a))
+    snapshot.save()
+    self.make_file('a', b'0123456789abcdefghijklmnX')
+    os.utime(a, ns=(10**9, 10**9))
+    snapshot.verify()
+    digest = SampledFileComponent(a, {'__file_snapshot__':snapshot}).digest()
+    self.assertEqual(digest, sampled_digest(a))
+    self.assertEqual(len(digest), len(full_digest))
+    snapshot.save()
+    snapshot.verify()
+    self.assertEqual(SampledFileComponent(a, {'__file_snapshot__':snapshot}).digest(), digest)
+    self.make_file('a', b'01234X6789abcdefghijklmnX')
+    os.utime(a, ns=(0, 0))
+    snapshot.verify()
+    digest = SampledFileComponent(a, {'__file_snapshot__':snapshot}).digest()
+    self.assertNotEqual(digest, sampled_digest(a))
+    self.assertNotEqual(digest, full_digest)
+  def test_sampled_digest_written_back_to_MappedDigestStore(self):
+    class SampledFileComponent(FileComponent):
+      sampleBlocks = 2
+      sampleBlockSize = 4
+    a = self.make_file('a', b'0123456789abcdefghijklmno')
+    snapshot = self.snapshot()
+    snapshot.verify()
+    SampledFileComponent(a, {'__file_snapshot__':snapshot}).digest()
+    snapshot.save()
+    self.make_file('a', b'0123456789abcdefghijklmnX')
+    os.utime(a, ns=(10**9, 10**9))
+    snapshot.verify()
+    store = MappedDigestStore(os.path.join(self.dir, 'mapped'))
+    try:
+      cache = DigestCache(store, compact=True)
+      component = SampledFileComponent(a, {'__file_snapshot__':snapshot})
+      self.assertTrue(cache.updateIfDifferent(component))
+      cache.writeBack()
+      self.assertEqual(store.retrieveDigest(a), component.digest())
+    finally:
+      store.close()
+
+if __name__ == '__main__':
+  unittest.main()
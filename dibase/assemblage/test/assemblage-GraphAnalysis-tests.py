@@ -0,0 +1,91 @@
+#! /usr/bin/python3
+# v3.4+
+"""
+Tests for dibase.assemblage.GraphAnalysis
+"""
+import unittest
+
+import os,sys
+project_root_dir = os.path.dirname(
+                    os.path.dirname(
+                      os.path.dirname(
+                        os.path.dirname( os.path.realpath(__file__)
+                        )    # this directory
+                      )      # assemblage directory
+                    )        # dibase directory
+                  )          # project directory
+if project_root_dir not in sys.path:
+  sys.path.insert(0, project_root_dir)
+from dibase.assemblage.graphanalysis import GraphAnalysis
+from dibase.assemblage.blueprint import Blueprint
+
+class TestComponent:
+  def __init__(self, name, elements, logger, **kwargs):
+    self.name = name
+    self.subelements = elements
+  def __str__(self):
+    return self.name
+  def elements(self):
+    return self.subelements
+
+def diamond_blueprint():
+  '''
+  exe -> a.o -> a.c
+             -> common.h
+      -> b.o -> b.c
+             -> common.h
+  doc
+  '''
+  b = Blueprint()
+  b.addElements('exe', TestComponent, elements=['a.o', 'b.o'])
+  b.addElements(['a.o', 'b.o'], TestComponent, elements=[['a.c', 'common.h'], ['b.c', 'common.h']])
+  b.addElements(['a.c', 'b.c', 'common.h', 'doc'], TestComponent)
+  return b
+
+class TestAssemblageGraphAnalysis(unittest.TestCase):
+  def test_counts_depth_widths_and_fans(self):
+    report = GraphAnalysis(diamond_blueprint()).report()
+    self.assertEqual(report['elements'], 7)
+    self.assertEqual(report['links'], 6)
+    self.assertEqual(report['roots'], 2)
+    self.assertEqual(report['leaves'], 4)
+    self.assertEqual(report['shared'], 1)
+    self.assertEqual(report['depth'], 3)
+    self.assertEqual(report['widths'], {0:2, 1:2, 2:3})
+    self.assertEqual(report['fanIn'], {0:2, 1:4, 2:1})
+    self.assertEqual(report['fanOut'], {0:4, 2:3})
+  def test_critical_path_without_durations_is_a_longest_path(self):
+    report = GraphAnalysis(diamond_blueprint()).report()
+    self.assertEqual(len(report['criticalPath']), 3)
+    self.assertEqual(report['criticalPath'][0], 'exe')
+    self.assertEqual(report['criticalPathDuration'], 3)
+  def test_critical_path_weighted_by_durations(self):
+    durations = {'exe':1.0, 'a.o':2.0, 'b.o':5.0, 'a.c':0.5, 'common.h':0.25, 'doc':6.0}
+    report = GraphAnalysis(diamond_blueprint(), durations).report()
+    self.assertEqual(report['criticalPath'], ['exe', 'b.o', 'common.h'])
+    self.assertEqual(report['criticalPathDuration'], 6.25)
+    durations['doc'] = 9.0
+    report = GraphAnalysis(diamond_blueprint(), durations).report()
+    self.assertEqual(report['criticalPath'], ['doc'])
+  def test_iterable_of_elements_and_deep_chains_analysed(self):
+    leaf = TestComponent('0', [], None)
+    element = leaf
+    for i in range(1, 5000):
+      element = TestComponent(str(i), [element], None)
+    report = GraphAnalysis([element, element]).report()
+    self.assertEqual(report['depth'], 5000)
+    self.assertEqual(report['roots'], 1)
+    self.assertEqual(len(report['widths']), 5000)
+  def test_cycles_raise_RuntimeError(self):
+    a = TestComponent('a', [], None)
+    b = TestComponent('b', [a], None)
+    a.subelements.append(b)
+    with self.assertRaises(RuntimeError):
+      GraphAnalysis([a])
+  def test_formatReport_gives_text_report(self):
+    text = GraphAnalysis.formatReport(GraphAnalysis(diamond_blueprint()).report())
+    self.assertIn("Elements: 7", text)
+    self.assertIn("Critical path (duration 3):", text)
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,86 @@
+#! /usr/bin/python3
+# v3.4+
+"""
+Tests for dibase.assemblage.GraphExport
+"""
+import unittest
+import json
+import io
+
+import os,sys
+project_root_dir = os.path.dirname(
+                    os.path.dirname(
+                      os.path.dirname(
+                        os.path.dirname( os.path.realpath(__file__)
+                        )    # this directory
+                      )      # assemblage directory
+                    )        # dibase directory
+                  )          # project directory
+if project_root_dir not in sys.path:
+  sys.path.insert(0, project_root_dir)
+from dibase.assemblage.graphexport import GraphExport
+from dibase.assemblage.blueprint import Blueprint
+
+class TestComponent:
+  def __init__(self, name, elements, logger, **kwargs):
+    self.name = name
+    self.subelements = elements
+  def __str__(self):
+    return self.name
+  def elements(self):
+    return self.subelements
+  def queryBeforeElementsActionsDone(self):
+    return False
+  def queryAfterElementsActionsDone(self):
+    return self.name.endswith('.o')
+  def queryCacheStatus(self):
+    return 'restored' if self.name == 'b.o' else None
+
+def blueprint():
+  b = Blueprint()
+  b.addElements('exe', TestComponent, elements=['a.o', 'b.o'])
+  b.addElements(['a.o', 'b.o'], TestComponent, elements=[['a.c', 'common.h'], ['b.c', 'common.h']])
+  b.addElements(['a.c', 'b.c', 'common.h'], TestComponent)
+  return b
+
+class TestAssemblageGraphExport(unittest.TestCase):
+  def test_nodes_numbered_once_in_breadth_first_order(self):
+    nodes = list(GraphExport(blueprint()).nodes())
+    self.assertEqual([n[2]['name'] for n in nodes], ['exe', 'a.o', 'b.o', 'a.c', 'common.h', 'b.c'])
+    self.assertEqual([n[0] for n in nodes], list(range(6)))
+    self.assertEqual(nodes[0][3], [1, 2])
+    self.assertEqual(nodes[2][3], [5, 4])
+  def test_writeJson_writes_nodes_with_annotations(self):
+    output = io.StringIO()
+    GraphExport(blueprint(), {'a.o':1.5}).writeJson(output)
+    nodes = json.loads(output.getvalue())['nodes']
+    self.assertEqual(len(nodes), 6)
+    self.assertEqual( nodes[1]
+                    , { 'id':1, 'elements':[3, 4], 'name':'a.o'
+                      , 'kind':TestComponent.__module__ + '.TestComponent'
+                      , 'duration':1.5, 'before':False, 'after':True, 'cache':None
+                      }
+                    )
+    self.assertEqual(nodes[2]['cache'], 'restored')
+    self.assertNotIn('duration', nodes[2])
+  def test_writeDot_writes_nodes_edges_and_overlays(self):
+    output = io.StringIO()
+    GraphExport(blueprint(), {'a.o':2.0, 'b.o':1.0}).writeDot(output)
+    dot = output.getvalue()
+    self.assertTrue(dot.startswith('digraph "assemblage" {\n'))
+    self.assertTrue(dot.endswith('}\n'))
+    self.assertIn('n0 -> n1;', dot)
+    self.assertIn('n2 -> n4;', dot)
+    self.assertEqual(dot.count('->'), 6)
+    self.assertIn('label="a.o\\n2.000s after"', dot)
+    self.assertIn('fillcolor="0.000 1.000 1.000"', dot)
+    self.assertIn('fillcolor="0.000 0.500 1.000"', dot)
+    self.assertIn('label="b.o\\n1.000s after restored"', dot)
+    self.assertIn('style="filled,dashed"', dot)
+  def test_writeDot_quotes_names(self):
+    output = io.StringIO()
+    GraphExport([TestComponent('say "hi"\\', [], None)]).writeDot(output)
+    self.assertIn('label="say \\"hi\\"\\\\"', output.getvalue())
+
+if __name__ == '__main__':
+  unittest.main()
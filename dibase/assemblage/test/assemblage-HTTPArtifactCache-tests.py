@@ -0,0 +1,139 @@
+#! /usr/bin/python3
+# v3.4+
+"""
+Tests for dibase.assemblage.httpartifactcache.HTTPArtifactCache and
+dibase.assemblage.artifactcacheserver.ArtifactCacheServer
+"""
+import unittest
+import tempfile
+import shutil
+import socket
+import socketserver
+import threading
+import hashlib
+
+import os,sys
+project_root_dir = os.path.dirname(
+                    os.path.dirname(
+                      os.path.dirname(
+                        os.path.dirname( os.path.realpath(__file__)
+                        )    # this directory 
+                      )      # assemblage directory 
+                    )        # dibase directory 
+                  )          # project directory
+if project_root_dir not in sys.path:
+  sys.path.insert(0, project_root_dir)
+from dibase.assemblage.httpartifactcache import HTTPArtifactCache
+from dibase.assemblage.artifactcacheserver import ArtifactCacheServer
+from dibase.assemblage.artifactcache import ArtifactCache, CompositeArtifactCache
+
+class TestAssemblageHTTPArtifactCache(unittest.TestCase):
+  @classmethod
+  def setUpClass(cls):
+    cls.server_dir = tempfile.mkdtemp()
+    cls.server = ArtifactCacheServer(cls.server_dir).start()
+  @classmethod
+  def tearDownClass(cls):
+    cls.server.stop()
+    shutil.rmtree(cls.server_dir)
+  def setUp(self):
+    self.key = hashlib.md5(self.id().encode()).hexdigest()
+    self.dir = tempfile.mkdtemp()
+    self.cache = HTTPArtifactCache(self.server.url())
+  def tearDown(self):
+    self.cache.close()
+    shutil.rmtree(self.dir)
+  def path(self, name):
+    return os.path.join(self.dir, name)
+  def write(self, name, content):
+    with open(self.path(name), 'w') as f:
+      f.write(content)
+    return self.path(name)
+  def read(self, name):
+    with open(self.path(name)) as f:
+      return f.read()
+  def test_restore_returns_False_for_unknown_key(self):
+    self.assertFalse(self.cache.restore(self.key, [self.path('out')]))
+    self.assertFalse(os.path.exists(self.path('out')))
+  def test_restore_restores_stored_files(self):
+    paths = [self.write('out1', 'one'), self.write('out2', 'two'*100000)]
+    self.assertTrue(self.cache.store(self.key, paths))
+    for p in paths:
+      os.remove(p)
+    self.assertTrue(self.cache.restore(self.key, paths))
+    self.assertEqual(self.read('out1'), 'one')
+    self.assertEqual(self.read('out2'), 'two'*100000)
+  def test_restore_returns_False_for_incomplete_entry(self):
+    self.cache.store(self.key, [self.write('out1', 'one')])
+    self.assertFalse(self.cache.restore(self.key, [self.path('out1'), self.path('out2')]))
+  def test_entries_shared_between_clients(self):
+    self.cache.store(self.key, [self.write('out', 'content')])
+    os.remove(self.path('out'))
+    other = HTTPArtifactCache(self.server.url(), maxWorkers=1)
+    try:
+      self.assertTrue(other.restore(self.key, [self.path('out')]))
+    finally:
+      other.close()
+    self.assertEqual(self.read('out'), 'content')
+  def test_connections_are_reused(self):
+    cache = HTTPArtifactCache(self.server.url(), maxWorkers=1)
+    try:
+      cache.store(self.key, [self.write('out', 'content')])
+      connection = cache._HTTPArtifactCache__connections[0]
+      for i in range(5):
+        self.assertTrue(cache.restore(self.key, [self.path('out')]))
+      self.assertEqual(cache._HTTPArtifactCache__connections, [connection])
+    finally:
+      cache.close()
+  def test_unreachable_server_is_a_cache_miss(self):
+    s = socket.socket()
+    s.bind(('localhost', 0))
+    port = s.getsockname()[1]
+    s.close()
+    cache = HTTPArtifactCache('http://localhost:%d' % port, timeout=1)
+    try:
+      self.assertFalse(cache.restore(self.key, [self.path('out')]))
+      self.assertFalse(cache.store(self.key, [self.write('out', 'content')]))
+    finally:
+      cache.close()
+  def test_malformed_server_response_is_a_cache_miss(self):
+    class MalformedHandler(socketserver.StreamRequestHandler):
+      def handle(self):
+        self.rfile.readline()
+        self.wfile.write(b'NOT HTTP\r\n\r\n')
+    server = socketserver.ThreadingTCPServer(('localhost', 0), MalformedHandler)
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever)
+    thread.start()
+    cache = HTTPArtifactCache('http://localhost:%d' % server.server_address[1], timeout=5)
+    try:
+      paths = [self.write('out1', 'one'), self.write('out2', 'two')]
+      self.assertFalse(cache.store(self.key, paths))
+      for p in paths:
+        os.remove(p)
+      self.assertFalse(cache.restore(self.key, paths))
+      self.assertEqual(os.listdir(self.dir), [])
+    finally:
+      cache.close()
+      server.shutdown()
+      server.server_close()
+      thread.join()
+  def test_composite_cache_fills_local_cache_from_remote_cache(self):
+    local = ArtifactCache(self.path('local'))
+    composite = CompositeArtifactCache(local, self.cache)
+    self.cache.store(self.key, [self.write('out', 'content')])
+    os.remove(self.path('out'))
+    self.assertFalse(local.contains(self.key))
+    self.assertTrue(composite.restore(self.key, [self.path('out')]))
+    self.assertTrue(local.contains(self.key))
+    self.assertEqual(self.read('out'), 'content')
+  def test_composite_cache_stores_in_all_caches(self):
+    local = ArtifactCache(self.path('local'))
+    composite = CompositeArtifactCache(local, self.cache)
+    self.assertTrue(composite.store(self.key, [self.write('out', 'content')]))
+    self.assertTrue(local.contains(self.key))
+    os.remove(self.path('out'))
+    self.assertTrue(self.cache.restore(self.key, [self.path('out')]))
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,177 @@
+#! /usr/bin/python3
+# v3.4+
+"""
+Tests for dibase.assemblage.IncrementalWriteBack
+"""
+import unittest
+
+import os,sys
+project_root_dir = os.path.dirname(
+                    os.path.dirname(
+                      os.path.dirname(
+                        os.path.dirname( os.path.realpath(__file__)
+                        )    # this directory
+                      )      # assemblage directory
+                    )        # dibase directory
+                  )          # project directory
+if project_root_dir not in sys.path:
+  sys.path.insert(0, project_root_dir)
+from dibase.assemblage.incrementalwriteback import IncrementalWriteBack
+from dibase.assemblage.digestcache import DigestCache
+from dibase.assemblage.component import Component
+from dibase.assemblage.statcache import StatCache
+from dibase.assemblage.interfaces import DigestStoreBase
+
+class SpoofDigestStore(DigestStoreBase):
+  def __init__(self, update_raises=False):
+    self.store = {}
+    self.update_raises = update_raises
+  def retrieveDigest(self, recordName):
+    return self.store.get(recordName)
+  def update(self, nameDigestPairs):
+    if self.update_raises:
+      raise RuntimeError("SpoofDigestStore write error!!!")
+    for nd in nameDigestPairs:
+      self.store[nd[0]] = nd[1]
+
+class SpoofResolver:
+  def __init__(self, actionName, **unused):
+    self.actionname = actionName
+  def resolve(self, fnName, object=None):
+    return getattr(object, "%(a)s_%(f)s"%{'a':self.actionname, 'f':fnName}, None)
+
+class SpoofLogger:
+  def __init__(self):
+    self.warnings = []
+  def warning(self, msg):
+    self.warnings.append(msg)
+
+class BuildComponent(Component):
+  def __init__(self, name, attributes, elements=[], logger=None):
+    super().__init__(name, attributes, elements, logger)
+    self.the_digest = b'digest'
+    self.build_count = 0
+  def doesNotExist(self):
+    return False
+  def digest(self):
+    return self.the_digest
+  def build_queryProcessElements(self):
+    return True
+  def build_queryDoAfterElementsActions(self):
+    return self.isOutOfDate()
+  def build_afterElementsActions(self):
+    if getattr(self, 'interrupt', False):
+      raise KeyboardInterrupt()
+    self.build_count = self.build_count + 1
+
+class TestAssemblageIncrementalWriteBack(unittest.TestCase):
+  def setUp(self):
+    self.store = SpoofDigestStore()
+    self.cache = DigestCache(self.store)
+    self.logger = SpoofLogger()
+    self.write_back = IncrementalWriteBack(threshold=1)
+    self.attributes = { '__logger__' : None
+                      , '__store__' : self.cache
+                      , '__stat_cache__' : StatCache()
+                      , '__seen_elements__' : set()
+                      , '__incremental_write_back__' : self.write_back
+                      }
+  def component(self, name, elements=[]):
+    return BuildComponent(name, self.attributes, elements)
+  def apply(self, element):
+    element._applyInner('build', SpoofResolver('build'))
+  def test_digests_of_completed_elements_written_back_before_cache_writeBack(self):
+    leaf = self.component('leaf')
+    target = self.component('target', [leaf])
+    self.write_back.begin(self.cache, [target], 'build', self.logger)
+    self.apply(target)
+    self.write_back.finish()
+    self.assertEqual(target.build_count, 1)
+    self.assertEqual(self.store.store, {'leaf':b'digest'})
+    self.assertFalse(self.cache.updateIfDifferent(leaf))
+  def test_written_back_digests_seen_as_unchanged_by_next_apply(self):
+    leaf = self.component('leaf')
+    target = self.component('target', [leaf])
+    self.write_back.begin(self.cache, [target], 'build')
+    self.apply(target)
+    self.write_back.finish()
+    self.cache = DigestCache(self.store)
+    self.attributes['__store__'] = self.cache
+    self.write_back.begin(self.cache, [target], 'build')
+    self.apply(target)
+    self.write_back.finish()
+    self.assertEqual(target.build_count, 1)
+  def test_shared_element_digest_not_written_back_until_all_parents_completed(self):
+    leaf = self.component('leaf')
+    target1 = self.component('target1', [leaf])
+    target2 = self.component('target2', [leaf])
+    self.write_back.begin(self.cache, [target1, target2], 'build')
+    self.apply(target1)
+    self.write_back.finish()
+    self.assertNotIn('leaf', self.store.store)
+    self.assertTrue(self.cache.updateIfDifferent(leaf))
+  def test_shared_element_digest_written_back_once_all_parents_completed(self):
+    leaf = self.component('leaf')
+    target1 = self.component('target1', [leaf])
+    target2 = self.component('target2', [leaf])
+    self.write_back.begin(self.cache, [target1, target2], 'build')
+    self.apply(target1)
+    self.apply(target2)
+    self.write_back.finish()
+    self.assertEqual(self.store.store, {'leaf':b'digest'})
+    self.assertEqual(target2.build_count, 1)
+  def test_digest_not_written_back_if_grandparent_interrupted(self):
+    leaf = self.component('leaf')
+    mid = self.component('mid', [leaf])
+    top = self.component('top', [mid])
+    top.interrupt = True
+    self.write_back.begin(self.cache, [top], 'build')
+    with self.assertRaises(KeyboardInterrupt):
+      self.apply(top)
+    self.write_back.finish()
+    self.assertEqual(mid.build_count, 1)
+    self.assertEqual(self.store.store, {})
+    top.interrupt = False
+    self.cache = DigestCache(self.store)
+    self.attributes['__store__'] = self.cache
+    self.attributes['__seen_elements__'] = set()
+    self.write_back.begin(self.cache, [top], 'build')
+    self.apply(top)
+    self.write_back.finish()
+    self.assertEqual(top.build_count, 1)
+    self.assertEqual(self.store.store, {'leaf':b'digest'})
+  def test_digests_batched_by_threshold(self):
+    self.write_back.threshold = 2
+    leaves = [self.component('leaf%d' % i) for i in range(6)]
+    targets = [self.component('target%d' % i, [leaf]) for i, leaf in enumerate(leaves)]
+    self.write_back.begin(self.cache, targets, 'build')
+    for target in targets:
+      self.apply(target)
+    self.write_back.finish()
+    self.assertEqual(len(self.store.store), 6)
+    stats = self.write_back.statistics()
+    self.assertEqual(stats['written'], 6)
+    self.assertGreater(stats['batches'], 1)
+  def test_failed_write_back_marks_digests_dirty_again_and_logs_warning(self):
+    self.store.update_raises = True
+    leaf = self.component('leaf')
+    target = self.component('target', [leaf])
+    self.write_back.begin(self.cache, [target], 'build', self.logger)
+    self.apply(target)
+    self.write_back.finish()
+    self.assertEqual(self.store.store, {})
+    self.assertEqual(len(self.logger.warnings), 1)
+    self.assertIn("SpoofDigestStore write error!!!", self.logger.warnings[0])
+    self.store.update_raises = False
+    self.cache.writeBack()
+    self.assertEqual(self.store.store, {'leaf':b'digest'})
+  def test_elementCompleted_ignored_outside_begin_and_finish(self):
+    leaf = self.component('leaf')
+    target = self.component('target', [leaf])
+    self.apply(target)
+    self.write_back.finish()
+    self.assertEqual(self.store.store, {})
+    self.assertEqual(self.write_back.statistics(), {'batches':0, 'written':0})
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,176 @@
+#! /usr/bin/python3
+# v3.4+
+"""
+Tests for dibase.assemblage.Instrumentation
+"""
+import unittest
+
+import os,sys
+project_root_dir = os.path.dirname(
+                    os.path.dirname(
+                      os.path.dirname(
+                        os.path.dirname( os.path.realpath(__file__)
+                        )    # this directory
+                      )      # assemblage directory
+                    )        # dibase directory
+                  )          # project directory
+if project_root_dir not in sys.path:
+  sys.path.insert(0, project_root_dir)
+from dibase.assemblage.instrumentation import Instrumentation
+from dibase.assemblage.component import Component
+from dibase.assemblage.interfaces import DigestCacheBase
+
+class Element:
+  def __init__(self, name):
+    self.name = name
+  def __str__(self):
+    return self.name
+
+class DoAllComponent(Component):
+  def someAction_queryDoBeforeElementsActions(self):
+    return True
+  def someAction_queryProcessElements(self):
+    return True
+  def someAction_queryDoAfterElementsActions(self):
+    return self.isOutOfDate()
+  def someAction_beforeElementsActions(self):
+    pass
+  def someAction_afterElementsActions(self):
+    pass
+
+class AlwaysChangedDigestCache(DigestCacheBase):
+  def updateIfDifferent(self, element):
+    return True
+  def writeBack(self):
+    pass
+
+class SpoofResolver:
+  def __init__(self, actionName, **unused):
+    self.actionname = actionName
+  def resolve(self, fnName, object=None):
+    return getattr(object, "%(a)s_%(f)s"%{'a':self.actionname, 'f':fnName}, None)
+class SpoofResolutionPlan:
+  def create(self, actionName, **dynArgs):
+    return SpoofResolver(actionName, **dynArgs)
+
+def attributes(instrumentation):
+  return  { '__logger__' : None
+          , '__store__' : AlwaysChangedDigestCache()
+          , '__resolution_plan__' : SpoofResolutionPlan()
+          , '__instrumentation__' : instrumentation
+          }
+
+class TestAssemblageInstrumentation(unittest.TestCase):
+  def test_record_passes_events_to_sinks(self):
+    events = []
+    instrumentation = Instrumentation(events.append)
+    more_events = []
+    instrumentation.addSink(more_events.append)
+    instrumentation.record(Element('a'), 'build', 'apply', 100, 250)
+    self.assertEqual(len(events), 1)
+    self.assertEqual(events, more_events)
+    event = events[0]
+    self.assertEqual( (event.name, event.kind, event.action, event.phase, event.startNs, event.endNs)
+                    , ('a', __name__ + '.Element', 'build', 'apply', 100, 250)
+                    )
+    self.assertEqual(event.pid, os.getpid())
+  def test_summary_aggregates_by_kind_action_and_phase(self):
+    instrumentation = Instrumentation()
+    instrumentation.record(Element('a'), 'build', 'apply', 0, 100)
+    instrumentation.record(Element('b'), 'build', 'apply', 0, 300)
+    instrumentation.record(Element('b'), 'build', 'resolve', 0, 10)
+    instrumentation.record(Element('b'), 'clean', 'apply', 0, 20)
+    summary = instrumentation.summary()
+    self.assertEqual(len(summary), 3)
+    self.assertEqual( summary[(__name__ + '.Element', 'build', 'apply')]
+                    , {'count':2, 'totalNs':400, 'maxNs':300}
+                    )
+    text = Instrumentation.formatSummary(summary)
+    self.assertEqual(len(text.split('\n')), 4)
+    self.assertIn('build apply', text.split('\n')[1])
+    instrumentation.reset()
+    self.assertEqual(instrumentation.summary(), {})
+  def test_elementDurations_gives_seconds_per_element_for_phase(self):
+    instrumentation = Instrumentation()
+    instrumentation.record(Element('a'), 'build', 'apply', 0, 2000000000)
+    instrumentation.record(Element('a'), 'clean', 'apply', 0, 500000000)
+    instrumentation.record(Element('b'), 'build', 'resolve', 0, 1000000000)
+    self.assertEqual(instrumentation.elementDurations(), {'a':2.5})
+    self.assertEqual(instrumentation.elementDurations('resolve'), {'b':1.0})
+  def test_timed_records_call_even_if_it_raises(self):
+    events = []
+    instrumentation = Instrumentation(events.append)
+    add = instrumentation.timed(Element('a'), 'build', 'add', lambda x, y: x + y)
+    self.assertEqual(add(1, y=2), 3)
+    def fail():
+      raise RuntimeError("failed")
+    with self.assertRaises(RuntimeError):
+      instrumentation.timed(Element('a'), 'build', 'fail', fail)()
+    self.assertEqual([e.phase for e in events], ['add', 'fail'])
+    self.assertTrue(all(e.endNs >= e.startNs for e in events))
+  def test_currentAction_is_per_thread(self):
+    import threading
+    instrumentation = Instrumentation()
+    instrumentation.setAction('build')
+    seen = []
+    thread = threading.Thread(target=lambda: seen.append(instrumentation.currentAction()))
+    thread.start()
+    thread.join()
+    self.assertEqual(seen, [None])
+    self.assertEqual(instrumentation.currentAction(), 'build')
+  def test_Component_apply_records_nested_phases_of_each_element(self):
+    events = []
+    instrumentation = Instrumentation(events.append)
+    attrs = attributes(instrumentation)
+    leaf = DoAllComponent('leaf', attrs)
+    top = DoAllComponent('top', attrs, [leaf])
+    top.apply('someAction')
+    phases = [(e.name, e.phase) for e in events if e.phase != 'resolve']
+    self.assertEqual( phases
+                    , [ ('top', 'queryDoBeforeElementsActions')
+                      , ('top', 'beforeElementsActions')
+                      , ('top', 'queryProcessElements')
+                      , ('leaf', 'queryDoBeforeElementsActions')
+                      , ('leaf', 'beforeElementsActions')
+                      , ('leaf', 'queryProcessElements')
+                      , ('leaf', 'elements')
+                      , ('leaf', 'digest')
+                      , ('leaf', 'queryDoAfterElementsActions')
+                      , ('leaf', 'afterElementsActions')
+                      , ('leaf', 'apply')
+                      , ('top', 'elements')
+                      , ('top', 'queryDoAfterElementsActions')
+                      , ('top', 'afterElementsActions')
+                      , ('top', 'apply')
+                      ]
+                    )
+    self.assertTrue(all(e.action == 'someAction' for e in events))
+    self.assertEqual(len([e for e in events if e.phase == 'resolve' and e.name == 'leaf']), 5)
+    by_phase = dict((e.name + ':' + e.phase, e) for e in events)
+    self.assertLessEqual(by_phase['top:apply'].startNs, by_phase['top:elements'].startNs)
+    self.assertLessEqual(by_phase['top:elements'].startNs, by_phase['leaf:apply'].startNs)
+    self.assertGreaterEqual(by_phase['top:elements'].endNs, by_phase['leaf:apply'].endNs)
+    summary = instrumentation.summary()
+    self.assertEqual( summary[(__name__ + '.DoAllComponent', 'someAction', 'apply')]['count'], 2)
+  def test_Component_apply_restores_action_and_digest_untimed_outside_apply(self):
+    events = []
+    instrumentation = Instrumentation(events.append)
+    attrs = attributes(instrumentation)
+    leaf = DoAllComponent('leaf', attrs)
+    DoAllComponent('top', attrs, [leaf]).apply('someAction')
+    self.assertIsNone(instrumentation.currentAction())
+    del events[:]
+    self.assertTrue(leaf.hasChanged())
+    self.assertEqual(events, [])
+    instrumentation.setAction('outer')
+    leaf.apply('someAction')
+    self.assertEqual(instrumentation.currentAction(), 'outer')
+  def test_Component_apply_without_instrumentation_applies_action(self):
+    attrs = attributes(None)
+    top = DoAllComponent('top', attrs, [DoAllComponent('leaf', attrs)])
+    top.apply('someAction')
+    self.assertTrue(top.queryBeforeElementsActionsDone())
+    self.assertTrue(top.queryAfterElementsActionsDone())
+
+if __name__ == '__main__':
+  unittest.main()
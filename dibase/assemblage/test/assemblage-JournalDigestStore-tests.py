@@ -0,0 +1,165 @@
+#! /usr/bin/python3
+# v3.4+
+"""
+Tests for dibase.assemblage.JournalDigestStore
+"""
+import unittest
+import subprocess
+import tempfile
+import shutil
+
+import os,sys
+project_root_dir = os.path.dirname(
+                    os.path.dirname(
+                      os.path.dirname(
+                        os.path.dirname( os.path.realpath(__file__)
+                        )    # this directory
+                      )      # assemblage directory
+                    )        # dibase directory
+                  )          # project directory
+if project_root_dir not in sys.path:
+  sys.path.insert(0, project_root_dir)
+from dibase.assemblage.journaldigeststore import JournalDigestStore
+
+stress_worker_script = """
+import sys
+sys.path.insert(0, sys.argv[1])
+from dibase.assemblage.journaldigeststore import JournalDigestStore
+store = JournalDigestStore(sys.argv[2])
+process, count = int(sys.argv[3]), int(sys.argv[4])
+for i in range(count):
+  store.update([('p%d-%d' % (process, i), b'%d' % i), ('shared', b'%d' % process)])
+  store.retrieveDigest('shared')
+"""
+
+class TestAssemblageJournalDigestStore(unittest.TestCase):
+  def setUp(self):
+    self.dir = tempfile.mkdtemp()
+    self.pathname = os.path.join(self.dir, 'store')
+    self.store = JournalDigestStore(self.pathname, sync=False)
+  def tearDown(self):
+    shutil.rmtree(self.dir)
+  def reopened(self, **kwargs):
+    return JournalDigestStore(self.pathname, sync=False, **kwargs)
+  def test_retrieveDigest_returns_convertible_to_False_for_new_store(self):
+    self.assertFalse(self.store.retrieveDigest("whatever"))
+  def test_retrieveDigest_returns_value_from_store_that_update_added(self):
+    self.store.update([('t1',b'1234567890abcdef')])
+    self.assertEqual(self.store.retrieveDigest('t1'), b'1234567890abcdef')
+  def test_retrieveDigest_returns_False_from_non_empty_store_for_unknown_key(self):
+    self.store.update([('t1',b'1234567890abcdef')])
+    self.assertFalse(self.store.retrieveDigest('nosuchkey'))
+  def test_values_added_and_updated_are_replayed_by_reopened_store(self):
+    key_digests1 = (['t1',b'1234567890abcdef'], ['t2',b'2234567890abcdef'], ['t3',b'3234567890abcdef'])
+    key_digests2 = (['t2',b'2NEW567890abcdef'], ['t4',b'4234567890bbcdef'])
+    key_digests_expected =  ( ['t1',b'1234567890abcdef'], ['t2',b'2NEW567890abcdef']
+                            , ['t3',b'3234567890abcdef'], ['t4',b'4234567890bbcdef']
+                            )
+    self.store.update(key_digests1)
+    self.store.update(key_digests2)
+    store = self.reopened()
+    for kd in key_digests_expected:
+      self.assertEqual(store.retrieveDigest(kd[0]), kd[1])
+  def test_update_appends_to_journal(self):
+    self.store.update([('t1',b'1')])
+    size = os.path.getsize(self.store.journalPath())
+    self.store.update([('t2',b'2')])
+    self.assertGreater(os.path.getsize(self.store.journalPath()), size)
+    self.assertFalse(os.path.exists(self.store.snapshotPath()))
+  def test_torn_block_is_ignored_and_overwritten_by_next_update(self):
+    self.store.update([('t1',b'1')])
+    self.store.update([('t2',b'2')])
+    with open(self.store.journalPath(), 'r+b') as file:
+      file.truncate(os.path.getsize(self.store.journalPath()) - 1)
+    store = self.reopened()
+    self.assertEqual(store.retrieveDigest('t1'), b'1')
+    self.assertIsNone(store.retrieveDigest('t2'))
+    store.update([('t3',b'3')])
+    store = self.reopened()
+    self.assertEqual(store.retrieveDigest('t1'), b'1')
+    self.assertIsNone(store.retrieveDigest('t2'))
+    self.assertEqual(store.retrieveDigest('t3'), b'3')
+  def test_corrupt_block_is_ignored(self):
+    self.store.update([('t1',b'1')])
+    self.store.update([('t2',b'2')])
+    with open(self.store.journalPath(), 'r+b') as file:
+      file.seek(-1, os.SEEK_END)
+      file.write(b'X')
+    store = self.reopened()
+    self.assertEqual(store.retrieveDigest('t1'), b'1')
+    self.assertIsNone(store.retrieveDigest('t2'))
+  def test_garbageRatio_is_proportion_of_superseded_records(self):
+    self.store.update([('t1',b'1'), ('t2',b'2')])
+    self.assertEqual(self.store.garbageRatio(), 0.0)
+    self.store.update([('t1',b'1b'), ('t2',b'2b')])
+    self.assertEqual(self.store.garbageRatio(), 0.5)
+  def test_compact_writes_snapshot_and_empties_journal(self):
+    self.store.update([('t1',b'1'), ('t2',b'2')])
+    self.store.update([('t1',b'1b')])
+    self.store.compact()
+    self.assertEqual(os.path.getsize(self.store.journalPath()), 0)
+    self.assertEqual(self.store.garbageRatio(), 0.0)
+    self.store.update([('t3',b'3')])
+    store = self.reopened()
+    self.assertEqual(store.retrieveDigest('t1'), b'1b')
+    self.assertEqual(store.retrieveDigest('t2'), b'2')
+    self.assertEqual(store.retrieveDigest('t3'), b'3')
+  def test_update_compacts_when_garbage_ratio_exceeds_threshold(self):
+    store = self.reopened(compactionThreshold=0.5, minimumCompactionRecords=4)
+    store.update([('t1',b'1'), ('t2',b'2')])
+    store.update([('t1',b'1b')])
+    self.assertFalse(os.path.exists(store.snapshotPath()))
+    store.update([('t2',b'2b'), ('t1',b'1c')])
+    self.assertTrue(os.path.exists(store.snapshotPath()))
+    self.assertEqual(os.path.getsize(store.journalPath()), 0)
+    store = self.reopened()
+    self.assertEqual(store.retrieveDigest('t1'), b'1c')
+    self.assertEqual(store.retrieveDigest('t2'), b'2b')
+  def test_replaying_journal_left_by_interrupted_compaction_gives_same_records(self):
+    self.store.update([('t1',b'1'), ('t2',b'2')])
+    self.store.update([('t1',b'1b')])
+    with open(self.store.journalPath(), 'rb') as file:
+      journal = file.read()
+    self.store.compact()
+    with open(self.store.journalPath(), 'wb') as file:
+      file.write(journal)
+    store = self.reopened()
+    self.assertEqual(store.retrieveDigest('t1'), b'1b')
+    self.assertEqual(store.retrieveDigest('t2'), b'2')
+  def test_update_rejects_non_bytes_digests(self):
+    with self.assertRaises(TypeError):
+      self.store.update([('int',12345)])
+    self.assertIsNone(self.store.retrieveDigest('int'))
+  def test_default_path_used_if_none_provided_to_constructor(self):
+    self.assertEqual(JournalDigestStore().pathname, JournalDigestStore.defaultPath())
+  def test_concurrent_updates_by_several_processes_are_all_kept(self):
+    processes, count = 4, 20
+    workers = [ subprocess.Popen([ sys.executable, '-c', stress_worker_script
+                                 , project_root_dir, self.pathname, str(p), str(count)
+                                 ])
+                for p in range(processes)
+              ]
+    for worker in workers:
+      self.assertEqual(worker.wait(), 0)
+    store = self.reopened()
+    for p in range(processes):
+      for i in range(count):
+        self.assertEqual(store.retrieveDigest('p%d-%d' % (p, i)), b'%d' % i)
+    self.assertIn(store.retrieveDigest('shared'), [b'%d' % p for p in range(processes)])
+  def test_remove_appends_tombstones_replayed_by_reopened_store(self):
+    self.store.update([('t1',b'1'), ('t2',b'2')])
+    self.store.remove(['t1', 'nosuchkey'])
+    self.assertIsNone(self.store.retrieveDigest('t1'))
+    self.assertEqual(self.store.names(), ['t2'])
+    self.assertAlmostEqual(self.store.garbageRatio(), 2/3)
+    store = self.reopened()
+    self.assertIsNone(store.retrieveDigest('t1'))
+    self.assertEqual(store.names(), ['t2'])
+    store.compact()
+    self.assertEqual(self.reopened().names(), ['t2'])
+  def test_update_rejects_None_digests(self):
+    with self.assertRaises(TypeError):
+      self.store.update([('t1',None)])
+
+if __name__ == '__main__':
+  unittest.main()
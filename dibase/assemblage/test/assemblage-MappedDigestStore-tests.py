@@ -0,0 +1,128 @@
+#! /usr/bin/python3
+# v3.4+
+"""
+Tests for dibase.assemblage.MappedDigestStore
+"""
+import unittest
+import subprocess
+import tempfile
+import shutil
+
+import os,sys
+project_root_dir = os.path.dirname(
+                    os.path.dirname(
+                      os.path.dirname(
+                        os.path.dirname( os.path.realpath(__file__)
+                        )    # this directory
+                      )      # assemblage directory
+                    )        # dibase directory
+                  )          # project directory
+if project_root_dir not in sys.path:
+  sys.path.insert(0, project_root_dir)
+from dibase.assemblage.mappeddigeststore import MappedDigestStore
+
+stress_worker_script = """
+import sys
+sys.path.insert(0, sys.argv[1])
+from dibase.assemblage.mappeddigeststore import MappedDigestStore
+store = MappedDigestStore(sys.argv[2])
+process, count = int(sys.argv[3]), int(sys.argv[4])
+for i in range(count):
+  store.update([('p%d-%d' % (process, i), b'%d' % i), ('shared', b'%d' % process)])
+  store.retrieveDigest('shared')
+"""
+
+class TestAssemblageMappedDigestStore(unittest.TestCase):
+  def setUp(self):
+    self.dir = tempfile.mkdtemp()
+    self.pathname = os.path.join(self.dir, 'store')
+    self.store = MappedDigestStore(self.pathname)
+  def tearDown(self):
+    self.store.close()
+    shutil.rmtree(self.dir)
+  def test_retrieveDigest_returns_convertible_to_False_for_new_store(self):
+    self.assertFalse(self.store.retrieveDigest("whatever"))
+    self.assertFalse(os.path.exists(self.pathname))
+  def test_retrieveDigest_returns_value_from_store_that_update_added(self):
+    self.store.update([('t1',b'1234567890abcdef')])
+    self.assertEqual(self.store.retrieveDigest('t1'), b'1234567890abcdef')
+  def test_retrieveDigest_returns_False_from_non_empty_store_for_unknown_key(self):
+    self.store.update([('t1',b'1234567890abcdef')])
+    self.assertFalse(self.store.retrieveDigest('nosuchkey'))
+  def test_retrieveDigest_returns_values_from_store_that_update_added_and_updated_multiple_values_to(self):
+    key_digests1 = (['t1',b'1234567890abcdef'], ['t2',b'2234567890abcdef'], ['t3',b'3234567890abcdef'])
+    key_digests2 = (['t2',b'2NEW567890abcdef'], ['t4',b'4234567890bbcdef'])
+    key_digests_expected =  ( ['t1',b'1234567890abcdef'], ['t2',b'2NEW567890abcdef']
+                            , ['t3',b'3234567890abcdef'], ['t4',b'4234567890bbcdef']
+                            )
+    self.store.update(key_digests1)
+    self.store.update(key_digests2)
+    for kd in key_digests_expected:
+      self.assertEqual(self.store.retrieveDigest(kd[0]), kd[1])
+    self.assertEqual(len(self.store), 4)
+  def test_digests_shorter_than_digest_size_are_retrieved_unpadded(self):
+    self.store.update([('short',b'abc'), ('empty',b'')])
+    self.assertEqual(self.store.retrieveDigest('short'), b'abc')
+    self.assertEqual(self.store.retrieveDigest('empty'), b'')
+  def test_update_rejects_digests_that_do_not_fit_records(self):
+    with self.assertRaises(ValueError):
+      self.store.update([('long',b'x'*17)])
+    with self.assertRaises(TypeError):
+      self.store.update([('int',12345)])
+    self.assertFalse(os.path.exists(self.pathname))
+  def test_file_size_is_header_plus_fixed_size_records(self):
+    self.store.update([('k%d' % i, bytes([i])*16) for i in range(10)])
+    self.assertEqual(os.path.getsize(self.pathname), 16 + 10 * self.store.recordSize)
+  def test_many_records_found_by_new_store_object(self):
+    count = 5000
+    self.store.update([('k%d' % i, i.to_bytes(4,'big')) for i in range(0,count,2)])
+    self.store.update([('k%d' % i, i.to_bytes(4,'big')) for i in range(1,count,2)])
+    store = MappedDigestStore(self.pathname)
+    try:
+      self.assertEqual(len(store), count)
+      for i in range(count):
+        self.assertEqual(store.retrieveDigest('k%d' % i), i.to_bytes(4,'big'))
+      self.assertIsNone(store.retrieveDigest('k%d' % count))
+    finally:
+      store.close()
+  def test_digest_size_of_existing_file_is_used(self):
+    self.store = MappedDigestStore(self.pathname, digestSize=32)
+    self.store.update([('t1',b'x'*32)])
+    store = MappedDigestStore(self.pathname)
+    try:
+      self.assertEqual(store.retrieveDigest('t1'), b'x'*32)
+    finally:
+      store.close()
+  def test_not_a_digest_index_file_raises_ValueError(self):
+    with open(self.pathname, 'wb') as file:
+      file.write(b'not a digest index file')
+    with self.assertRaises(ValueError):
+      self.store.retrieveDigest('t1')
+  def test_default_path_used_if_none_provided_to_constructor(self):
+    self.assertEqual(MappedDigestStore().pathname, MappedDigestStore.defaultPath())
+  def test_concurrent_updates_by_several_processes_are_all_kept(self):
+    processes, count = 4, 20
+    workers = [ subprocess.Popen([ sys.executable, '-c', stress_worker_script
+                                 , project_root_dir, self.pathname, str(p), str(count)
+                                 ])
+                for p in range(processes)
+              ]
+    for worker in workers:
+      self.assertEqual(worker.wait(), 0)
+    store = MappedDigestStore(self.pathname)
+    for p in range(processes):
+      for i in range(count):
+        self.assertEqual(store.retrieveDigest('p%d-%d' % (p, i)), b'%d' % i)
+    self.assertIn(store.retrieveDigest('shared'), [b'%d' % p for p in range(processes)])
+  def test_retain_removes_all_other_records(self):
+    self.store.update([('t1',b'1'), ('t2',b'2'), ('t3',b'3')])
+    self.assertEqual(self.store.retain(['t1', 't3', 'nosuchkey'], dryRun=True), 1)
+    self.assertEqual(len(self.store), 3)
+    self.assertEqual(self.store.retain(['t1', 't3', 'nosuchkey']), 1)
+    self.assertEqual(len(self.store), 2)
+    self.assertEqual(self.store.retrieveDigest('t1'), b'1')
+    self.assertIsNone(self.store.retrieveDigest('t2'))
+    self.assertEqual(self.store.retrieveDigest('t3'), b'3')
+
+if __name__ == '__main__':
+  unittest.main()
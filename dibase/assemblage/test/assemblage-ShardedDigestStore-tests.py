@@ -0,0 +1,96 @@
+#! /usr/bin/python3
+# v3.4+
+"""
+Tests for dibase.assemblage.ShardedDigestStore
+"""
+import unittest
+import tempfile
+import shutil
+
+import os,sys
+project_root_dir = os.path.dirname(
+                    os.path.dirname(
+                      os.path.dirname(
+                        os.path.dirname( os.path.realpath(__file__)
+                        )    # this directory
+                      )      # assemblage directory
+                    )        # dibase directory
+                  )          # project directory
+if project_root_dir not in sys.path:
+  sys.path.insert(0, project_root_dir)
+from dibase.assemblage.shardeddigeststore import ShardedDigestStore
+from dibase.assemblage.journaldigeststore import JournalDigestStore
+from dibase.assemblage.interfaces import DigestStoreBase
+
+class SpoofDigestStore(DigestStoreBase):
+  def __init__(self):
+    self.store = {}
+    self.update_calls = 0
+  def retrieveDigest(self, recordName):
+    return self.store.get(recordName)
+  def update(self, nameDigestPairs):
+    self.update_calls = self.update_calls + 1
+    for nd in nameDigestPairs:
+      self.store[nd[0]] = nd[1]
+
+class TestAssemblageShardedDigestStore(unittest.TestCase):
+  def setUp(self):
+    self.shards = [SpoofDigestStore() for i in range(4)]
+    self.store = ShardedDigestStore(self.shards)
+  def tearDown(self):
+    self.store.close()
+  def test_no_shards_raises_ValueError(self):
+    with self.assertRaises(ValueError):
+      ShardedDigestStore([])
+  def test_retrieveDigest_returns_values_that_update_added_and_updated(self):
+    self.store.update([('t%d' % i, b'%d' % i) for i in range(100)])
+    self.store.update([('t7', b'new')])
+    for i in range(100):
+      self.assertEqual(self.store.retrieveDigest('t%d' % i), b'new' if i==7 else b'%d' % i)
+    self.assertIsNone(self.store.retrieveDigest('nosuchkey'))
+  def test_records_are_partitioned_across_shards_by_name(self):
+    self.store.update([('t%d' % i, b'%d' % i) for i in range(100)])
+    self.assertEqual(sum(len(shard.store) for shard in self.shards), 100)
+    for shard in self.shards:
+      self.assertGreater(len(shard.store), 0)
+    for i in range(100):
+      name = 't%d' % i
+      self.assertIn(name, self.shards[self.store.shardIndex(name)].store)
+  def test_update_only_updates_shards_having_records(self):
+    self.store.update([('t1', b'1')])
+    self.assertEqual(sum(shard.update_calls for shard in self.shards), 1)
+    self.assertEqual(self.shards[self.store.shardIndex('t1')].update_calls, 1)
+  def test_retrieveDigests_returns_digests_of_all_names(self):
+    self.store.update([('t%d' % i, b'%d' % i) for i in range(20)])
+    digests = self.store.retrieveDigests(['t%d' % i for i in range(25)])
+    self.assertEqual(len(digests), 25)
+    self.assertEqual(digests['t3'], b'3')
+    self.assertIsNone(digests['t24'])
+  def test_collection_methods_supported_only_if_all_shards_provide_them(self):
+    self.assertFalse(self.store.supportsCollection('names'))
+    self.assertFalse(self.store.supportsCollection('retain'))
+    with self.assertRaises(NotImplementedError):
+      self.store.names()
+    with self.assertRaises(NotImplementedError):
+      self.store.retain(['t1'])
+  def test_create_makes_shards_of_store_class(self):
+    directory = tempfile.mkdtemp()
+    try:
+      pathname = os.path.join(directory, 'store')
+      store = ShardedDigestStore.create(JournalDigestStore, pathname, shardCount=3, sync=False)
+      self.assertEqual(len(store.shards), 3)
+      self.assertEqual(store.shards[2].pathname, pathname + '.2')
+      store.update([('t%d' % i, b'%d' % i) for i in range(10)])
+      store.remove(['t1', 't2'])
+      self.assertEqual(sorted(store.names()), sorted('t%d' % i for i in range(10) if i not in (1,2)))
+      store.compact()
+      store.close()
+      store = ShardedDigestStore.create(JournalDigestStore, pathname, shardCount=3)
+      self.assertEqual(store.retrieveDigest('t9'), b'9')
+      self.assertIsNone(store.retrieveDigest('t1'))
+      store.close()
+    finally:
+      shutil.rmtree(directory)
+
+if __name__ == '__main__':
+  unittest.main()
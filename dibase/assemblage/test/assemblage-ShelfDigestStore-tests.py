@@ -4,6 +4,7 @@
 Tests for dibase.assemblage.shelfdigeststore.ShelfDigestStore 
 """
 import unittest
+import subprocess
 import glob
 
 import os,sys
@@ -19,6 +20,17 @@ if project_root_dir not in sys.path:
   sys.path.insert(0, project_root_dir)
 from dibase.assemblage.shelfdigeststore import ShelfDigestStore
 
+stress_worker_script = """
+import sys
+sys.path.insert(0, sys.argv[1])
+from dibase.assemblage.shelfdigeststore import ShelfDigestStore
+store = ShelfDigestStore(sys.argv[2])
+process, count = int(sys.argv[3]), int(sys.argv[4])
+for i in range(count):
+  store.update([('p%d-%d' % (process, i), b'%d' % i), ('shared', b'%d' % process)])
+  store.retrieveDigest('shared')
+"""
+
 class TestAssemblageDigestStore(unittest.TestCase):
   @staticmethod
   def storePathname():
@@ -87,5 +99,75 @@ class TestAssemblageDigestStore(unittest.TestCase):
       filecount = filecount + 1
     self.assertNotEqual(filecount,0)
     self.remove_files(store.defaultPath())
+  def test_concurrent_updates_by_several_processes_are_all_kept(self):
+    processes, count = 4, 20
+    workers = [ subprocess.Popen([ sys.executable, '-c', stress_worker_script
+                                 , project_root_dir, self.storePathname(), str(p), str(count)
+                                 ])
+                for p in range(processes)
+              ]
+    for worker in workers:
+      self.assertEqual(worker.wait(), 0)
+    store = ShelfDigestStore(self.storePathname())
+    for p in range(processes):
+      for i in range(count):
+        self.assertEqual(store.retrieveDigest('p%d-%d' % (p, i)), b'%d' % i)
+    self.assertIn(store.retrieveDigest('shared'), [b'%d' % p for p in range(processes)])
+  def test_names_returns_names_of_records(self):
+    self.assertEqual(self.store.names(), [])
+    self.store.update([('t1',b'1'), ('t2',b'2')])
+    self.assertEqual(sorted(self.store.names()), ['t1', 't2'])
+  def test_remove_removes_records(self):
+    self.store.update([('t1',b'1'), ('t2',b'2')])
+    self.store.remove(['t1', 'nosuchkey'])
+    self.assertEqual(self.store.names(), ['t2'])
+    self.assertFalse(self.store.retrieveDigest('t1'))
+  def test_compact_keeps_records(self):
+    self.store.update([('t%d' % i, b'%d' % i) for i in range(10)])
+    self.store.remove(['t%d' % i for i in range(5)])
+    self.store.compact()
+    self.assertEqual(sorted(self.store.names()), ['t%d' % i for i in range(5,10)])
+    self.assertEqual(self.store.retrieveDigest('t7'), b'7')
+  def test_compact_failing_to_replace_files_leaves_store_intact(self):
+    self.store.update([('t%d' % i, b'%d' % i) for i in range(10)])
+    with open(self.store.pathname + '.compacting.bak', 'w') as f:
+      f.write('left by a failed compaction')
+    def failing_replace(source, destination):
+      raise OSError("simulated failure replacing '%s'" % destination)
+    original_replace = os.replace
+    os.replace = failing_replace
+    try:
+      with self.assertRaises(OSError):
+        self.store.compact()
+    finally:
+      os.replace = original_replace
+    self.assertEqual(len(self.store.names()), 10)
+    self.assertEqual(self.store.retrieveDigest('t7'), b'7')
+    self.assertEqual(glob.glob(self.store.pathname + '.compacting*'), [])
+  def test_compact_interrupted_moving_files_completed_by_next_access(self):
+    self.store.update([('t%d' % i, b'%d' % i) for i in range(10)])
+    self.store.remove(['t%d' % i for i in range(5)])
+    original_replace = os.replace
+    moved = []
+    def interrupted_replace(source, destination):
+      if '.compacting' in source and moved:
+        raise KeyboardInterrupt()
+      original_replace(source, destination)
+      if '.compacting' in source:
+        moved.append(destination)
+    os.replace = interrupted_replace
+    try:
+      with self.assertRaises(KeyboardInterrupt):
+        self.store.compact()
+    finally:
+      os.replace = original_replace
+    self.assertEqual(len(moved), 1)
+    self.assertTrue(os.path.exists(self.store.pathname + '.compacted'))
+    store = ShelfDigestStore(self.storePathname())
+    self.assertEqual(store.retrieveDigest('t7'), b'7')
+    self.assertEqual(sorted(store.names()), ['t%d' % i for i in range(5,10)])
+    self.assertFalse(os.path.exists(self.store.pathname + '.compacted'))
+    self.assertEqual(glob.glob(self.store.pathname + '.compacting*'), [])
+
 if __name__ == '__main__':
   unittest.main()
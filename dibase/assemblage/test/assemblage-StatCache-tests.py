@@ -0,0 +1,97 @@
+#! /usr/bin/python3
+# v3.4+
+"""
+Tests for dibase.assemblage.statcache.StatCache 
+"""
+import unittest
+import tempfile
+
+import os,sys
+project_root_dir = os.path.dirname(
+                    os.path.dirname(
+                      os.path.dirname(
+                        os.path.dirname( os.path.realpath(__file__)
+                        )    # this directory 
+                      )      # assemblage directory 
+                    )        # dibase directory 
+                  )          # project directory
+if project_root_dir not in sys.path:
+  sys.path.insert(0, project_root_dir)
+from dibase.assemblage.statcache import StatCache
+
+class TestAssemblageStatCache(unittest.TestCase):
+  def setUp(self):
+    tf = tempfile.NamedTemporaryFile(delete=False)
+    tf.close()
+    self.path = tf.name
+  def tearDown(self):
+    if os.path.exists(self.path):
+      os.remove(self.path)
+  def test_stat_returns_None_for_non_existent_file(self):
+    self.assertIsNone(StatCache().stat("./nosuchfile.tst"))
+    self.assertFalse(StatCache().exists("./nosuchfile.tst"))
+  def test_stat_returns_stat_result_for_existing_file(self):
+    sc = StatCache()
+    self.assertEqual(sc.stat(self.path).st_size, os.stat(self.path).st_size)
+    self.assertTrue(sc.exists(self.path))
+  def test_stat_result_is_cached(self):
+    sc = StatCache()
+    self.assertTrue(sc.exists(self.path))
+    os.remove(self.path)
+    self.assertTrue(sc.exists(self.path))
+  def test_invalidate_discards_cached_stat_result(self):
+    sc = StatCache()
+    self.assertTrue(sc.exists(self.path))
+    os.remove(self.path)
+    sc.invalidate(self.path)
+    self.assertFalse(sc.exists(self.path))
+  def test_clear_discards_all_cached_stat_results(self):
+    sc = StatCache()
+    self.assertTrue(sc.exists(self.path))
+    os.remove(self.path)
+    sc.clear()
+    self.assertFalse(sc.exists(self.path))
+  def test_value_computed_once_until_invalidated(self):
+    sc = StatCache()
+    calls = []
+    compute = lambda : calls.append(1) or len(calls)
+    self.assertEqual(sc.value(self.path, 'v', compute), 1)
+    self.assertEqual(sc.value(self.path, 'v', compute), 1)
+    sc.invalidate(self.path)
+    self.assertEqual(sc.value(self.path, 'v', compute), 2)
+  def test_exists_answered_from_directory_listing(self):
+    sc = StatCache()
+    self.assertTrue(sc.exists(self.path))
+    os.remove(self.path)
+    self.assertTrue(sc.exists(self.path))
+    sc.invalidate(self.path)
+    self.assertFalse(sc.exists(self.path))
+  def test_file_created_in_listed_directory_after_listing_exists(self):
+    sc = StatCache()
+    self.assertTrue(sc.exists(self.path))
+    later = ''.join([self.path,'.later'])
+    with open(later, 'w') as f:
+      f.write('later')
+    try:
+      self.assertTrue(sc.exists(later))
+      self.assertEqual(sc.stat(later).st_size, 5)
+      self.assertFalse(sc.exists(''.join([self.path,'.never'])))
+    finally:
+      os.remove(later)
+  def test_exists_without_directory_listing_queries_each_path(self):
+    sc = StatCache(listDirectories=False)
+    self.assertTrue(sc.exists(self.path))
+    later = ''.join([self.path,'.later'])
+    with open(later, 'w') as f:
+      f.write('later')
+    try:
+      self.assertTrue(sc.exists(later))
+    finally:
+      os.remove(later)
+  def test_paths_in_non_existent_directory_do_not_exist(self):
+    sc = StatCache()
+    self.assertFalse(sc.exists(os.path.join(self.path + '.nosuchdir', 'file')))
+    self.assertIsNone(sc.stat(os.path.join(self.path + '.nosuchdir', 'file')))
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,121 @@
+#! /usr/bin/python3
+# v3.4+
+"""
+Tests for dibase.assemblage.TraceEventWriter
+"""
+import unittest
+import threading
+import json
+import io
+
+import os,sys
+project_root_dir = os.path.dirname(
+                    os.path.dirname(
+                      os.path.dirname(
+                        os.path.dirname( os.path.realpath(__file__)
+                        )    # this directory
+                      )      # assemblage directory
+                    )        # dibase directory
+                  )          # project directory
+if project_root_dir not in sys.path:
+  sys.path.insert(0, project_root_dir)
+from dibase.assemblage.traceeventwriter import TraceEventWriter
+from dibase.assemblage.instrumentation import Instrumentation
+from dibase.assemblage.component import Component
+from dibase.assemblage.interfaces import DigestCacheBase
+
+class Element:
+  def __init__(self, name):
+    self.name = name
+  def __str__(self):
+    return self.name
+
+class DoAllComponent(Component):
+  def someAction_queryProcessElements(self):
+    return True
+  def someAction_queryDoAfterElementsActions(self):
+    return True
+  def someAction_afterElementsActions(self):
+    pass
+
+class SpoofDigestCache(DigestCacheBase):
+  def updateIfDifferent(self, element):
+    return False
+  def writeBack(self):
+    pass
+
+class SpoofResolver:
+  def __init__(self, actionName, **unused):
+    self.actionname = actionName
+  def resolve(self, fnName, object=None):
+    return getattr(object, "%(a)s_%(f)s"%{'a':self.actionname, 'f':fnName}, None)
+class SpoofResolutionPlan:
+  def create(self, actionName, **dynArgs):
+    return SpoofResolver(actionName, **dynArgs)
+
+class TestAssemblageTraceEventWriter(unittest.TestCase):
+  def trace(self, output):
+    return json.loads(output.getvalue())['traceEvents']
+  def test_events_written_as_complete_events_with_lane_names(self):
+    output = io.StringIO()
+    with TraceEventWriter(output, 'build') as writer:
+      instrumentation = Instrumentation(writer)
+      start = instrumentation.now()
+      instrumentation.record(Element('a'), 'make', 'apply', start, start + 2500)
+      instrumentation.record(Element('b'), 'make', 'digest', start + 1000, start + 1000)
+    events = self.trace(output)
+    self.assertEqual([e['ph'] for e in events], ['M', 'M', 'X', 'X'])
+    self.assertEqual(events[0]['args'], {'name':'build'})
+    self.assertEqual(events[1]['args'], {'name':threading.current_thread().name})
+    complete = events[2]
+    self.assertEqual( (complete['name'], complete['cat'], complete['dur'], complete['args'])
+                    , ('a', 'apply', 2.5, {'action':'make', 'kind':__name__ + '.Element'})
+                    )
+    self.assertEqual( (complete['pid'], complete['tid'])
+                    , (os.getpid(), threading.get_ident())
+                    )
+    self.assertGreaterEqual(complete['ts'], 0)
+    self.assertAlmostEqual(events[3]['ts'] - complete['ts'], 1.0)
+  def test_events_from_other_threads_in_own_lanes(self):
+    output = io.StringIO()
+    writer = TraceEventWriter(output)
+    instrumentation = Instrumentation(writer)
+    def record():
+      instrumentation.record(Element('a'), 'make', 'apply', 0, 1)
+    record()
+    thread = threading.Thread(target=record, name='worker')
+    thread.start()
+    thread.join()
+    writer.close()
+    events = self.trace(output)
+    names = [e['args']['name'] for e in events if e['name'] == 'thread_name']
+    self.assertEqual(names, [threading.current_thread().name, 'worker'])
+    self.assertEqual(len(set(e['tid'] for e in events if e['ph'] == 'X')), 2)
+  def test_events_after_close_are_ignored(self):
+    output = io.StringIO()
+    writer = TraceEventWriter(output)
+    writer.close()
+    writer(Instrumentation.Event('a', 'kind', 'make', 'apply', 0, 1, 1, 1))
+    writer.close()
+    self.assertEqual(self.trace(output), [])
+  def test_Component_apply_phases_nest_within_element_apply(self):
+    output = io.StringIO()
+    with TraceEventWriter(output) as writer:
+      attrs = { '__logger__' : None
+              , '__store__' : SpoofDigestCache()
+              , '__resolution_plan__' : SpoofResolutionPlan()
+              , '__instrumentation__' : Instrumentation(writer)
+              }
+      DoAllComponent('top', attrs, [DoAllComponent('leaf', attrs)]).apply('someAction')
+    events = dict( (e['name'] + ':' + e['cat'], e)
+                   for e in self.trace(output) if e['ph'] == 'X'
+                 )
+    def within(inner, outer): # allowing for floating point rounding
+      return events[outer]['ts'] <= events[inner]['ts'] + 1e-6 and\
+             events[inner]['ts'] + events[inner]['dur'] <= events[outer]['ts'] + events[outer]['dur'] + 1e-6
+    self.assertTrue(within('top:elements', 'top:apply'))
+    self.assertTrue(within('leaf:apply', 'top:elements'))
+    self.assertTrue(within('leaf:afterElementsActions', 'leaf:apply'))
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,105 @@
+#! /usr/bin/python3
+# v3.4+
+'''
+Part of the dibase/assemblage package.
+A tool to apply actions to multi-part constructs.
+
+Definition of the TraceEventWriter class and related entities.
+
+Developed by R.E. McArdell / Dibase Limited.
+Copyright (c) 2015 Dibase Limited
+License: dual: GPL or BSD.
+'''
+
+from .instrumentation import Instrumentation
+import threading
+import json
+
+class TraceEventWriter:
+  '''
+  Instrumentation sink that writes events to a text file in the Chrome
+  trace event JSON format, which can be opened by trace viewers such as
+  Perfetto (ui.perfetto.dev) or chrome://tracing:
+
+    with open('apply.json', 'w') as file, TraceEventWriter(file) as writer:
+      blueprint.setInstrumentation(Instrumentation(writer))
+      Assemblage(blueprint).apply('build')
+
+  Each event is written as it is received as a complete ('X') duration event
+  named for the element, with the phase as its category and the action and
+  element kind as its arguments. Viewers nest an element's phases and its
+  (sub-)elements' applies within its apply. Events are placed in process
+  and thread lanes by the process and thread that recorded them, so work
+  done on other threads is shown in separate, named, lanes. Timestamps are
+  in microseconds from when the writer was created.
+  '''
+  def __init__(self, file, processName='assemblage'):
+    '''
+    Creates a writer writing to the text file object file. processName names
+    the process lane of the events recorded by this process.
+    '''
+    self.file = file
+    self.processName = processName
+    self.__lock = threading.Lock()
+    self.__origin = Instrumentation.now()
+    self.__lanes = set()
+    self.__pids = set()
+    self.__closed = False
+    self.file.write('{"displayTimeUnit": "ms", "traceEvents": [')
+    self.__separator = '\n'
+
+  def __write(self, event):
+    '''
+    Internal helper method. Writes the trace event dictionary event. Must be
+    called with the lock held.
+    '''
+    self.file.write(self.__separator)
+    self.file.write(json.dumps(event))
+    self.__separator = ',\n'
+
+  def __call__(self, event):
+    '''
+    Writes the Instrumentation.Event event, preceded by metadata events
+    naming its process and thread lanes the first time they are seen.
+    '''
+    with self.__lock:
+      if self.__closed:
+        return
+      if event.pid not in self.__pids:
+        self.__pids.add(event.pid)
+        self.__write( { 'ph':'M', 'name':'process_name', 'pid':event.pid, 'tid':0
+                      , 'args':{'name':self.processName}
+                      }
+                    )
+      if (event.pid, event.tid) not in self.__lanes:
+        self.__lanes.add((event.pid, event.tid))
+        thread = threading.current_thread()
+        name = thread.name if thread.ident == event.tid else str(event.tid)
+        self.__write( { 'ph':'M', 'name':'thread_name', 'pid':event.pid, 'tid':event.tid
+                      , 'args':{'name':name}
+                      }
+                    )
+      self.__write( { 'ph':'X', 'name':event.name, 'cat':event.phase
+                    , 'ts':(event.startNs - self.__origin) / 1000
+                    , 'dur':(event.endNs - event.startNs) / 1000
+                    , 'pid':event.pid, 'tid':event.tid
+                    , 'args':{'action':event.action, 'kind':event.kind}
+                    }
+                  )
+
+  def close(self):
+    '''
+    Completes the JSON written to the file. Events received after close are
+    ignored. The file is not closed.
+    '''
+    with self.__lock:
+      if not self.__closed:
+        self.__closed = True
+        self.file.write('\n]}\n')
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, exc_type, exc_value, traceback):
+    self.close()
+    return False